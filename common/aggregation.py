@@ -0,0 +1,76 @@
+from collections import defaultdict
+
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+# The relations of libraries and samples and their fields in the M2M rows
+RECORD_RELATIONS = (
+    ('libraries', 'library'),
+    ('samples', 'sample'),
+)
+
+
+def _resolve(lookup, field):
+    """ Replace the `record` placeholder of a lookup by a record field. """
+    if lookup == 'record' or lookup.startswith('record__'):
+        return field + lookup[len('record'):]
+    return lookup
+
+
+def count_records(model, group_by=(), filters=None, distinct=False,
+                  by_date=None):
+    """
+    Count the libraries and samples related to `model` (e.g., Request or
+    Pool) in the database, grouped by `group_by` lookups. The lookups and
+    the `filters` start from the M2M rows, `record` stands for the library
+    or the sample, e.g. 'request__user__pi__name' or
+    'record__library_type__name'. If `by_date` (a datetime lookup) is
+    given, the records are also grouped by its (local) date, which is
+    the first group value.
+
+    Return a dict mapping the tuples of group values (missing values are
+    'None') to {'libraries': ..., 'samples': ...}.
+    """
+    filters = filters or {}
+    counts = defaultdict(lambda: {'libraries': 0, 'samples': 0})
+
+    for relation, field in RECORD_RELATIONS:
+        queryset = getattr(model, relation).through.objects.filter(**{
+            _resolve(lookup, field): value
+            for lookup, value in filters.items()
+        })
+
+        lookups = [_resolve(x, field) for x in group_by]
+        if by_date:
+            queryset = queryset.annotate(
+                group_date=TruncDate(_resolve(by_date, field)))
+            lookups.insert(0, 'group_date')
+
+        if not lookups:
+            counts[()][relation] += queryset.count()
+            continue
+
+        rows = queryset.values_list(*lookups).annotate(
+            count=Count('pk', distinct=distinct)).order_by()
+
+        for row in rows:
+            key = tuple('None' if x is None else x for x in row[:-1])
+            counts[key][relation] += row[-1]
+
+    return dict(counts)
+
+
+def sum_counts(counts, size=None):
+    """
+    Sum grouped counts over all but the first `size` group values.
+    `counts` may also be an iterable of such dicts, which are merged.
+    """
+    if isinstance(counts, dict):
+        counts = [counts]
+
+    result = defaultdict(lambda: {'libraries': 0, 'samples': 0})
+    for item in counts:
+        for key, count in item.items():
+            for relation in count:
+                result[key[:size]][relation] += count[relation]
+    return dict(result)
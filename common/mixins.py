@@ -1,8 +1,11 @@
 import json
 
+from django.apps import apps
 from rest_framework.response import Response
 from rest_framework.decorators import action
 
+RequestSummary = apps.get_model('request', 'RequestSummary')
+
 
 class MultiEditMixin:
     """
@@ -36,7 +39,8 @@ class MultiEditMixin:
             data=post_data, instance=objects, many=True)
 
         if serializer.is_valid():
-            serializer.save()
+            with RequestSummary.batch():
+                serializer.save()
             return Response({'success': True})
         else:
             # Try to update valid lanes
@@ -44,7 +48,8 @@ class MultiEditMixin:
                           if not item[0]]
 
             if any(valid_data):
-                self._update_valid(valid_data)
+                with RequestSummary.batch():
+                    self._update_valid(valid_data)
                 return Response({
                     'success': True,
                     'message': 'Some records cannot be updated.',
@@ -91,15 +96,17 @@ class LibrarySampleMultiEditMixin(object):
         library_ids, sample_ids, library_post_data, sample_post_data = \
             self._separate_data(post_data)
 
-        libraries_ok, libraries_no_invalid = self._update_objects(
-            self.library_model, self.library_serializer,
-            library_ids, library_post_data,
-        )
-
-        samples_ok, samples_no_invalid = self._update_objects(
-            self.sample_model, self.sample_serializer,
-            sample_ids, sample_post_data
-        )
+        # The request summaries are refreshed once for all records
+        with RequestSummary.batch():
+            libraries_ok, libraries_no_invalid = self._update_objects(
+                self.library_model, self.library_serializer,
+                library_ids, library_post_data,
+            )
+
+            samples_ok, samples_no_invalid = self._update_objects(
+                self.sample_model, self.sample_serializer,
+                sample_ids, sample_post_data
+            )
 
         result = [libraries_ok, libraries_no_invalid,
                   samples_ok, samples_no_invalid]
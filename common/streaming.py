@@ -0,0 +1,103 @@
+import json
+import heapq
+import itertools
+
+from django.db.models import F, prefetch_related_objects
+from django.http import StreamingHttpResponse
+
+from rest_framework.utils.encoders import JSONEncoder
+
+from .utils import get_barcode_key
+
+# Number of objects fetched (and prefetched) at once
+CHUNK_SIZE = 500
+
+# Number of items encoded into one chunk of the response
+ITEMS_PER_WRITE = 100
+
+
+def is_streaming_requested(request):
+    """ Streaming responses are opt-in, they are enabled by `stream`. """
+    return request.GET.get('stream', 'False') in ['True', 'true']
+
+
+def iterate_chunks(queryset, chunk_size=CHUNK_SIZE):
+    """
+    Iterate over a queryset in lists of `chunk_size` objects, keeping its
+    ordering. The objects are read from a server-side cursor and the
+    prefetch_related() lookups are applied to every chunk (which
+    `QuerySet.iterator()` alone doesn't do).
+    """
+    lookups = queryset._prefetch_related_lookups
+    iterator = queryset.iterator()
+    while True:
+        chunk = list(itertools.islice(iterator, chunk_size))
+        if not chunk:
+            return
+        if lookups:
+            prefetch_related_objects(chunk, *lookups)
+        yield chunk
+
+
+def iterate_queryset(queryset, chunk_size=CHUNK_SIZE):
+    return itertools.chain.from_iterable(
+        iterate_chunks(queryset, chunk_size))
+
+
+def iterate_records(queryset, serializer_class, extra_fields=None,
+                    chunk_size=CHUNK_SIZE):
+    """
+    Serialize libraries or samples one by one, ordered by their barcode
+    keys in the database. `extra_fields` maps additional keys, prepended
+    to every record, to field lookups (e.g., {'request_name':
+    'request__name'}).
+    """
+    extra_fields = extra_fields or {}
+    queryset = queryset.annotate(
+        **{f'extra_{key}': F(value) for key, value in extra_fields.items()}
+    ).order_by('barcode_key', 'pk')
+
+    for obj in iterate_queryset(queryset, chunk_size):
+        data = {key: getattr(obj, f'extra_{key}') for key in extra_fields}
+        data.update(serializer_class(obj).data)
+        yield data
+
+
+def merge_by_barcode(*iterables):
+    """ Merge serialized record iterables, each ordered by barcode. """
+    return heapq.merge(*iterables, key=lambda x: get_barcode_key(x['barcode']))
+
+
+def stream_json(items, envelope=None, key='data', encoder=JSONEncoder):
+    """
+    Encode items as a JSON array incrementally. If `envelope` is given,
+    the array is written as its `key` item.
+    """
+    if envelope is not None:
+        head = json.dumps(envelope, cls=encoder)[:-1]
+        yield head + (', ' if envelope else '') + json.dumps(key) + ': '
+
+    yield '['
+    items = iter(items)
+    first = True
+    while True:
+        chunk = list(itertools.islice(items, ITEMS_PER_WRITE))
+        if not chunk:
+            break
+        encoded = ', '.join(json.dumps(x, cls=encoder) for x in chunk)
+        yield encoded if first else ', ' + encoded
+        first = False
+    yield ']'
+
+    if envelope is not None:
+        yield '}'
+
+
+class StreamingJSONResponse(StreamingHttpResponse):
+    """ Stream an iterable of items as a JSON array. """
+
+    def __init__(self, items, envelope=None, key='data', encoder=JSONEncoder,
+                 **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(
+            stream_json(items, envelope, key, encoder), **kwargs)
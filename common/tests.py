@@ -8,6 +8,8 @@ from django.contrib.auth import get_user_model
 from rest_framework.test import APITestCase
 
 from .models import Organization, PrincipalInvestigator, CostUnit
+from .streaming import stream_json
+from .utils import get_barcode_key
 
 
 User = get_user_model()
@@ -24,6 +26,12 @@ class BaseTestCase(TestCase):
     def login(self, email='test@test.io', password='foo-bar'):
         self.client.login(email=email, password=password)
 
+    def get_json(self, response):
+        """ Decode a (possibly streamed) JSON response. """
+        if response.streaming:
+            return json.loads(b''.join(response.streaming_content).decode())
+        return response.json()
+
     def _get_random_name(self, len=10):
         return ''.join(random.SystemRandom().choice(
             string.ascii_lowercase + string.digits
@@ -125,3 +133,27 @@ class NavigationTreeTest(TestCase):
 
         self.assertEqual(response.status_code, 200)
         self.assertEqual(tabs, ['Requests', 'Libraries & Samples'])
+
+
+class StreamJSONTest(TestCase):
+    def test_stream_json(self):
+        items = [{'id': i} for i in range(250)]
+        self.assertEqual(json.loads(''.join(stream_json(items))), items)
+        self.assertEqual(''.join(stream_json([])), '[]')
+
+    def test_stream_json_envelope(self):
+        data = ''.join(stream_json(iter([1, 2]), {'columns': ['a']}))
+        self.assertEqual(json.loads(data), {'columns': ['a'], 'data': [1, 2]})
+        data = ''.join(stream_json([], {}, 'results'))
+        self.assertEqual(json.loads(data), {'results': []})
+
+
+class BarcodeKeyTest(TestCase):
+    def test_barcode_key(self):
+        self.assertEqual(get_barcode_key('19L000123'), 19000123)
+        self.assertLess(
+            get_barcode_key('19S999999'), get_barcode_key('20L000001'))
+
+    def test_invalid_barcode(self):
+        self.assertEqual(get_barcode_key(''), 0)
+        self.assertEqual(get_barcode_key('foo'), 0)
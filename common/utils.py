@@ -1,8 +1,10 @@
 import re
+import heapq
 import string
 import random
 from time import time
 from datetime import datetime
+from operator import attrgetter
 
 from django.db import connection
 
@@ -25,6 +27,27 @@ def generate_barcode(record_type, counter):
     return barcode
 
 
+def get_barcode_key(barcode):
+    """
+    Get the sort key of a barcode (the year followed by the number, e.g.,
+    19L000123 -> 19000123), or 0 if the barcode isn't valid.
+    """
+    if re.match(r'^\d{2}[A-Z]\d+$', barcode or ''):
+        return int(barcode[:2]) * 10 ** 6 + int(barcode[3:])
+    return 0
+
+
+def merge_records(*querysets):
+    """
+    Get the libraries and/or samples of several querysets as one list
+    ordered by barcode. Every queryset is ordered in the database.
+    """
+    return list(heapq.merge(
+        *[x.order_by('barcode_key', 'pk') for x in querysets],
+        key=attrgetter('barcode_key'),
+    ))
+
+
 def get_random_name(len=10):
     """ Generate a random string of a given length. """
     return ''.join(random.SystemRandom().choice(
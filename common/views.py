@@ -1,13 +1,25 @@
 import json
+import base64
+import binascii
+from collections import OrderedDict
 
 from django.conf import settings
+from django.db.models import Q
 from django.http import JsonResponse
 from django.shortcuts import render, get_object_or_404
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
+from django.utils.dateparse import parse_datetime
 
 from rest_framework import viewsets
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.exceptions import ParseError
+from rest_framework.pagination import (
+    BasePagination,
+    PageNumberPagination,
+    _positive_int,
+)
+from rest_framework.utils.urls import replace_query_param
 from rest_framework.authentication import SessionAuthentication
 
 from .models import CostUnit
@@ -139,3 +151,109 @@ class StandardResultsSetPagination(PageNumberPagination):
     page_size = 30
     page_size_query_param = 'page_size'
     max_page_size = 100
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination ordered by (create_time, id), newest first. A cursor
+    holds the key of the last object of the previous page, so every page
+    is fetched with an index scan, no matter how deep it is. The total
+    count is only calculated if `count=true` is passed.
+    """
+    page_size = 30
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+
+    @classmethod
+    def is_requested(cls, request):
+        """ The pagination is opt-in, an empty cursor requests page 1. """
+        return cls.cursor_query_param in request.query_params
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+
+        self.count = None
+        if request.query_params.get(self.count_query_param) in \
+                ['True', 'true']:
+            self.count = queryset.count()
+
+        key = self.decode_cursor(request)
+        if key is not None:
+            create_time, pk = key
+            queryset = queryset.filter(
+                Q(create_time__lt=create_time) |
+                Q(create_time=create_time, pk__lt=pk)
+            )
+
+        # Fetch an extra object to find out if there is a next page
+        results = list(
+            queryset.order_by('-create_time', '-pk')[:self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+                cutoff=self.max_page_size,
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def encode_cursor(self, obj):
+        value = f'{obj.create_time.isoformat()}|{obj.pk}'
+        return base64.urlsafe_b64encode(value.encode()).decode()
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param, '')
+        if not cursor:
+            return None
+
+        try:
+            value = base64.urlsafe_b64decode(cursor.encode()).decode()
+            create_time, pk = value.rsplit('|', 1)
+            create_time = parse_datetime(create_time)
+            if create_time is None:
+                raise ValueError
+            return create_time, int(pk)
+        except (TypeError, ValueError, binascii.Error, UnicodeDecodeError):
+            raise ParseError('Invalid cursor.')
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_page_info(self):
+        """ Return the link to the next page and the count (if asked). """
+        info = OrderedDict([('next', self.get_next_link())])
+        if self.count is not None:
+            info['count'] = self.count
+        return info
+
+    def get_paginated_response(self, data):
+        info = self.get_page_info()
+        info['results'] = data
+        return Response(info)
+
+
+class KeysetPaginationMixin:
+    """
+    Use `KeysetPagination` instead of the `pagination_class`, if a cursor
+    is passed.
+    """
+    keyset_pagination_class = KeysetPagination
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator') and \
+                self.keyset_pagination_class.is_requested(self.request):
+            self._paginator = self.keyset_pagination_class()
+        return super().paginator
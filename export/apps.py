@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class ExportConfig(AppConfig):
+    name = 'export'
+
+    def ready(self):
+        import export.signals
@@ -0,0 +1,199 @@
+import re
+import json
+import logging
+import functools
+import tempfile
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.files import File
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import connection, transaction
+from django.http import HttpRequest, JsonResponse
+from django.urls import resolve
+from django.utils import timezone
+
+from rest_framework.request import Request
+
+from .models import ExportJob
+
+logger = logging.getLogger('db')
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.EXPORT_WORKERS)
+    return _executor
+
+
+def is_background_requested(request):
+    """ Exports are rendered in the background if `background` is set. """
+    return any(
+        params.get('background', 'False') in ['True', 'true']
+        for params in [request.GET, request.POST]
+    )
+
+
+def get_parameters(request):
+    """ Get the method and the query and form parameters of a request. """
+
+    def to_lists(params):
+        if hasattr(params, 'lists'):
+            items = params.lists()
+        else:
+            items = ((key, [value]) for key, value in params.items())
+        return {
+            key: [x if isinstance(x, str) else json.dumps(x) for x in values]
+            for key, values in items
+            if key != 'background'
+        }
+
+    data = request.data if isinstance(request, Request) else request.POST
+    return {
+        'method': request.method,
+        'host': request.get_host(),
+        'scheme': request.scheme,
+        'query': to_lists(request.GET),
+        'data': to_lists(data),
+    }
+
+
+def exportable(view):
+    """
+    Let a download view run in the background: if `background` is set,
+    an export job is created instead and its id is returned. The status
+    and the file are available at `/api/export_jobs/<id>/`.
+    """
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        request = next(
+            x for x in args if isinstance(x, (HttpRequest, Request)))
+
+        if not is_background_requested(request):
+            return view(*args, **kwargs)
+
+        job = ExportJob(
+            user=request.user,
+            path=request.path,
+            parameters=get_parameters(request),
+        )
+        job.save()
+        submit_job(job)
+        return JsonResponse({'success': True, 'job_id': job.pk})
+
+    return wrapper
+
+
+def submit_job(job):
+    """
+    Run a job in a worker thread once the current transaction is committed.
+    """
+    transaction.on_commit(
+        lambda: get_executor().submit(_run_in_thread, job.pk))
+
+
+def _run_in_thread(job_id):
+    try:
+        run_job(job_id)
+    finally:
+        # Every thread has its own database connection
+        connection.close()
+
+
+def build_request(job):
+    """ Recreate the request of a job for its view. """
+    params = job.parameters
+    host, _, port = params['host'].partition(':')
+    default_port = '443' if params['scheme'] == 'https' else '80'
+    body = urlencode(params['data'], doseq=True).encode()
+
+    request = WSGIRequest({
+        'REQUEST_METHOD': params['method'],
+        'PATH_INFO': job.path,
+        'QUERY_STRING': urlencode(params['query'], doseq=True),
+        'CONTENT_TYPE': 'application/x-www-form-urlencoded; charset=utf-8',
+        'CONTENT_LENGTH': str(len(body)),
+        'HTTP_HOST': params['host'],
+        'SERVER_NAME': host,
+        'SERVER_PORT': port or default_port,
+        'wsgi.input': BytesIO(body),
+        'wsgi.url_scheme': params['scheme'],
+    })
+    request.user = job.user
+
+    # The original request has passed the CSRF check already
+    request._dont_enforce_csrf_checks = True
+    return request
+
+
+def get_file_name(response, default):
+    match = re.search(
+        r'filename="?([^";]+)"?', response.get('Content-Disposition', ''))
+    return match.group(1) if match else default
+
+
+def get_error_message(response):
+    try:
+        data = json.loads(response.content.decode())
+        return str(data.get('message') or data.get('detail'))
+    except (ValueError, AttributeError):
+        return response.reason_phrase
+
+
+def fail(jobs, message):
+    jobs.update(
+        status='failed',
+        message=message,
+        update_time=timezone.now(),
+        expire_time=ExportJob.get_expire_time(),
+    )
+
+
+def run_job(job_id):
+    """ Render the download of a job and store the file. """
+    jobs = ExportJob.objects.filter(pk=job_id)
+
+    try:
+        job = jobs.select_related('user').get()
+        jobs.update(status='running', update_time=timezone.now())
+
+        request = build_request(job)
+        match = resolve(job.path)
+        response = match.func(request, *match.args, **match.kwargs)
+        if hasattr(response, 'render') and callable(response.render):
+            response = response.render()
+
+        if response.status_code != 200:
+            fail(jobs, get_error_message(response))
+            return
+
+        file_name = get_file_name(response, f'export_{job.pk}')
+        content = (response.streaming_content if response.streaming
+                   else [response.content])
+
+        with tempfile.TemporaryFile() as f:
+            for chunk in content:
+                f.write(chunk)
+            f.seek(0)
+            job.file.save(file_name, File(f, file_name), save=False)
+
+        response.close()
+    except Exception as e:
+        logger.exception(e)
+        fail(jobs, str(e))
+        return
+
+    jobs.update(
+        status='done',
+        file=job.file.name,
+        file_name=file_name,
+        content_type=response.get('Content-Type', ''),
+        update_time=timezone.now(),
+        expire_time=ExportJob.get_expire_time(),
+    )
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from export.models import ExportJob
+
+
+class Command(BaseCommand):
+    help = ('Fail the unfinished export jobs past EXPORT_TIMEOUT_HOURS and '
+            'delete the jobs and their files past the retention time '
+            '(EXPORT_RETENTION_DAYS).')
+
+    def handle(self, *args, **options):
+        count = ExportJob.fail_stale()
+        self.stdout.write(f'Failed {count} stale export(s).')
+        count = ExportJob.delete_expired()
+        self.stdout.write(f'Deleted {count} expired export(s).')
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 12:00
+from __future__ import unicode_literals
+
+from django.conf import settings
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+import django.db.models.deletion
+import export.models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('create_time', models.DateTimeField(auto_now_add=True, verbose_name='Create Time')),
+                ('update_time', models.DateTimeField(auto_now=True, verbose_name='Update Time')),
+                ('path', models.CharField(max_length=255, verbose_name='Path')),
+                ('parameters', django.contrib.postgres.fields.jsonb.JSONField(verbose_name='Parameters')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10, verbose_name='Status')),
+                ('file', models.FileField(blank=True, max_length=255, storage=export.models.ExportStorage(), upload_to='%Y/%m/%d/', verbose_name='File')),
+                ('file_name', models.CharField(blank=True, max_length=255, verbose_name='File Name')),
+                ('content_type', models.CharField(blank=True, max_length=100, verbose_name='Content Type')),
+                ('message', models.TextField(blank=True, verbose_name='Message')),
+                ('expire_time', models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='Expire Time')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='User')),
+            ],
+            options={
+                'verbose_name': 'Export Job',
+                'verbose_name_plural': 'Export Jobs',
+            },
+        ),
+    ]
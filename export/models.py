@@ -0,0 +1,93 @@
+import os
+import datetime
+
+from django.db import models
+from django.conf import settings
+from django.contrib.postgres.fields import JSONField
+from django.core.files.storage import FileSystemStorage
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+
+from common.models import DateTimeMixin
+
+
+@deconstructible
+class ExportStorage(FileSystemStorage):
+    """ Private storage of the export files in `EXPORTS_PATH`. """
+
+    @property
+    def base_location(self):
+        return settings.EXPORTS_PATH
+
+    @property
+    def location(self):
+        return os.path.abspath(self.base_location)
+
+    def url(self, name):
+        raise ValueError('Export files are only served by their jobs.')
+
+
+class ExportJob(DateTimeMixin):
+    """ A download, which is rendered in the background. """
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, verbose_name='User')
+    path = models.CharField('Path', max_length=255)
+    parameters = JSONField('Parameters')
+    status = models.CharField(
+        'Status', max_length=10, choices=STATUS_CHOICES, default='pending')
+    file = models.FileField(
+        'File', upload_to='%Y/%m/%d/', storage=ExportStorage(),
+        max_length=255, blank=True)
+    file_name = models.CharField('File Name', max_length=255, blank=True)
+    content_type = models.CharField(
+        'Content Type', max_length=100, blank=True)
+    message = models.TextField('Message', blank=True)
+    expire_time = models.DateTimeField(
+        'Expire Time', blank=True, null=True, db_index=True)
+
+    class Meta:
+        verbose_name = 'Export Job'
+        verbose_name_plural = 'Export Jobs'
+
+    def __str__(self):
+        return f'Export {self.pk} ({self.status})'
+
+    @property
+    def is_expired(self):
+        return (self.expire_time is not None and
+                self.expire_time <= timezone.now())
+
+    @staticmethod
+    def get_expire_time():
+        return timezone.now() + datetime.timedelta(
+            days=settings.EXPORT_RETENTION_DAYS)
+
+    @classmethod
+    def fail_stale(cls):
+        """
+        Fail the unfinished jobs which haven't been updated for longer than
+        `EXPORT_TIMEOUT_HOURS`, e.g., because the server was restarted.
+        """
+        timeout = datetime.timedelta(hours=settings.EXPORT_TIMEOUT_HOURS)
+        return cls.objects.filter(
+            status__in=['pending', 'running'],
+            update_time__lte=timezone.now() - timeout,
+        ).update(
+            status='failed',
+            message='The export has been interrupted.',
+            update_time=timezone.now(),
+            expire_time=cls.get_expire_time(),
+        )
+
+    @classmethod
+    def delete_expired(cls):
+        """ Delete the jobs (and their files) past their retention time. """
+        count, _ = cls.objects.filter(
+            expire_time__lte=timezone.now()).delete()
+        return count
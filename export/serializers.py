@@ -0,0 +1,10 @@
+from rest_framework.serializers import ModelSerializer
+
+from .models import ExportJob
+
+
+class ExportJobSerializer(ModelSerializer):
+    class Meta:
+        model = ExportJob
+        fields = ('id', 'status', 'file_name', 'content_type', 'message',
+                  'create_time', 'update_time', 'expire_time',)
@@ -0,0 +1,16 @@
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .models import ExportJob
+
+
+@receiver(post_delete, sender=ExportJob)
+def delete_export_file(sender, instance, **kwargs):
+    """ When a job is deleted, delete its file once committed. """
+    if not instance.file:
+        return
+
+    storage = instance.file.storage
+    name = instance.file.name
+    transaction.on_commit(lambda: storage.delete(name))
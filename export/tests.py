@@ -0,0 +1,143 @@
+import shutil
+import datetime
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import override_settings
+from django.utils import timezone
+
+from common.tests import BaseTestCase
+from common.utils import get_random_name
+from request.tests import create_request
+from library.tests import create_library
+
+from .models import ExportJob
+from .jobs import run_job
+
+
+class ExportJobTest(BaseTestCase):
+    def setUp(self):
+        self.exports_path = tempfile.mkdtemp()
+        self.settings = override_settings(EXPORTS_PATH=self.exports_path)
+        self.settings.enable()
+
+        self.user = self.create_user()
+        self.login()
+
+    def tearDown(self):
+        self.settings.disable()
+        shutil.rmtree(self.exports_path)
+
+    def test_background_get(self):
+        """ Ensure a GET download is rendered by a job. """
+        request = create_request(self.user)
+        request.libraries.add(create_library(get_random_name()))
+        url = f'/api/requests/{request.pk}/download_complete_report/'
+
+        response = self.client.get(url, {'background': 'True'})
+        self.assertEqual(response.status_code, 200)
+        job_id = response.json()['job_id']
+
+        job = ExportJob.objects.get(pk=job_id)
+        self.assertEqual(job.status, 'pending')
+        self.assertEqual(job.parameters['query'], {})
+
+        run_job(job_id)
+
+        response = self.client.get(f'/api/export_jobs/{job_id}/')
+        data = response.json()
+        self.assertEqual(data['status'], 'done')
+        self.assertEqual(data['file_name'], 'QC Complete Report.docx')
+        self.assertIsNotNone(data['expire_time'])
+
+        response = self.client.get(f'/api/export_jobs/{job_id}/download/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response['Content-Disposition'],
+            'attachment; filename="QC Complete Report.docx"',
+        )
+        content = b''.join(response.streaming_content)
+        self.assertTrue(content.startswith(b'PK'))
+
+        # The file isn't stored in MEDIA_ROOT
+        job.refresh_from_db()
+        self.assertTrue(job.file.path.startswith(self.exports_path))
+
+    def test_background_post(self):
+        """ Ensure the form data of a POST download is passed to the job. """
+        response = self.client.post(
+            '/api/library_preparation/download_benchtop_protocol/',
+            {'ids': '[]', 'background': 'true'},
+        )
+        job_id = response.json()['job_id']
+        job = ExportJob.objects.get(pk=job_id)
+        self.assertEqual(job.parameters['method'], 'POST')
+        self.assertEqual(job.parameters['data'], {'ids': ['[]']})
+
+        run_job(job_id)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'done')
+        self.assertEqual(
+            job.file_name, 'Library_Preparation_Benchtop_Protocol.xls')
+        self.assertEqual(job.content_type, 'application/ms-excel')
+
+    def test_failed_job(self):
+        """ Ensure an error response of a view fails the job. """
+        response = self.client.get(
+            '/api/requests/-1/download_complete_report/',
+            {'background': 'True'},
+        )
+        job_id = response.json()['job_id']
+        run_job(job_id)
+
+        response = self.client.get(f'/api/export_jobs/{job_id}/')
+        data = response.json()
+        self.assertEqual(data['status'], 'failed')
+        self.assertEqual(data['message'], 'Not found.')
+        self.assertIsNotNone(data['expire_time'])
+
+        response = self.client.get(f'/api/export_jobs/{job_id}/download/')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.json()['message'], 'The export is not ready.')
+
+    def test_other_user_job(self):
+        """ Ensure users can only see their own jobs. """
+        user = self.create_user('another@test.io', 'foo-bar', False)
+        job = ExportJob.objects.create(
+            user=user, path='/db_data/', parameters={})
+
+        response = self.client.get(f'/api/export_jobs/{job.pk}/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_delete_expired(self):
+        """ Ensure jobs past their retention time are deleted. """
+        now = timezone.now()
+        expired = ExportJob.objects.create(
+            user=self.user, path='/db_data/', parameters={}, status='done',
+            expire_time=now - datetime.timedelta(minutes=1))
+        kept = ExportJob.objects.create(
+            user=self.user, path='/db_data/', parameters={}, status='done',
+            expire_time=now + datetime.timedelta(days=1))
+
+        call_command('delete_expired_exports', stdout=StringIO())
+        self.assertFalse(ExportJob.objects.filter(pk=expired.pk).exists())
+        self.assertTrue(ExportJob.objects.filter(pk=kept.pk).exists())
+
+    def test_fail_stale(self):
+        """ Ensure unfinished jobs past the timeout are failed. """
+        stale = ExportJob.objects.create(
+            user=self.user, path='/db_data/', parameters={}, status='running')
+        ExportJob.objects.filter(pk=stale.pk).update(
+            update_time=timezone.now() - datetime.timedelta(days=1))
+        pending = ExportJob.objects.create(
+            user=self.user, path='/db_data/', parameters={})
+
+        call_command('delete_expired_exports', stdout=StringIO())
+        stale.refresh_from_db()
+        pending.refresh_from_db()
+        self.assertEqual(stale.status, 'failed')
+        self.assertIsNotNone(stale.expire_time)
+        self.assertEqual(pending.status, 'pending')
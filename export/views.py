@@ -0,0 +1,47 @@
+from django.http import FileResponse
+
+from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from .models import ExportJob
+from .serializers import ExportJobSerializer
+
+
+class ExportJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """ Get the status of export jobs and download their files. """
+    serializer_class = ExportJobSerializer
+
+    def get_queryset(self):
+        return ExportJob.objects.filter(
+            user=self.request.user).order_by('-create_time')
+
+    @action(methods=['get'], detail=True)
+    def download(self, request, pk=None):
+        """ Download the file of a finished export. """
+        job = self.get_object()
+
+        if job.status != 'done' or not job.file:
+            return Response({
+                'success': False,
+                'message': 'The export is not ready.',
+            }, 400)
+
+        if job.is_expired:
+            return Response({
+                'success': False,
+                'message': 'The export has expired.',
+            }, 400)
+
+        try:
+            job.file.open('rb')
+        except FileNotFoundError:
+            return Response({
+                'success': False,
+                'message': 'The export has expired.',
+            }, 400)
+
+        response = FileResponse(job.file, content_type=job.content_type)
+        response['Content-Disposition'] = \
+            f'attachment; filename="{job.file_name}"'
+        return response
@@ -12,9 +12,11 @@ from rest_framework.serializers import (
     CharField,
 )
 
+from common.streaming import merge_by_barcode
 from .models import Sequencer, Flowcell, Lane
 
 Request = apps.get_model('request', 'Request')
+RequestSummary = apps.get_model('request', 'RequestSummary')
 Library = apps.get_model('library', 'Library')
 Sample = apps.get_model('sample', 'Sample')
 Pool = apps.get_model('index_generator', 'Pool')
@@ -256,6 +258,9 @@ class FlowcellSerializer(ModelSerializer):
         requests.update(sequenced=True)
         instance.requests.add(*requests)
 
+        # The statuses have been updated in bulk, bypassing the signals
+        RequestSummary.refresh(requests.values_list('pk', flat=True))
+
         return instance
 
 
@@ -344,12 +349,14 @@ class PoolInfoSerializer(ModelSerializer):
         fields = ('id', 'name', 'libraries', 'samples',)
 
     def get_libraries(self, obj):
-        queryset = obj.libraries.filter(~Q(status=-1))
+        queryset = obj.libraries.filter(~Q(status=-1)).order_by(
+            'barcode_key', 'pk')
         serializer = PoolInfoLibrarySerializer(queryset, many=True)
         return serializer.data
 
     def get_samples(self, obj):
-        queryset = obj.samples.filter(~Q(status=-1))
+        queryset = obj.samples.filter(~Q(status=-1)).order_by(
+            'barcode_key', 'pk')
         serializer = PoolInfoSampleSerializer(queryset, many=True)
         return serializer.data
 
@@ -357,10 +364,9 @@ class PoolInfoSerializer(ModelSerializer):
         data = super().to_representation(instance)
         libraries = data.pop('libraries')
         samples = data.pop('samples')
-        records = libraries + samples
 
         data.update({
-            'records': sorted(records, key=lambda x: x['barcode'][3:])
+            'records': list(merge_by_barcode(libraries, samples))
         })
 
         return data
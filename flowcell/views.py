@@ -19,6 +19,7 @@ from xlwt import Workbook, XFStyle
 
 from common.views import CsrfExemptSessionAuthentication
 from common.mixins import MultiEditMixin
+from export.jobs import exportable
 
 from .models import Sequencer, Lane, Flowcell
 from .serializers import (
@@ -189,6 +190,7 @@ class FlowcellViewSet(MultiEditMixin, viewsets.ReadOnlyModelViewSet):
 
     @action(methods=['post'], detail=False,
             authentication_classes=[CsrfExemptSessionAuthentication])
+    @exportable
     def download_benchtop_protocol(self, request):
         """ Generate Benchtop Protocol as XLS file for selected lanes. """
         ids = json.loads(request.data.get('ids', '[]'))
@@ -259,6 +261,7 @@ class FlowcellViewSet(MultiEditMixin, viewsets.ReadOnlyModelViewSet):
 
     @action(methods=['post'], detail=False,
             authentication_classes=[CsrfExemptSessionAuthentication])
+    @exportable
     def download_sample_sheet(self, request):
         """ Generate Benchtop Protocol as XLS file for selected lanes. """
 
@@ -45,6 +45,17 @@ class TestIncomingLibraries(BaseTestCase):
         self.assertIn(self.sample2.name, samples)
         self.assertNotIn(self.library2.name, libraries)
 
+    def test_incoming_libraries_list_stream(self):
+        """ Ensure the streamed list equals the regular one. """
+        self.login()
+        response = self.client.get(reverse('incoming-libraries-list'))
+        streamed = self.client.get(
+            reverse('incoming-libraries-list'), {'stream': 'true'})
+        self.assertEqual(streamed.status_code, 200)
+        self.assertTrue(streamed.streaming)
+        data = json.loads(b''.join(streamed.streaming_content).decode())
+        self.assertEqual(data, response.json())
+
     def test_incoming_libraries_list_non_staff(self):
         """Ensure error is thrown if a non-staff user tries to get the list."""
         self.client.login(email='non-staff@test.io', password='test')
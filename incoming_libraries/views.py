@@ -1,17 +1,20 @@
 import logging
-import itertools
 
 from django.apps import apps
-from django.db.models import Prefetch
 
 from rest_framework import viewsets
 from rest_framework.response import Response
 from rest_framework.permissions import IsAdminUser
 
 from common.mixins import LibrarySampleMultiEditMixin
-from .serializers import RequestSerializer, LibrarySerializer, SampleSerializer
+from common.streaming import (
+    StreamingJSONResponse,
+    is_streaming_requested,
+    iterate_records,
+    merge_by_barcode,
+)
+from .serializers import LibrarySerializer, SampleSerializer
 
-Request = apps.get_model('request', 'Request')
 Library = apps.get_model('library', 'Library')
 Sample = apps.get_model('sample', 'Sample')
 
@@ -26,7 +29,10 @@ class IncomingLibrariesViewSet(LibrarySampleMultiEditMixin, viewsets.ViewSet):
     sample_serializer = SampleSerializer
 
     def list(self, request):
-        """ Get the list of all incoming libraries and samples. """
+        """
+        Get the list of all incoming libraries and samples, sorted by
+        barcode in the database. If `stream` is set, they are streamed.
+        """
         libraries_qs = Library.objects.select_related(
             'library_protocol',
             'concentration_method',
@@ -37,13 +43,20 @@ class IncomingLibrariesViewSet(LibrarySampleMultiEditMixin, viewsets.ViewSet):
             'nucleic_acid_type',
         ).filter(status=1)
 
-        queryset = Request.objects.prefetch_related(
-            Prefetch('libraries', queryset=libraries_qs),
-            Prefetch('samples', queryset=samples_qs),
-        ).order_by('-create_time')
-
-        serializer = RequestSerializer(queryset, many=True)
-        data = list(itertools.chain(*serializer.data))
-
-        data = sorted(data, key=lambda x: x['barcode'][3:])
-        return Response(data)
+        request_fields = {
+            'request': 'request__pk',
+            'request_name': 'request__name',
+            'samples_submitted': 'request__samples_submitted',
+        }
+        records = merge_by_barcode(
+            iterate_records(
+                libraries_qs.filter(request__isnull=False),
+                LibrarySerializer, request_fields),
+            iterate_records(
+                samples_qs.filter(request__isnull=False),
+                SampleSerializer, request_fields),
+        )
+
+        if is_streaming_requested(request):
+            return StreamingJSONResponse(records)
+        return Response(list(records))
@@ -0,0 +1,79 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+
+from .index_generator import IndexGenerator
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    Return the process pool shared by all requests of this process. The
+    workers are spawned (not forked), so they set up Django themselves
+    and don't share the database connections of the web process.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.INDEX_GENERATOR_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=django.setup,
+            )
+        return _executor
+
+
+def generate_pool(spec, progress=None):
+    """
+    Generate indices for a single pool spec. Errors are returned as part
+    of the result, so that one invalid pool doesn't fail the whole batch.
+    """
+    try:
+        index_generator = IndexGenerator(
+            spec['libraries'],
+            spec['samples'],
+            spec['start_coord'],
+            spec['direction'],
+            spec['seed'],
+            spec['min_distances'],
+            progress,
+        )
+        data = index_generator.generate()
+
+        capacity = spec.get('capacity', None)
+        total_depth = sum(x['sequencing_depth'] for x in data)
+        if capacity is not None and total_depth > capacity:
+            raise ValueError('The total sequencing depth exceeds the ' +
+                             'selected pool size.')
+
+    except Exception as e:
+        return {'success': False, 'message': str(e)}
+
+    return {
+        'success': True,
+        'data': data,
+        'score': index_generator.score,
+        'seed': index_generator.seed,
+        'distances': index_generator.distances,
+    }
+
+
+def generate_pools(specs, workers=None):
+    """
+    Generate indices for a list of pool specs. The pools are independent,
+    so they are generated in parallel in the shared process pool, which
+    is bounded by `INDEX_GENERATOR_WORKERS` across concurrent requests.
+    The results are returned in the order of the specs.
+    """
+    if workers is None:
+        workers = settings.INDEX_GENERATOR_WORKERS
+
+    if min(workers, len(specs)) <= 1:
+        return [generate_pool(x) for x in specs]
+
+    return list(get_executor().map(generate_pool, specs))
@@ -0,0 +1,227 @@
+import time
+import random
+import string
+import itertools
+from collections import namedtuple
+
+from django.apps import apps
+from django.db import transaction
+
+from .index_generator import IndexGenerator, invalidate_catalogues
+
+IndexType = apps.get_model('library_sample_shared', 'IndexType')
+IndexI7 = apps.get_model('library_sample_shared', 'IndexI7')
+IndexI5 = apps.get_model('library_sample_shared', 'IndexI5')
+IndexPair = apps.get_model('library_sample_shared', 'IndexPair')
+Organism = apps.get_model('library_sample_shared', 'Organism')
+ConcentrationMethod = apps.get_model(
+    'library_sample_shared', 'ConcentrationMethod')
+ReadLength = apps.get_model('library_sample_shared', 'ReadLength')
+LibraryProtocol = apps.get_model('library_sample_shared', 'LibraryProtocol')
+LibraryType = apps.get_model('library_sample_shared', 'LibraryType')
+NucleicAcidType = apps.get_model('sample', 'NucleicAcidType')
+Sample = apps.get_model('sample', 'Sample')
+
+# format: 'single' (tube) or 'plate', size: number of indices per index
+# group (tube) or number of wells (plate)
+BenchmarkCase = namedtuple(
+    'BenchmarkCase',
+    ['index_length', 'mode', 'format', 'size', 'num_samples'],
+)
+
+# Plate sizes and their (rows, columns); a row coordinate is a single
+# letter, so larger plates (e.g., 1536 wells) can't be stored
+PLATE_LAYOUTS = {
+    96: (8, 12),
+    384: (16, 24),
+}
+
+INDEX_LENGTHS = [8, 10, 12, 24]
+
+
+def get_cases(index_lengths=INDEX_LENGTHS, modes=('single', 'dual'),
+              formats=('single', 'plate'), sizes=(96, 384), num_samples=24):
+    """
+    Return the benchmark cases for all combinations of index lengths,
+    modes (single/dual), formats (tube/plate) and sizes. Plate sizes
+    without a known layout are skipped.
+    """
+    cases = []
+    for index_length, mode, format, size in itertools.product(
+            index_lengths, modes, formats, sizes):
+        if format == 'plate' and size not in PLATE_LAYOUTS:
+            continue
+        cases.append(BenchmarkCase(
+            index_length, mode, format, size, num_samples))
+    return cases
+
+
+def get_case_name(case):
+    format = 'tube' if case.format == 'single' else 'plate'
+    return (f'{case.index_length}-mer {case.mode} {format} {case.size}, ' +
+            f'{case.num_samples} samples')
+
+
+def create_indices(model, prefix, length, count, rng):
+    """ Create random indices of a given length. """
+    indices = [
+        model(
+            prefix=prefix,
+            number=f'{i + 1:04d}',
+            index=''.join(rng.choice('ACGT') for _ in range(length)),
+        )
+        for i in range(count)
+    ]
+    model.objects.bulk_create(indices)
+    return list(model.objects.filter(prefix=prefix).order_by('number'))
+
+
+def create_index_type(case, rng):
+    """ Create a synthetic index type (and its index pairs). """
+    index_type = IndexType(
+        name=f'Benchmark {get_case_name(case)}',
+        is_dual=case.mode == 'dual',
+        format=case.format,
+        index_length=str(case.index_length),
+    )
+    index_type.save()
+
+    # Prefixes must be unique together with the numbers
+    prefix = f'BM{index_type.pk}'
+
+    if case.format == 'single':
+        indices_i7 = create_indices(
+            IndexI7, prefix, case.index_length, case.size, rng)
+        index_type.indices_i7.add(*indices_i7)
+        if case.mode == 'dual':
+            indices_i5 = create_indices(
+                IndexI5, prefix, case.index_length, case.size, rng)
+            index_type.indices_i5.add(*indices_i5)
+        return index_type
+
+    rows, columns = PLATE_LAYOUTS[case.size]
+    wells = list(itertools.product(range(rows), range(columns)))
+
+    if case.mode == 'dual':
+        # An index I7 per column and an index I5 per row
+        indices_i7 = create_indices(
+            IndexI7, prefix, case.index_length, columns, rng)
+        indices_i5 = create_indices(
+            IndexI5, prefix, case.index_length, rows, rng)
+        index_type.indices_i5.add(*indices_i5)
+        pairs = [(indices_i7[j], indices_i5[i]) for i, j in wells]
+    else:
+        indices_i7 = create_indices(
+            IndexI7, prefix, case.index_length, case.size, rng)
+        pairs = [(x, None) for x in indices_i7]
+
+    index_type.indices_i7.add(*indices_i7)
+    IndexPair.objects.bulk_create([
+        IndexPair(
+            index_type=index_type,
+            index1=index1,
+            index2=index2,
+            char_coord=string.ascii_uppercase[i],
+            num_coord=j + 1,
+        )
+        for (i, j), (index1, index2) in zip(wells, pairs)
+    ])
+
+    return index_type
+
+
+def create_samples(index_type, num_samples, rng):
+    """
+    Create samples with skewed (log-normally distributed) sequencing
+    depths.
+    """
+    organism = Organism.objects.create(name='Benchmark')
+    concentration_method = ConcentrationMethod.objects.create(
+        name='Benchmark')
+    read_length = ReadLength.objects.create(name='Benchmark')
+    library_protocol = LibraryProtocol.objects.create(
+        name='Benchmark',
+        type='DNA',
+        provider='-',
+        catalog='-',
+        explanation='-',
+        input_requirements='-',
+        typical_application='-',
+    )
+    library_type = LibraryType.objects.create(name='Benchmark')
+    nucleic_acid_type = NucleicAcidType.objects.create(name='Benchmark')
+
+    samples = [
+        Sample(
+            name=f'Benchmark_{i + 1}',
+            barcode=f'BM{i + 1:07d}',
+            organism=organism,
+            concentration=1.0,
+            concentration_method=concentration_method,
+            read_length=read_length,
+            sequencing_depth=max(1, round(rng.lognormvariate(2.5, 1.0))),
+            library_protocol=library_protocol,
+            library_type=library_type,
+            nucleic_acid_type=nucleic_acid_type,
+            index_type=index_type,
+        )
+        for i in range(num_samples)
+    ]
+    Sample.objects.bulk_create(samples)
+
+    return list(Sample.objects.filter(
+        index_type=index_type).values_list('pk', flat=True))
+
+
+def run_case(case, repeats=5, seed=0):
+    """
+    Generate indices for a synthetic pool several times (with different
+    seeds) and return the timing and quality figures. All created objects
+    are rolled back.
+    """
+    rng = random.Random(seed)
+    runs = []
+    errors = []
+
+    with transaction.atomic():
+        index_type = create_index_type(case, rng)
+        sample_ids = create_samples(index_type, case.num_samples, rng)
+
+        for i in range(repeats):
+            start = time.perf_counter()
+            try:
+                index_generator = IndexGenerator(
+                    [], sample_ids, 'A1', 'right', seed + i)
+                index_generator.generate()
+            except ValueError as e:
+                errors.append(str(e))
+                continue
+
+            scores = index_generator.calculate_cycle_scores()
+            runs.append({
+                'time': time.perf_counter() - start,
+                'iterations': index_generator.iterations,
+                'worst_score': float(scores.max()),
+                'mean_score': float(scores.mean()),
+            })
+
+        transaction.set_rollback(True)
+
+    invalidate_catalogues()
+
+    def avg(key):
+        if not runs:
+            return None
+        return sum(x[key] for x in runs) / len(runs)
+
+    return {
+        'case': get_case_name(case),
+        'runs': repeats,
+        'failure_rate': len(errors) / repeats if repeats else 0.0,
+        'errors': sorted(set(errors)),
+        'time': avg('time'),
+        'max_time': max(x['time'] for x in runs) if runs else None,
+        'iterations': avg('iterations'),
+        'worst_score': avg('worst_score'),
+        'mean_score': avg('mean_score'),
+    }
@@ -0,0 +1,85 @@
+import numpy as np
+
+# Every base is encoded with 2 bits, so an index of up to 32 bases fits
+# into a single 64-bit integer. The known bases (A/C/G/T) are marked in
+# a second integer (by the low bit of their 2 bits), the other bases and
+# the padding of shorter indices are ignored when indices are compared.
+BASE_CODES = {'A': 0, 'C': 1, 'G': 2, 'T': 3}
+MAX_LENGTH = 32
+
+# The low bit of every 2-bit base
+LOW_BITS = np.uint64(0x5555555555555555)
+
+# Encoding of a missing index, e.g., the index I5 of a single index pool
+NO_CODE = (0, 0)
+
+# Number of set bits of every 16-bit integer
+POPCOUNT_16 = np.array(
+    [bin(i).count('1') for i in range(1 << 16)], dtype=np.uint8)
+
+
+def encode_index(index, length):
+    """
+    Encode an index sequence as a (code, mask) tuple of integers with 2
+    bits per base. The index is truncated to a given length, its missing
+    bases and other bases than A/C/G/T are left out of the mask.
+    """
+    if length > MAX_LENGTH:
+        raise ValueError(
+            f'Indices longer than {MAX_LENGTH} bases are not supported.')
+
+    code, mask = 0, 0
+    index = index or ''
+    for i in range(length):
+        base_code = BASE_CODES.get(index[i]) if i < len(index) else None
+        code = (code << 2) | (base_code or 0)
+        mask = (mask << 2) | (base_code is not None)
+    return code, mask
+
+
+def encode_indices(indices, length):
+    """
+    Encode a list of index sequences as a (indices x 2) uint64 array of
+    the codes and the masks.
+    """
+    return np.array(
+        [encode_index(x, length) for x in indices],
+        dtype=np.uint64,
+    ).reshape(-1, 2)
+
+
+def popcount(array):
+    """ Count the set bits of every element of a uint64 array. """
+    array = np.ascontiguousarray(array, dtype=np.uint64)
+    counts = POPCOUNT_16[array.view(np.uint16)]
+    return counts.reshape(array.shape + (4,)).sum(axis=-1, dtype=int)
+
+
+def hamming_distances(codes1, codes2):
+    """
+    Return the (len(codes1) x len(codes2)) matrix of the Hamming distances
+    between two arrays of encoded indices (see `encode_indices()`). Only
+    the bases known in both indices are compared.
+    """
+    codes1 = np.asarray(codes1, dtype=np.uint64).reshape(-1, 2)
+    codes2 = np.asarray(codes2, dtype=np.uint64).reshape(-1, 2)
+
+    diff = codes1[:, None, 0] ^ codes2[None, :, 0]
+    # A base differs if any of its two bits differ
+    mismatches = (diff | (diff >> np.uint64(1))) & LOW_BITS
+    mismatches &= codes1[:, None, 1] & codes2[None, :, 1]
+    return popcount(mismatches)
+
+
+def min_distance(distances):
+    """
+    Return the minimum off-diagonal value of a square distance matrix and
+    the positions of the closest pair.
+    """
+    if len(distances) < 2:
+        return None, None
+
+    distances = distances.astype(int)
+    np.fill_diagonal(distances, np.iinfo(int).max)
+    i, j = np.unravel_index(distances.argmin(), distances.shape)
+    return int(distances[i, j]), (int(i), int(j))
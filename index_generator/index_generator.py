@@ -2,121 +2,218 @@ import re
 import random
 import string
 import itertools
-from collections import namedtuple, OrderedDict, defaultdict, Counter
+from collections import namedtuple, OrderedDict, defaultdict
+from collections.abc import Sequence
 
+import numpy as np
 from django.apps import apps
+from django.db import transaction
+
+from .scoring import encode_colors, ColorDistribution
+from .optimizer import Variable, Slot, PoolOptimizer, get_own_key
+from .distance import (
+    NO_CODE, encode_index, encode_indices, hamming_distances, min_distance,
+)
 
-IndexI7 = apps.get_model('library_sample_shared', 'IndexI7')
-IndexI5 = apps.get_model('library_sample_shared', 'IndexI5')
 IndexPair = apps.get_model('library_sample_shared', 'IndexPair')
 Library = apps.get_model('library', 'Library')
 Sample = apps.get_model('sample', 'Sample')
+IndexCatalogueVersion = apps.get_model(
+    'index_generator', 'IndexCatalogueVersion')
 
 Pair = namedtuple('Pair', ['index1', 'index2', 'coordinate'])
 
 
-class IndexRegistry:
+# Process-wide cache of index catalogues, see `get_catalogue()`
+_catalogues = {}
+
+
+def get_catalogue(index_type, mode, version=None):
     """
-    Class for storing fetched and sorted indices i7/i5 and index pairs.
+    Return a cached catalogue of indices and index pairs for a given
+    index type and mode. The catalogue is re-fetched only when the index
+    catalogue version in the database changes (see
+    `invalidate_catalogues()`).
     """
+    if version is None:
+        version = IndexCatalogueVersion.get()
+    key = (index_type.pk, mode)
+    catalogue = _catalogues.get(key)
 
-    def __init__(self, mode, index_types, start_coord='A1', direction='right'):
-        self.indices = {}
-        self.pairs = {}
+    if catalogue is None or catalogue.version != version:
+        catalogue = IndexCatalogue(index_type, mode, version)
+        _catalogues[key] = catalogue
 
-        # In case if an empty string was passed
-        start_coord = start_coord if start_coord else 'A1'
-        direction = direction if direction else 'right'
+    return catalogue
 
-        self.mode = mode
-        self.index_types = index_types
-        char_coord, num_coord = self.split_coordinate(start_coord)
 
-        # Fetch indices and index pairs
-        for index_type in self.index_types:
-            if index_type.format == 'single':
-                self.fetch_indices(index_type)
-            else:
-                self.fetch_pairs(index_type, char_coord, num_coord, direction)
-
-    def fetch_indices(self, index_type):
-        """ Fetch indices i7 and i5 for a given index type. """
-        if index_type.pk not in self.indices.keys():
-            self.indices[index_type.pk] = {'i7': [], 'i5': []}
-
-        self.indices[index_type.pk]['i7'] = self.to_list(
-            index_type.format,
-            index_type.pk,
-            index_type.read_type,
-            index_type.indices_i7.all(),
-        )
+def increment_catalogue_version():
+    """ Drop the cached index catalogues of all processes. """
+    _catalogues.clear()
+    IndexCatalogueVersion.increment()
 
-        if self.mode == 'dual':
-            self.indices[index_type.pk]['i5'] = self.to_list(
-                index_type.format,
-                index_type.pk,
-                index_type.read_type,
-                index_type.indices_i5.all(),
-            )
 
-    def fetch_pairs(self, index_type, char_coord, num_coord, direction):
-        """
-        Fetch index pairs (Index i7 + Index i5) for a given index type,
-        start coordinate, and direction.
-        """
-        if index_type.pk not in self.pairs.keys():
-            self.pairs[index_type.pk] = []
+def invalidate_catalogues():
+    """
+    Drop all cached index catalogues, once the current transaction is
+    committed. Until then, other processes could re-fetch the old indices
+    under a new version.
+    """
+    transaction.on_commit(increment_catalogue_version)
 
-        index_pairs = IndexPair.objects.filter(
-            index_type=index_type).select_related('index1', 'index2')
 
-        # Sort index pairs according to the chosen direction
-        if direction == 'right':
-            index_pairs = index_pairs.order_by('char_coord', 'num_coord')
-        elif direction == 'down':
-            index_pairs = index_pairs.order_by('num_coord', 'char_coord')
-        else:  # diagonal
-            index_pairs = self.get_diagonal(index_pairs)
+class RotatedList(Sequence):
+    """ Read-only view of a sequence, which starts at a given offset. """
 
-        start_idx = None
-        for i, pair in enumerate(index_pairs):
-            if pair.char_coord == char_coord and pair.num_coord == num_coord:
-                start_idx = i
-                break
+    def __init__(self, items, offset=0):
+        self.items = items
+        self.offset = offset % len(items) if items else 0
 
-        if start_idx is None:
-            raise ValueError(
-                f'No index pairs for Index Type "{index_type.name}" ' +
-                f'and start coordinate "{char_coord + str(num_coord)}".'
-            )
+    def __len__(self):
+        return len(self.items)
 
-        # Make the index pairs list begin with a provided start coordinate
-        index_pairs = index_pairs[start_idx:] + index_pairs[:start_idx]
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('RotatedList index out of range')
+        return self.items[(i + self.offset) % len(self.items)]
 
-        for pair in index_pairs:
-            index1 = self.create_index_dict(
-                index_type.format, index_type.pk, index_type.read_type,
-                pair.index1.prefix, pair.index1.number,
-                pair.index1.index, pair.coordinate,
-                )
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
 
-            if self.mode == 'dual':
-                index2 = self.create_index_dict(
-                    index_type.format, index_type.pk, index_type.read_type,
-                    pair.index2.prefix, pair.index2.number,
-                    pair.index2.index, pair.coordinate,
+
+class LazyList(Sequence):
+    """ Read-only sequence, which creates its items only on access. """
+
+    def __init__(self, size, get_item):
+        self.size = size
+        self.get_item = get_item
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += self.size
+        if not 0 <= i < self.size:
+            raise IndexError('LazyList index out of range')
+        return self.get_item(i)
+
+
+class IndexCatalogue:
+    """
+    Immutable set of indices i7/i5 and index pairs of an index type.
+
+    The indices are stored as plain tuples of sequences and (prefix,
+    number) ids, and as encoded NumPy arrays (see `get_codes()`).
+    Index dicts are only created when an index is accessed, e.g., when
+    the result is built.
+
+    Index pairs are pre-ordered for all directions ('right', 'down',
+    'diagonal'), so that a list of pairs which begins with any start
+    coordinate is just a rotated view of one of them.
+    """
+    DIRECTIONS = ('right', 'down', 'diagonal')
+
+    def __init__(self, index_type, mode, version=0):
+        self.version = version
+        self.index_type_id = index_type.pk
+        self.name = index_type.name
+        self.format = index_type.format
+        self.read_type = index_type.read_type
+        self.mode = mode
+        self.colors = {}
+        self.codes = {}
+        self.keys = {}
+        self.positions_by_key = {}
+
+        # Keep a stable order, so that a seed reproduces the same result
+        def fetch(indices):
+            return list(indices.order_by('pk').values_list(
+                'prefix', 'number', 'index'))
+
+        indices = {
+            'i7': fetch(index_type.indices_i7.all()),
+            'i5': fetch(index_type.indices_i5.all())
+            if mode == 'dual' else [],
+        }
+        self.sequences = {
+            k: tuple(x[2] for x in v) for k, v in indices.items()}
+        self.index_ids = {
+            k: tuple((x[0], x[1]) for x in v) for k, v in indices.items()}
+
+        self.indices = {
+            k: LazyList(len(v), lambda i, k=k: self.get_index(k, i))
+            for k, v in self.sequences.items()
+        }
+
+        # Index sequence -> (prefix, number) of the first index (by id),
+        # used to resolve the indices of libraries
+        self.lookup = {}
+        for index_group, sequences in self.sequences.items():
+            lookup = self.lookup[index_group] = {}
+            for sequence, index_id in zip(
+                    sequences, self.index_ids[index_group]):
+                lookup.setdefault(sequence, index_id)
+
+        index_pairs = list(IndexPair.objects.filter(
+            index_type=index_type,
+        ).order_by('pk').values_list(
+            'char_coord', 'num_coord',
+            'index1__prefix', 'index1__number', 'index1__index',
+            'index2__prefix', 'index2__number', 'index2__index',
+        ))
+
+        self.pair_coords = tuple((x[0], x[1]) for x in index_pairs)
+        self.pair_indices = (
+            tuple(x[2:5] for x in index_pairs),
+            tuple(x[5:8] if mode == 'dual' else ('', '', '')
+                  for x in index_pairs),
+        )
+
+        # Sort index pairs according to all directions
+        coords = self.pair_coords
+        self.orders = {}
+        self.positions = {}
+        self.pairs = {}
+        for direction in self.DIRECTIONS:
+            if direction == 'right':
+                order = sorted(range(len(coords)), key=lambda i: coords[i])
+            elif direction == 'down':
+                order = sorted(
+                    range(len(coords)),
+                    key=lambda i: (coords[i][1], coords[i][0]),
                 )
             else:
-                index2 = self.create_index_dict()
+                order = self.get_diagonal(coords)
 
-            self.pairs[index_type.pk].append(
-                Pair(index1, index2, pair.coordinate))
+            self.orders[direction] = tuple(order)
+            self.pairs[direction] = LazyList(
+                len(order),
+                lambda i, order=order: self.get_pair(order[i]),
+            )
+
+            positions = {}
+            for i, pos in enumerate(order):
+                positions.setdefault(coords[pos], i)
+            self.positions[direction] = positions
+
+    @staticmethod
+    def get_diagonal(coords):
+        """
+        Return the positions of (char, num) coordinates sorted diagonally.
+        """
+        if not coords:
+            return []
 
-    def get_diagonal(self, index_pairs):
-        """ Sort index pairs diagonally. """
         letters = string.ascii_uppercase  # ABCD...
-        last_coord = max([(x.char_coord, x.num_coord) for x in index_pairs])
-        char_coord, num_coord = last_coord  # e.g., 'H' and 12
+        char_coord, num_coord = max(coords)  # e.g., 'H' and 12
         rows = letters[:letters.index(char_coord) + 1]
 
         # Build coordinate matrix
@@ -134,11 +231,184 @@ class IndexRegistry:
             for j in range(num_coord):
                 diags[j - i].append(coord_matrix[i][j])
 
-        coords = itertools.chain(*[diags[i] for i in sorted(diags)])
-        order = {k: i for i, k in enumerate(coords)}
+        diagonal = itertools.chain(*[diags[i] for i in sorted(diags)])
+        order = {k: i for i, k in enumerate(diagonal)}
+
+        # Return positions sorted according to the custom order
+        return sorted(
+            range(len(coords)),
+            key=lambda i: order[coords[i][0] + str(coords[i][1])],
+        )
+
+    def get_index(self, index_group, i):
+        """ Create the index dict of the i-th index of an index group. """
+        prefix, number = self.index_ids[index_group][i]
+        return IndexRegistry.create_index_dict(
+            self.format, self.index_type_id, self.read_type,
+            prefix, number, self.sequences[index_group][i],
+        )
+
+    def get_pair(self, pos):
+        """ Create the Pair of index dicts of the pair at a position. """
+        char_coord, num_coord = self.pair_coords[pos]
+        coordinate = f'{char_coord}{num_coord}'
+
+        index1, index2 = (
+            IndexRegistry.create_index_dict(
+                self.format, self.index_type_id, self.read_type,
+                *x[pos], coordinate,
+            )
+            for x in self.pair_indices
+        )
 
-        # Return index pairs sorted according to the custom order
-        return sorted(index_pairs, key=lambda x: order[x.coordinate])
+        if self.mode != 'dual':
+            index2 = IndexRegistry.create_index_dict()
+
+        return Pair(index1, index2, coordinate)
+
+    def get_indices(self, index_group):
+        """ Return a list of indices for a given index group (i7/i5). """
+        return self.indices.get(index_group, ())
+
+    def find_index(self, index_group, index):
+        """
+        Return the (prefix, number) of an index sequence of a given index
+        group (i7/i5), None if the index type doesn't contain it.
+        """
+        return self.lookup.get(index_group, {}).get(index)
+
+    def get_pairs(self, char_coord, num_coord, direction):
+        """
+        Return a list of index pairs sorted according to the chosen
+        direction and beginning with a given start coordinate.
+        """
+        direction = direction if direction in self.DIRECTIONS else 'diagonal'
+        start_idx = self.positions[direction].get((char_coord, num_coord))
+
+        if start_idx is None:
+            raise ValueError(
+                f'No index pairs for Index Type "{self.name}" ' +
+                f'and start coordinate "{char_coord + str(num_coord)}".'
+            )
+
+        return RotatedList(self.pairs[direction], start_idx)
+
+    def get_sequences(self, index_group, direction='right'):
+        """
+        Return the sequences of a given index group ('i7', 'i5'), or
+        a tuple of the sequences I7 and I5 of the index pairs ('pair') in
+        the not rotated order of a given direction.
+        """
+        if index_group != 'pair':
+            return self.sequences.get(index_group, ())
+
+        order = self.orders[direction]
+        return tuple(
+            tuple(x[pos][2] for pos in order) for x in self.pair_indices)
+
+    def get_colors(self, index_group, cycles, direction='right'):
+        """
+        Return the green/red color matrices of the indices of a given
+        index group ('i7', 'i5' or 'pair'). The rows of the 'pair' group
+        follow the not rotated order of a given direction.
+        """
+        key = (index_group, cycles, direction)
+        if key not in self.colors:
+            if index_group == 'pair':
+                sequences = [
+                    x + y for x, y in zip(
+                        *self.get_sequences('pair', direction))
+                ]
+            else:
+                sequences = self.get_sequences(index_group)
+            self.colors[key] = encode_colors(sequences, cycles)
+        return self.colors[key]
+
+    def get_codes(self, index_group, length, direction='right'):
+        """
+        Return the encoded indices of a given index group ('i7',
+        'i5' or 'pair'). The 'pair' group is a tuple of the encoded
+        indices I7 and I5 in the not rotated order of a given direction.
+        """
+        key = (index_group, length, direction)
+        if key not in self.codes:
+            if index_group == 'pair':
+                self.codes[key] = tuple(
+                    encode_indices(x, length)
+                    for x in self.get_sequences('pair', direction)
+                )
+            else:
+                self.codes[key] = encode_indices(
+                    self.get_sequences(index_group), length)
+        return self.codes[key]
+
+    def get_keys(self, index_group, direction='right'):
+        """
+        Return the (I7, I5) keys of the indices of a given index group,
+        which are used to check the uniqueness of the index pairs. Indices
+        I7 and I5 set only one part of a key (the other one is None).
+        """
+        key = (index_group, direction)
+        if key not in self.keys:
+            if index_group == 'pair':
+                keys = zip(*self.get_sequences('pair', direction))
+            elif index_group == 'i7':
+                keys = ((x, None) for x in self.get_sequences('i7'))
+            else:
+                keys = ((None, x) for x in self.get_sequences('i5'))
+            self.keys[key] = tuple(keys)
+        return self.keys[key]
+
+    def get_positions_by_key(self, index_group, direction='right'):
+        """
+        Return a dict, which maps the part of a key set by an index group
+        (the whole key for index pairs) to the positions of the indices.
+        """
+        key = (index_group, direction)
+        if key not in self.positions_by_key:
+            positions = {}
+            for i, x in enumerate(self.get_keys(index_group, direction)):
+                positions.setdefault(get_own_key(index_group, x), []).append(i)
+            self.positions_by_key[key] = positions
+        return self.positions_by_key[key]
+
+
+class IndexRegistry:
+    """
+    Class for storing fetched and sorted indices i7/i5 and index pairs.
+    """
+
+    def __init__(self, mode, index_types, start_coord='A1', direction='right'):
+        self.indices = {}
+        self.pairs = {}
+        self.colors = {}
+        self.codes = {}
+        self.positions_by_key = {}
+        self.catalogues = {}
+
+        # In case if an empty string was passed
+        start_coord = start_coord if start_coord else 'A1'
+        direction = direction if direction else 'right'
+
+        self.mode = mode
+        self.index_types = index_types
+        self.direction = direction
+        char_coord, num_coord = self.split_coordinate(start_coord)
+
+        # Take indices and index pairs from the cached catalogues
+        version = IndexCatalogueVersion.get()
+        for index_type in self.index_types:
+            catalogue = get_catalogue(index_type, mode, version)
+            self.catalogues[index_type.pk] = catalogue
+
+            if index_type.format == 'single':
+                self.indices[index_type.pk] = {
+                    'i7': catalogue.get_indices('i7'),
+                    'i5': catalogue.get_indices('i5'),
+                }
+            else:
+                self.pairs[index_type.pk] = catalogue.get_pairs(
+                    char_coord, num_coord, direction)
 
     def get_indices(self, index_type_id, index_group):
         """
@@ -151,10 +421,91 @@ class IndexRegistry:
         """ Return a list of index pairs for a given index type id. """
         return self.pairs.get(index_type_id, [])
 
-    def to_list(self, format, index_type, read_type, indices):
-        """ Return a list of index dicts. """
-        return list(map(lambda x: self.create_index_dict(
-            format, index_type, read_type, x.prefix, x.number, x.index), indices))
+    def get_colors(self, index_type_id, index_group, cycles):
+        """
+        Return the green/red color matrices of all indices (index group
+        'i7' or 'i5') or index pairs (index group 'pair') of a given
+        index type. The rows follow the order of `get_indices()` and
+        `get_pairs()` respectively.
+        """
+        key = (index_type_id, index_group, cycles)
+        if key not in self.colors:
+            catalogue = self.catalogues[index_type_id]
+            if index_group == 'pair':
+                pairs = self.get_pairs(index_type_id)
+                green, red = catalogue.get_colors(
+                    'pair', cycles, self.get_direction(catalogue))
+                # Rotate the rows the same way as the pairs
+                self.colors[key] = (
+                    np.roll(green, -pairs.offset, axis=0),
+                    np.roll(red, -pairs.offset, axis=0),
+                )
+            else:
+                self.colors[key] = catalogue.get_colors(index_group, cycles)
+        return self.colors[key]
+
+    def get_codes(self, index_type_id, index_group, length):
+        """
+        Return the encoded indices (index group 'i7' or 'i5') or
+        a tuple of the encoded indices I7 and I5 of the index pairs (index
+        group 'pair') of a given index type. The rows follow the order of
+        `get_indices()` and `get_pairs()` respectively.
+        """
+        key = (index_type_id, index_group, length)
+        if key not in self.codes:
+            catalogue = self.catalogues[index_type_id]
+            if index_group == 'pair':
+                pairs = self.get_pairs(index_type_id)
+                self.codes[key] = tuple(
+                    np.roll(x, -pairs.offset, axis=0)
+                    for x in catalogue.get_codes(
+                        'pair', length, self.get_direction(catalogue))
+                )
+            else:
+                self.codes[key] = catalogue.get_codes(index_group, length)
+        return self.codes[key]
+
+    def get_keys(self, index_type_id, index_group):
+        """
+        Return the (I7, I5) keys of all indices or index pairs of a given
+        index type (see `IndexCatalogue.get_keys()`).
+        """
+        catalogue = self.catalogues[index_type_id]
+        if index_group != 'pair':
+            return catalogue.get_keys(index_group)
+
+        pairs = self.get_pairs(index_type_id)
+        return RotatedList(
+            catalogue.get_keys('pair', self.get_direction(catalogue)),
+            pairs.offset,
+        )
+
+    def get_positions_by_key(self, index_type_id, index_group):
+        """
+        Return a dict, which maps the keys of all indices or index pairs of
+        a given index type to their positions in `get_indices()` and
+        `get_pairs()` respectively.
+        """
+        catalogue = self.catalogues[index_type_id]
+        if index_group != 'pair':
+            return catalogue.get_positions_by_key(index_group)
+
+        if index_type_id not in self.positions_by_key:
+            pairs = self.get_pairs(index_type_id)
+            positions = catalogue.get_positions_by_key(
+                'pair', self.get_direction(catalogue))
+
+            # Shift the positions the same way as the pairs
+            size, offset = len(pairs), pairs.offset
+            self.positions_by_key[index_type_id] = {
+                k: [(x - offset) % size for x in v]
+                for k, v in positions.items()
+            }
+        return self.positions_by_key[index_type_id]
+
+    def get_direction(self, catalogue):
+        return self.direction \
+            if self.direction in catalogue.DIRECTIONS else 'diagonal'
 
     @staticmethod
     def create_index_dict(format='', index_type='', read_type='', prefix='',
@@ -196,11 +547,22 @@ class IndexGenerator:
     index_length = 0
     format = ''
     mode = ''
-    MAX_ATTEMPTS = 30
+    score = None
+    distances = None
+    iterations = 0
     MAX_RANDOM_SAMPLES = 5
+    MAX_ITERATIONS = 2000
+    TIME_BUDGET = 2.0  # seconds
 
-    def __init__(self, library_ids, sample_ids, start_coord, direction):
+    def __init__(self, library_ids, sample_ids, start_coord, direction,
+                 seed=None, min_distances=None, progress=None):
         self._result = []
+        self.progress = progress
+
+        # All random decisions are taken from a seeded generator,
+        # so that the result can be reproduced
+        self.seed = seed if seed is not None else random.randrange(2 ** 32)
+        self.random = random.Random(self.seed)
 
         self.libraries = Library.objects.filter(
             pk__in=library_ids
@@ -256,6 +618,13 @@ class IndexGenerator:
 
         index_types = self.validate_index_types(records)
 
+        # Optional minimum Hamming distances between the indices I7, I5
+        # and the index pairs of the pool, e.g., {'pair': 3}
+        self.min_distances = {
+            k: v for k, v in (min_distances or {}).items()
+            if v and (k != 'i5' or self.mode == 'dual')
+        }
+
         self.index_registry = IndexRegistry(
             self.mode, index_types, start_coord, direction)
 
@@ -287,8 +656,19 @@ class IndexGenerator:
 
         return index_types
 
+    @property
+    def cycles(self):
+        """ Number of cycles of an index pair (I7 + I5). """
+        return self.index_length * (2 if self.mode == 'dual' else 1)
+
     def generate(self):
-        """ Main method that generates indices. """
+        """
+        Main method that generates indices.
+
+        The indices are assigned by a greedy build, which enforces the
+        uniqueness of the index pairs, followed by a local search, which
+        improves the worst-cycle color balance score of the pool.
+        """
         if self.num_libraries > 0:
             self.add_libraries_to_result()
 
@@ -298,21 +678,21 @@ class IndexGenerator:
             self._result.append(
                 self.create_result_dict(
                     self.samples[0], index_i7, index_i5))
+            self.score = self.calculate_pool_score()
+            self.distances = self.calculate_distance_report()
             return self.result
 
-        depths = [x.sequencing_depth for x in self.samples]
-        init_index_pairs, init_indices_i7, init_indices_i5 = [], [], []
-
-        if any(self._result):
-            depths = [x['sequencing_depth'] for x in self._result] + depths
-
-            # If there are libraries in the result, extract their indices
-            for item in self._result:
-                init_index_pairs.append((item['index_i7'], item['index_i5']))
-                init_indices_i7.append(item['index_i7'])
-                init_indices_i5.append(item['index_i5'])
+        optimizer = PoolOptimizer(
+            self.cycles, self.random, self.min_distances, self.progress)
 
-        depths = self.sort_sequencing_depths(depths)
+        # Libraries can't be changed
+        for item in self._result:
+            green, red = self.encode_pair(item['index_i7'], item['index_i5'])
+            optimizer.add_fixed(
+                green, red, item['sequencing_depth'],
+                (item['index_i7']['index'], item['index_i5']['index']),
+                self.encode_codes(item['index_i7'], item['index_i5']),
+            )
 
         # Group samples by the index type format
         plate_samples, tube_samples = [], []
@@ -322,107 +702,226 @@ class IndexGenerator:
             else:
                 tube_samples.append(sample)
 
+        assignments = {}
+
         # If the number of samples with index type 'plate' is large enough,
         # or read_type is "long"
         # take pairs in the selected order (don't actually generate them)
-        if len(plate_samples) > self.MAX_RANDOM_SAMPLES or self.samples[0].index_type.read_type == 'long':
+        if len(plate_samples) > self.MAX_RANDOM_SAMPLES or \
+                self.samples[0].index_type.read_type == 'long':
+            init_index_pairs = [
+                (x['index_i7'], x['index_i5']) for x in self._result]
             pairs = self.find_pairs_fixed(plate_samples, init_index_pairs)
-            for pair in pairs:
-                init_index_pairs.append(pair)
-                init_indices_i7.append(pair[0])
-                init_indices_i5.append(pair[1])
+            for sample, pair in zip(plate_samples, pairs):
+                assignments[sample.pk] = pair
+                green, red = self.encode_pair(*pair)
+                optimizer.add_fixed(
+                    green, red, sample.sequencing_depth,
+                    (pair[0]['index'], pair[1]['index']),
+                    self.encode_codes(*pair),
+                )
             plate_samples = []
 
-        # Ignore the first sample because it will be processed separately
-        if not any(init_index_pairs):
-            if self.samples[0].index_type.format == 'plate':
-                plate_samples.pop(0)
-            else:
-                tube_samples.pop(0)
-
-        attempt = 0
-        is_ok = False
-
-        while not is_ok and attempt < self.MAX_ATTEMPTS:
-            init_pairs = list(init_index_pairs)
-            init_i7 = list(init_indices_i7)
-            init_i5 = list(init_indices_i5)
-
-            if not any(init_pairs):
-                pair_1 = self.find_random(self.samples[0])
-                init_pairs.append(pair_1)
-                init_i7.append(pair_1[0])
-                init_i5.append(pair_1[1])
-
-            # Find index pairs
-            pairs = self.find_pairs(plate_samples, depths, init_pairs)
-            # Extract indices from the pairs
-            # for pair in pairs[1:]:
-            for pair in pairs[len(init_pairs):]:
-                init_i7.append(pair[0])
-                init_i5.append(pair[1])
-
-            # Find indices I7 and I5 independently
-            indices_i7 = self.find_indices(
-                tube_samples, depths, 'i7', init_i7)
-            if self.mode == 'single':
-                indices_i5 = [
-                    self.index_registry.create_index_dict()] * len(indices_i7)
-            else:
-                indices_i5 = self.find_indices(
-                    tube_samples, depths, 'i5', init_i5)
-
-            # Ensure uniqueness
-            i7_extracted = [x['index'] for x in indices_i7]
-            i5_extracted = [x['index'] for x in indices_i5]
-            all_pairs = list(zip(i7_extracted, i5_extracted))
-
-            # If all pairs are unique, exit. Otherwise, re-generate the indices
-            if len(all_pairs) == len(set(all_pairs)):
-                is_ok = True
+        slots = OrderedDict()
+        for sample in plate_samples + tube_samples:
+            slots[sample.pk] = self.create_slot(sample)
+            optimizer.add_slot(slots[sample.pk])
 
-            attempt += 1
+        optimizer.build()
+        optimizer.improve(self.TIME_BUDGET, self.MAX_ITERATIONS)
+        self.iterations = optimizer.iterations
 
-        if not is_ok:
-            raise ValueError('Failed to generate indices.')
+        # Samples of the same index type and with the same sequencing depth
+        # are interchangeable: give them their indices sorted by ID
+        groups = OrderedDict()
+        for sample in self.samples:
+            if sample.pk in slots:
+                key = (slots[sample.pk].group, sample.sequencing_depth)
+                groups.setdefault(key, []).append(sample.pk)
 
-        # Skip indices which are already in the result
-        indices_i7 = indices_i7[len(self._result):]
-        indices_i5 = indices_i5[len(self._result):]
+        for sample_ids in groups.values():
+            pairs = self.sort_pairs([
+                self.get_slot_pair(slots[x]) for x in sample_ids])
+            assignments.update(zip(sample_ids, pairs))
 
         # Add generated indices to the result
-        for i, sample in enumerate(self.samples):
+        for sample in self.samples:
+            index_i7, index_i5 = assignments[sample.pk]
             self._result.append(
-                self.create_result_dict(
-                    sample, indices_i7[i], indices_i5[i]))
+                self.create_result_dict(sample, index_i7, index_i5))
 
+        self.score = self.calculate_pool_score()
+        self.distances = self.calculate_distance_report()
         return self.result
 
+    def create_slot(self, sample):
+        """ Create an optimizer slot for a given sample. """
+        index_type = sample.index_type
+        scored = index_type.read_type != 'long'
+
+        if index_type.format == 'plate':
+            pairs = self.index_registry.get_pairs(index_type.pk)
+            green, red = self.index_registry.get_colors(
+                index_type.pk, 'pair', self.cycles)
+            keys = self.index_registry.get_keys(index_type.pk, 'pair')
+            positions = self.index_registry.get_positions_by_key(
+                index_type.pk, 'pair')
+            codes = self.index_registry.get_codes(
+                index_type.pk, 'pair', self.index_length)
+            variables = [Variable(
+                'pair', pairs, green, red, keys, scored, codes, positions)]
+            return Slot(
+                sample.sequencing_depth, ('plate', index_type.pk), variables)
+
+        variables = []
+        groups = ['i7', 'i5'] if self.mode == 'dual' else ['i7']
+        for i, index_group in enumerate(groups):
+            indices = self.index_registry.get_indices(
+                index_type.pk, index_group)
+            green, red = self.index_registry.get_colors(
+                index_type.pk, index_group, self.index_length)
+            codes = self.index_registry.get_codes(
+                index_type.pk, index_group, self.index_length)
+            keys = self.index_registry.get_keys(index_type.pk, index_group)
+            positions = self.index_registry.get_positions_by_key(
+                index_type.pk, index_group)
+
+            # Lay the colors out over all cycles of the pool
+            width = (len(indices), self.cycles - self.index_length)
+            empty = np.zeros(width, dtype=bool)
+            if index_group == 'i7':
+                green, red = np.hstack([green, empty]), np.hstack([red, empty])
+                codes = (codes, None)
+            else:
+                green, red = np.hstack([empty, green]), np.hstack([empty, red])
+                codes = (None, codes)
+
+            variables.append(Variable(
+                index_group, indices, green, red, keys, scored, codes,
+                positions))
+
+        # Index I5 is not set in the 'single' mode
+        if self.mode == 'dual':
+            default_key, default_codes = (None, None), (None, None)
+        else:
+            default_key, default_codes = (None, ''), (None, NO_CODE)
+
+        return Slot(
+            sample.sequencing_depth, ('tube', index_type.pk), variables,
+            default_key, default_codes,
+        )
+
+    def get_slot_pair(self, slot):
+        """ Return the chosen pair (Index I7, Index I5) of a slot. """
+        chosen = {x.part: x.items[x.choice] for x in slot.variables}
+        if 'pair' in chosen:
+            return (chosen['pair'].index1, chosen['pair'].index2)
+        return (
+            chosen['i7'],
+            chosen.get('i5', self.index_registry.create_index_dict()),
+        )
+
+    def encode_pair(self, index_i7, index_i5):
+        """ Return the color vectors of a pair (Index I7, Index I5). """
+        green, red = encode_colors(
+            [self.concat_pair(index_i7, index_i5)], self.cycles)
+        return green[0], red[0]
+
+    def encode_codes(self, index_i7, index_i5):
+        """ Return the encoded indices of a pair (I7, I5). """
+        return (
+            encode_index(index_i7['index'], self.index_length),
+            encode_index(index_i5['index'], self.index_length)
+            if self.mode == 'dual' else NO_CODE,
+        )
+
+    def concat_pair(self, index_i7, index_i5):
+        """
+        Concatenate the sequences of a pair (Index I7, Index I5), each of
+        them padded or truncated to the index length.
+        """
+        def pad(index):
+            return (index or '').ljust(self.index_length)[:self.index_length]
+
+        sequence = pad(index_i7['index'])
+        if self.mode == 'dual':
+            sequence += pad(index_i5['index'])
+        return sequence
+
+    def calculate_cycle_scores(self):
+        """
+        Return the per-cycle color balance scores of the result
+        (see `calculate_cycle_scores()` in scoring).
+        """
+        distribution = ColorDistribution(self.cycles)
+        for item in self._result:
+            distribution.add(
+                self.concat_pair(item['index_i7'], item['index_i5']),
+                item['sequencing_depth'],
+            )
+        return distribution.calculate_scores()
+
+    def calculate_pool_score(self):
+        """ Return the worst-cycle color balance score of the result. """
+        scores = self.calculate_cycle_scores()
+        return round(float(scores.max()), 2) if len(scores) else None
+
+    def calculate_distance_report(self):
+        """
+        Return the minimum pairwise Hamming distances between the indices
+        I7, I5 and the index pairs of the result, and the names of the
+        closest records, e.g.,
+
+        {'i7': {'min_distance': 3, 'closest': ['Sample1', 'Sample2']}, ...}
+        """
+        codes7 = encode_indices(
+            [x['index_i7']['index'] for x in self._result], self.index_length)
+        distances = {'i7': hamming_distances(codes7, codes7)}
+        distances['pair'] = distances['i7']
+
+        if self.mode == 'dual':
+            codes5 = encode_indices(
+                [x['index_i5']['index'] for x in self._result],
+                self.index_length,
+            )
+            distances['i5'] = hamming_distances(codes5, codes5)
+            distances['pair'] = distances['i7'] + distances['i5']
+
+        report = {}
+        for part, part_distances in distances.items():
+            value, closest = min_distance(part_distances)
+            report[part] = {
+                'min_distance': value,
+                'closest': [self._result[x]['name'] for x in closest]
+                if closest else [],
+            }
+        return report
+
     def add_libraries_to_result(self):
         """ Add all libraries directly to the result. """
 
-        def idx_dict(class_model, index, index_type):
-            idx = class_model.objects.filter(
-                index=index, index_type=index_type)
-            if idx:
-                idx = self.index_registry.create_index_dict(
-                    index_type.format, index_type.pk, index_type.read_type, idx[0].prefix,
-                    idx[0].number, idx[0].index, is_library=True)
-            else:
-                idx = self.index_registry.create_index_dict(
+        def idx_dict(index_group, index, index_type):
+            # Resolve the index from the cached catalogue, no queries needed
+            catalogue = self.index_registry.catalogues[index_type.pk]
+            found = catalogue.find_index(index_group, index)
+            if found is None:
+                return self.index_registry.create_index_dict(
                     index=index, is_library=True)
-            return idx
+
+            prefix, number = found
+            return self.index_registry.create_index_dict(
+                index_type.format, index_type.pk, index_type.read_type,
+                prefix, number, index, is_library=True)
 
         no_index = []
         with_index = []
 
         for library in self.libraries:
-            index_i7 = idx_dict(IndexI7, library.index_i7, library.index_type)
+            index_i7 = idx_dict('i7', library.index_i7, library.index_type)
             index_i5 = self.index_registry.create_index_dict(is_library=True)
 
             if self.mode == 'dual':
-                index_i5 = idx_dict(
-                    IndexI5, library.index_i5, library.index_type)
+                index_i5 = idx_dict('i5', library.index_i5, library.index_type)
 
             d = self.create_result_dict(library, index_i7, index_i5)
             if d['index_i7']['prefix'] != '':
@@ -440,157 +939,28 @@ class IndexGenerator:
         """ Find a pair of random indices I7/I5 for a given sample. """
 
         if sample.index_type.format == 'single':
-            index_i7 = random.choice(
+            index_i7 = self.random.choice(
                 self.index_registry.get_indices(sample.index_type.pk, 'i7'))
             index_i5 = self.index_registry.create_index_dict()
             if self.mode == 'dual':
-                index_i5 = random.choice(
+                index_i5 = self.random.choice(
                     self.index_registry.get_indices(
                         sample.index_type.pk, 'i5'))
             return (index_i7, index_i5)
 
         else:
-            pair = random.choice(
+            pair = self.random.choice(
                 self.index_registry.get_pairs(sample.index_type.pk))
             return (pair.index1, pair.index2)
 
-    def find_indices(self, samples, depths, index_group, init_indices):
-        """ Generate indices for given samples and index group (I7/I5). """
-        if not any(samples):
-            return init_indices
-
-        indices = list(init_indices)
-
-        for sample in samples:
-            index = self.find_index(
-                sample, index_group, indices, depths)
-            if 'index' not in index:
-                raise ValueError('Index not found.')
-            index = index['index']
-            indices.append(index)
-
-        if len(indices) == len(init_indices) + len(samples):
-            library_indices = [x for x in indices if x['is_library']]
-            plate_indices = [x for x in indices if x['format'] ==
-                             'plate' and not x['is_library']]
-            tube_indices = [x for x in indices if x['format'] ==
-                            'single' and not x['is_library']]
-            return library_indices + plate_indices + \
-                self.sort_indices(tube_indices)
-        raise ValueError(f'Could not generate indices "{index_group}" ' +
-                         'for the selected samples.')
-
-
-    def find_index(self, sample, index_group, current_indices, depths):
-        """ Helper function for `find_indices()`. """
-        indices_in_result = [x['index'] for x in current_indices]
-        result_index = {'avg_score': 100.0}
-
-        indices = list(self.index_registry.get_indices(
-            sample.index_type.pk, index_group))
-        random.shuffle(indices)
-
-        # Ensure uniqueness
-        if self.mode == 'single':
-            indices = [
-                x for x in indices
-                if x['index'] not in indices_in_result
-            ]
-
-        # Calculate color distribution
-        color_distribution, total_depth = self.calculate_color_distribution(
-            indices_in_result, depths, sample)
-
-        for index in indices:
-            if sample.index_type.read_type == 'long':
-                result_index = {'avg_score': 999, 'index': index}  # don't need to check score
-            else:
-                converted_index = self.convert_index(index['index'])
-                scores = self.calculate_scores(
-                    sample, converted_index, color_distribution, total_depth)
-                avg_score = sum(scores) / self.index_length
-                if avg_score < result_index['avg_score']:
-                    result_index = {'avg_score': avg_score, 'index': index}
-
-        return result_index
-
-    def find_pairs(self, samples, depths, init_pairs):
-        """ Generate index pairs for given samples. """
-        if not any(samples):
-            return init_pairs
-        pairs = list(init_pairs)
-
-        for sample in samples:
-            pair = self.find_pair(sample, depths, pairs)
-            if 'pair' not in pair:
-                raise ValueError('Pair not found.')
-            pair = pair['pair']
-            pairs.append(pair)
-
-        if len(pairs) == len(init_pairs) + len(samples):
-            library_pairs = [x for x in pairs if x[0]['is_library']]
-            plate_pairs = [x for x in pairs if not x[0]['is_library']]
-            if len(plate_pairs) <= self.MAX_RANDOM_SAMPLES:
-                plate_pairs = self.sort_pairs(plate_pairs)
-            return library_pairs + plate_pairs
-
-        raise ValueError('Could not generate index pairs for the ' +
-                         'selected samples.')
-
-    def find_pair(self, sample, depths, current_pairs):
-        """ Helper function for `find_pairs()`. """
-        result_pair = {'avg_score': 100.0}
-        pairs = list(self.index_registry.get_pairs(sample.index_type.pk))
-        random.shuffle(pairs)
-
-        # Ensure uniqueness
-        if self.mode == 'single':
-            pairs = [
-                x for x in pairs
-                if (x.index1, x.index2) not in current_pairs
-            ]
-
-        if self.mode == 'single':
-            indices_in_result = list(map(
-                lambda x: x[0]['index'], current_pairs))
-        else:
-            indices_in_result = list(map(
-                lambda x: x[0]['index'] + x[1]['index'],
-                current_pairs,
-            ))
-
-        # Calculate color distribution
-        index_length = len(indices_in_result[0])
-        color_distribution, total_depth = self.calculate_color_distribution(
-            indices_in_result, depths, sample)
-
-        for pair in pairs:
-            if sample.index_type.read_type == 'long':
-                result_pair = {
-                    'avg_score': 999,
-                    'pair': (pair.index1, pair.index2),
-                }
-            else:
-                converted_index = self.convert_index(
-                    self._concat_index_pair(pair))
-                scores = self.calculate_scores(
-                    sample, converted_index, color_distribution, total_depth)
-                avg_score = sum(scores) / index_length
-                if avg_score < result_pair['avg_score']:
-                    result_pair = {
-                        'avg_score': avg_score,
-                        'pair': (pair.index1, pair.index2),
-                    }
-
-        return result_pair
-
     def find_pairs_fixed(self, plate_samples, init_index_pairs):
         """
         Return subsequent index pairs from the Index Registry
         starting from the first one.
         """
         result = []
-        indices_in_result = [(x[0]['index'], x[1]['index']) for x in init_index_pairs]
+        indices_in_result = set(
+            (x[0]['index'], x[1]['index']) for x in init_index_pairs)
         # Group by index type
         samples_dict = OrderedDict()
         for sample in plate_samples:
@@ -600,67 +970,23 @@ class IndexGenerator:
 
         for index_type_id, samples in samples_dict.items():
             pairs = self.index_registry.get_pairs(index_type_id)
-            # ensure uniqueness
-            if self.mode == 'single':
-                pairs = [
-                    x for x in pairs
-                    if (x.index1['index'], x.index2['index']) not in indices_in_result
-                ]
-            if len(samples) > len(pairs):
-                raise IndexError(f'Not enough indices of type {sample.index_type} for given number of samples')
-            for i, sample in enumerate(samples):
+            keys = self.index_registry.get_keys(index_type_id, 'pair')
+
+            # Ensure uniqueness, index dicts are created only for
+            # the taken pairs
+            available = [
+                i for i, key in enumerate(keys)
+                if key not in indices_in_result
+            ]
+            if len(samples) > len(available):
+                raise IndexError(f'Not enough indices of type {samples[0].index_type} for given number of samples')
+            for i, sample in zip(available, samples):
                 pair = pairs[i]
                 result.append((pair.index1, pair.index2))
+                indices_in_result.add(keys[i])
 
         return result
 
-    def calculate_color_distribution(self, indices, sequencing_depths, sample):
-        total_depth = 0
-        index_length = len(indices[0])
-        color_distribution = [{'G': 0, 'R': 0} for _ in range(index_length)]
-        for i, index in enumerate(indices):
-            idx = self.convert_index(index)
-            for cycle in range(index_length):
-                color = idx[cycle]
-                color_distribution[cycle][color] += sequencing_depths[i]
-            total_depth += sequencing_depths[i]
-        total_depth += sample.sequencing_depth
-        return color_distribution, total_depth
-
-    def calculate_scores(self, current_sample, current_converted_index,
-                         current_color_distribution, total_depth):
-        """
-        Calculate the scores for a given sample.
-
-        Score is an absolute difference between the sequencing depths of
-        the two indices divided by the total sequencing depth (in %).
-
-        The ideal score is 0.0 (50% green and 50% red),
-        an acceptable score is 60.0 (80%/20% or 20%/80%).
-
-        If the score > 60%, then the indices are not compatible.
-        """
-        distribution = list(current_color_distribution)
-        result = []
-
-        for cycle in range(len(current_converted_index)):
-            color = current_converted_index[cycle]
-            distribution[cycle][color] += current_sample.sequencing_depth
-
-            if distribution[cycle]['G'] > 0 and distribution[cycle]['R'] > 0:
-                difference = abs((distribution[cycle]['G'] -
-                                  distribution[cycle]['R']) /
-                                 total_depth) * 100
-                result.append(difference)
-            else:
-                result.append(100.0)
-
-        return result
-
-    def _concat_index_pair(self, pair):
-        return pair.index1['index'] + pair.index2['index'] \
-            if self.mode == 'dual' else pair.index1['index']
-
     @property
     def result(self):
         """ Construct a list of all records and their indices. """
@@ -685,31 +1011,6 @@ class IndexGenerator:
 
         return result
 
-    @staticmethod
-    def sort_sequencing_depths(depths):
-        """ Sort sequencing depths to improve the result. """
-        counter = Counter(depths)
-        keys = counter.keys()
-        min_value, max_value = min(keys), max(keys)
-
-        if min_value == max_value:
-            return depths
-        elif counter[min_value] >= counter[max_value]:
-            return sorted(depths)
-        else:
-            return sorted(depths, reverse=True)
-
-    @staticmethod
-    def convert_index(index):
-        """ Convert A/C into R (red) and T into G (green). """
-        return re.sub('T', 'G', re.sub('A|C', 'R', index))
-
-    @staticmethod
-    def sort_indices(indices):
-        """ Sort indices I7/I5 by ID. """
-        return sorted(
-            indices, key=lambda x: (x['index_type'], int(x['number'])))
-
     @staticmethod
     def sort_pairs(pairs):
         """ Sort index pairs (only by Index I7 ID). """
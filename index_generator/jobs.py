@@ -0,0 +1,81 @@
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import IndexGeneratorJob
+from .batch import generate_pool
+
+logger = logging.getLogger('db')
+
+# Minimum time between two progress updates of a job (in seconds)
+PROGRESS_INTERVAL = 0.5
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.INDEX_GENERATOR_WORKERS)
+    return _executor
+
+
+def submit_job(job):
+    """
+    Run a job in a worker thread once the current transaction is committed.
+    """
+    transaction.on_commit(
+        lambda: get_executor().submit(_run_in_thread, job.pk))
+
+
+def _run_in_thread(job_id):
+    try:
+        run_job(job_id)
+    finally:
+        # Every thread has its own database connection
+        connection.close()
+
+
+def run_job(job_id):
+    """
+    Generate indices for a job and store the result. Every update of
+    the job also sets its update time, which tells that it is still
+    running (see `IndexGeneratorJob.fail_stale()`). Jobs which have been
+    failed in the meantime aren't started or updated.
+    """
+    jobs = IndexGeneratorJob.objects.filter(pk=job_id)
+    running = jobs.filter(status='running')
+    state = {'progress': None, 'last_update': 0.0}
+
+    def progress(value):
+        state['progress'] = value
+        now = time.monotonic()
+        if now - state['last_update'] >= PROGRESS_INTERVAL:
+            state['last_update'] = now
+            running.update(progress=value, update_time=timezone.now())
+
+    if not jobs.filter(status='pending').update(
+            status='running', update_time=timezone.now()):
+        return
+
+    try:
+        result = generate_pool(jobs.get().parameters, progress)
+    except Exception as e:
+        logger.exception(e)
+        running.update(
+            status='failed', message=str(e), update_time=timezone.now())
+        return
+
+    if result['success']:
+        running.update(
+            status='done', progress=state['progress'], result=result,
+            update_time=timezone.now())
+    else:
+        running.update(
+            status='failed', progress=state['progress'],
+            message=result['message'], update_time=timezone.now())
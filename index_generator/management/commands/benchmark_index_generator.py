@@ -0,0 +1,69 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from index_generator.benchmark import (
+    PLATE_LAYOUTS,
+    INDEX_LENGTHS,
+    get_cases,
+    run_case,
+)
+
+
+class Command(BaseCommand):
+    help = ('Benchmark the index generator on synthetic index types and '
+            'samples. All created objects are rolled back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lengths', type=int, nargs='+',
+                            default=INDEX_LENGTHS, help='index lengths')
+        parser.add_argument('--modes', nargs='+', default=['single', 'dual'],
+                            choices=['single', 'dual'], help='index modes')
+        parser.add_argument('--formats', nargs='+',
+                            default=['tube', 'plate'],
+                            choices=['tube', 'plate'], help='index formats')
+        parser.add_argument('--sizes', type=int, nargs='+',
+                            default=sorted(PLATE_LAYOUTS),
+                            help='number of tube indices or plate wells')
+        parser.add_argument('--samples', type=int, default=24,
+                            help='number of samples per pool')
+        parser.add_argument('--repeats', type=int, default=5,
+                            help='number of runs (seeds) per case')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='seed of the first run')
+
+    def handle(self, *args, **options):
+        if 'plate' in options['formats']:
+            unsupported = set(options['sizes']) - set(PLATE_LAYOUTS)
+            if unsupported:
+                raise CommandError(
+                    'Unsupported plate sizes: ' +
+                    ', '.join(str(x) for x in sorted(unsupported)) + '.')
+
+        formats = [
+            'single' if x == 'tube' else x for x in options['formats']]
+        cases = get_cases(
+            options['lengths'], options['modes'], formats,
+            options['sizes'], options['samples'])
+
+        self.stdout.write(
+            f'{"Case":<45} {"Time, s":>9} {"Max, s":>9} {"Iter.":>7} ' +
+            f'{"Worst":>7} {"Mean":>7} {"Failed":>7}')
+
+        for case in cases:
+            report = run_case(case, options['repeats'], options['seed'])
+            self.stdout.write(self.format_report(report))
+            for error in report['errors']:
+                self.stdout.write(self.style.WARNING(f'  {error}'))
+
+    @staticmethod
+    def format_report(report):
+        def fmt(value, precision=2):
+            return '-' if value is None else f'{value:.{precision}f}'
+
+        return (
+            f'{report["case"]:<45} {fmt(report["time"], 3):>9} ' +
+            f'{fmt(report["max_time"], 3):>9} ' +
+            f'{fmt(report["iterations"], 0):>7} ' +
+            f'{fmt(report["worst_score"]):>7} ' +
+            f'{fmt(report["mean_score"]):>7} ' +
+            f'{report["failure_rate"] * 100:>6.0f}%'
+        )
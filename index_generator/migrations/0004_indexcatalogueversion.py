@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 12:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('index_generator', '0003_poolsize_obsolete'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndexCatalogueVersion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField(default=0, verbose_name='Version')),
+            ],
+            options={
+                'verbose_name': 'Index Catalogue Version',
+                'verbose_name_plural': 'Index Catalogue Versions',
+            },
+        ),
+    ]
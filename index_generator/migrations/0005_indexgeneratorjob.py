@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 12:00
+from __future__ import unicode_literals
+
+from django.conf import settings
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('index_generator', '0004_indexcatalogueversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndexGeneratorJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('create_time', models.DateTimeField(auto_now_add=True, verbose_name='Create Time')),
+                ('update_time', models.DateTimeField(auto_now=True, verbose_name='Update Time')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10, verbose_name='Status')),
+                ('parameters', django.contrib.postgres.fields.jsonb.JSONField(verbose_name='Parameters')),
+                ('progress', django.contrib.postgres.fields.jsonb.JSONField(blank=True, null=True, verbose_name='Progress')),
+                ('result', django.contrib.postgres.fields.jsonb.JSONField(blank=True, null=True, verbose_name='Result')),
+                ('message', models.TextField(blank=True, verbose_name='Message')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='User')),
+            ],
+            options={
+                'verbose_name': 'Index Generator Job',
+                'verbose_name_plural': 'Index Generator Jobs',
+            },
+        ),
+    ]
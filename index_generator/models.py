@@ -1,7 +1,10 @@
+import datetime
 import itertools
 
-from django.db import models
+from django.db import models, connection
 from django.conf import settings
+from django.utils import timezone
+from django.contrib.postgres.fields import JSONField
 
 from common.models import DateTimeMixin
 from library.models import Library
@@ -59,3 +62,78 @@ class Pool(DateTimeMixin):
             # Update the pool name after receiving a Pool id
             self.name = f'Pool_{self.pk}'
             self.save()
+
+
+class IndexGeneratorJob(DateTimeMixin):
+    """ Index generation, which runs in the background. """
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, verbose_name='User')
+    status = models.CharField(
+        'Status', max_length=10, choices=STATUS_CHOICES, default='pending')
+    parameters = JSONField('Parameters')
+    progress = JSONField('Progress', blank=True, null=True)
+    result = JSONField('Result', blank=True, null=True)
+    message = models.TextField('Message', blank=True)
+
+    class Meta:
+        verbose_name = 'Index Generator Job'
+        verbose_name_plural = 'Index Generator Jobs'
+
+    def __str__(self):
+        return f'Job {self.pk} ({self.status})'
+
+    @classmethod
+    def fail_stale(cls, queryset=None):
+        """
+        Fail the unfinished jobs which haven't been updated (see
+        `jobs.run_job()`) for longer than the job timeout, e.g., because
+        the server was restarted.
+        """
+        if queryset is None:
+            queryset = cls.objects.all()
+        timeout = datetime.timedelta(
+            minutes=settings.INDEX_GENERATOR_JOB_TIMEOUT_MINUTES)
+        return queryset.filter(
+            status__in=['pending', 'running'],
+            update_time__lte=timezone.now() - timeout,
+        ).update(
+            status='failed',
+            message='The job has been interrupted.',
+            update_time=timezone.now(),
+        )
+
+
+class IndexCatalogueVersion(models.Model):
+    """
+    Version of the index catalogues (indices and index pairs), shared by
+    all processes. It is increased whenever the catalogues are changed.
+    """
+    version = models.PositiveIntegerField('Version', default=0)
+
+    class Meta:
+        verbose_name = 'Index Catalogue Version'
+        verbose_name_plural = 'Index Catalogue Versions'
+
+    def __str__(self):
+        return str(self.version)
+
+    @classmethod
+    def get(cls):
+        version = cls.objects.values_list('version', flat=True).first()
+        return version or 0
+
+    @classmethod
+    def increment(cls):
+        """ Increase the version in one statement. """
+        table = cls._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(f'''
+                INSERT INTO {table} (id, version) VALUES (1, 1)
+                ON CONFLICT (id) DO UPDATE SET version = {table}.version + 1
+            ''')
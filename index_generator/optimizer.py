@@ -0,0 +1,463 @@
+import time
+
+import numpy as np
+
+from .scoring import calculate_cycle_scores
+from .distance import NO_CODE, hamming_distances
+
+# Objective values closer than this are considered equal
+EPSILON = 1e-9
+
+
+def get_own_key(part, key):
+    """
+    Return the part of an (I7, I5) key which is set by a variable of
+    a given part: the index I7 ('i7'), I5 ('i5') or the whole key ('pair').
+    """
+    if part == 'i7':
+        return key[0]
+    if part == 'i5':
+        return key[1]
+    return key
+
+
+class Variable:
+    """
+    A single choice to make for a sample: an index pair ('pair'),
+    an index I7 ('i7') or an index I5 ('i5').
+
+    `green` and `red` are the (candidates x cycles) color matrices of the
+    candidates laid out over all cycles of the pool, `keys` contains the
+    (I7, I5) part every candidate contributes to the sample's index pair
+    (None for the part it doesn't set). `codes` are the encoded indices
+    I7 and I5 of the candidates (see `distance.encode_indices()`, None for
+    the part it doesn't set).
+    `positions` maps the part of a key the variable sets to the positions
+    of the candidates (see `get_own_key()`).
+    """
+
+    def __init__(self, part, items, green, red, keys, scored=True,
+                 codes=(None, None), positions=None):
+        self.part = part
+        self.items = items
+        self.green = green
+        self.red = red
+        self.keys = keys
+        self.scored = scored
+        self.codes = codes
+        self.slot = None
+        self.choice = None
+
+        if positions is None:
+            positions = {}
+            for i, key in enumerate(keys):
+                positions.setdefault(get_own_key(part, key), []).append(i)
+        self.positions = positions
+
+
+class Slot:
+    """ A sample and the variables which define its indices. """
+
+    def __init__(self, depth, group, variables, default_key=(None, None),
+                 default_codes=(None, None)):
+        self.depth = depth
+        self.group = group
+        self.variables = variables
+        self.default_key = default_key
+        self.default_codes = default_codes
+
+        for variable in self.variables:
+            variable.slot = self
+
+    def get_key(self, exclude=None):
+        """
+        Return the (I7, I5) pair of the sample, None if it's not complete.
+        """
+        index1, index2 = self.default_key
+        for variable in self.variables:
+            if variable is exclude:
+                continue
+            if variable.choice is None:
+                return None
+            key1, key2 = variable.keys[variable.choice]
+            index1 = key1 if key1 is not None else index1
+            index2 = key2 if key2 is not None else index2
+        return (index1, index2)
+
+    def get_codes(self, exclude=None):
+        """
+        Return the encoded (I7, I5) of the sample, None for a part which
+        is not chosen yet.
+        """
+        codes = list(self.default_codes)
+        for variable in self.variables:
+            if variable is exclude or variable.choice is None:
+                continue
+            for i, part_codes in enumerate(variable.codes):
+                if part_codes is not None:
+                    codes[i] = part_codes[variable.choice]
+        return tuple(codes)
+
+    def get_colors(self):
+        """ Return the color vectors of the chosen candidates. """
+        green = sum(x.green[x.choice] for x in self.variables)
+        red = sum(x.red[x.choice] for x in self.variables)
+        return green.astype(float), red.astype(float)
+
+
+class PoolOptimizer:
+    """
+    Seeded index assignment for a pool: a greedy build, which takes the
+    best scoring unique candidate for every variable, followed by a local
+    search, which re-assigns single variables and swaps the assignments
+    of samples (of the same group) as long as the worst-cycle score (and
+    then the mean score) of the pool improves.
+
+    All random decisions are taken from a given `random.Random` object,
+    so a seed reproduces the result, unless the search is stopped by the
+    time budget before it converges.
+
+    `min_distances` optionally sets the minimum Hamming distance between
+    the indices I7 ('i7'), I5 ('i5') and the index pairs ('pair') of any
+    two samples of the pool.
+
+    `progress` is an optional callable, which receives the state of the
+    search (see `report_progress()`) after every step.
+    """
+
+    def __init__(self, cycles, rng, min_distances=None, progress=None):
+        self.cycles = cycles
+        self.rng = rng
+        self.progress = progress
+        self.min_distances = {
+            k: v for k, v in (min_distances or {}).items() if v}
+        self.fixed_codes = []
+        self.green = np.zeros(cycles)
+        self.red = np.zeros(cycles)
+        self.total_depth = 0
+        # Depth of all placed variables, a sample with indices I7 and I5
+        # counts twice (only used for the relative greedy scores)
+        self.placed_depth = 0
+        self.used = set()
+        self.slots = []
+        self.iterations = 0
+
+    def add_fixed(self, green, red, depth, key, codes=(None, None)):
+        """ Add an index (pair) which can't be changed, e.g., a library. """
+        self.green += green * depth
+        self.red += red * depth
+        self.total_depth += depth
+        self.placed_depth += depth
+        self.used.add(key)
+        self.fixed_codes.append(codes)
+
+    def add_slot(self, slot):
+        self.slots.append(slot)
+        self.total_depth += slot.depth
+
+    @property
+    def variables(self):
+        return [x for slot in self.slots for x in slot.variables]
+
+    def get_allowed(self, variable):
+        """
+        Return a boolean array of the candidates, which would keep the
+        index pairs unique (and the minimum distances).
+        """
+        slot = variable.slot
+        allowed = np.ones(len(variable.keys), dtype=bool)
+
+        if self.min_distances:
+            allowed &= self.get_distance_mask(variable)
+
+        other = slot.get_key(exclude=variable)
+        if other is None:
+            # The sample is not complete yet, nothing to compare
+            return allowed
+
+        current = slot.get_key() if variable.choice is not None else None
+        index1, index2 = other
+
+        # Look up the candidates, which would repeat a used index pair,
+        # instead of checking every candidate
+        for key in self.used:
+            if key == current:
+                continue
+            if variable.part == 'i7' and key[1] != index2:
+                continue
+            if variable.part == 'i5' and key[0] != index1:
+                continue
+
+            positions = variable.positions.get(
+                get_own_key(variable.part, key))
+            if positions:
+                allowed[positions] = False
+
+        return allowed
+
+    def get_distance_mask(self, variable):
+        """
+        Return a boolean array of the candidates, which keep the minimum
+        Hamming distances to the indices of all other samples.
+        """
+        slot = variable.slot
+        size = len(variable.keys)
+        mask = np.ones(size, dtype=bool)
+        if size == 0:
+            return mask
+
+        others = self.fixed_codes + [
+            x.get_codes() for x in self.slots if x is not slot]
+
+        # Candidate indices I7 and I5, a part the variable doesn't set
+        # is the same for all candidates
+        candidates = []
+        for i, own_code in enumerate(slot.get_codes(exclude=variable)):
+            if variable.codes[i] is not None:
+                candidates.append(variable.codes[i])
+            elif own_code is not None:
+                candidates.append(np.tile(
+                    np.asarray(own_code, dtype=np.uint64), (size, 1)))
+            else:
+                candidates.append(None)
+
+        distances = [None, None]
+        for i, part in enumerate(['i7', 'i5']):
+            if candidates[i] is None:
+                continue
+
+            codes = [x[i] if x[i] is not None else NO_CODE for x in others]
+            known = np.array([x[i] is not None for x in others], dtype=bool)
+            distances[i] = np.where(
+                known, hamming_distances(candidates[i], codes), -1)
+
+            # Only check the part the variable sets
+            limit = self.min_distances.get(part)
+            if limit and variable.codes[i] is not None and known.any():
+                mask &= distances[i][:, known].min(axis=1) >= limit
+
+        limit = self.min_distances.get('pair')
+        if limit and others and None not in distances:
+            pair_distances = distances[0] + distances[1]
+            known = (distances[0][0] >= 0) & (distances[1][0] >= 0)
+            if known.any():
+                mask &= pair_distances[:, known].min(axis=1) >= limit
+
+        return mask
+
+    def place(self, variable, choice):
+        """ Assign a candidate to a variable. """
+        slot = variable.slot
+        if variable.choice is not None:
+            self.remove(variable)
+
+        variable.choice = choice
+        self.green += variable.green[choice] * slot.depth
+        self.red += variable.red[choice] * slot.depth
+        self.placed_depth += slot.depth
+
+        key = slot.get_key()
+        if key is not None:
+            self.used.add(key)
+
+    def remove(self, variable):
+        """ Unassign a variable. """
+        slot = variable.slot
+        key = slot.get_key()
+        if key is not None:
+            self.used.discard(key)
+
+        self.green -= variable.green[variable.choice] * slot.depth
+        self.red -= variable.red[variable.choice] * slot.depth
+        self.placed_depth -= slot.depth
+        variable.choice = None
+
+    def build(self):
+        """
+        Greedily assign the variables: pairs first, then indices I7,
+        then indices I5.
+        """
+        parts = ['pair', 'i7', 'i5']
+        variables = sorted(self.variables, key=lambda x: parts.index(x.part))
+
+        for variable in variables:
+            allowed = self.get_allowed(variable)
+            order = list(range(len(allowed)))
+            self.rng.shuffle(order)
+            order = [i for i in order if allowed[i]]
+
+            if not order:
+                if self.min_distances:
+                    raise ValueError(
+                        'Not enough unique indices with the minimum ' +
+                        'distance for the selected samples.')
+                raise ValueError(
+                    'Not enough unique indices for the selected samples.')
+
+            if not variable.scored or self.placed_depth == 0:
+                # Nothing to compare with (or don't need to check the score)
+                self.place(variable, order[0])
+            else:
+                avg_scores = self.get_avg_scores(variable, order)
+                self.place(variable, order[int(avg_scores.argmin())])
+
+            self.report_progress('build')
+
+    def get_avg_scores(self, variable, candidates):
+        """
+        Return the average scores of the placed variables together with
+        each of the given candidates of a variable, relative to the placed
+        sequencing depth.
+        """
+        depth = variable.slot.depth
+        green = self.green + variable.green[candidates] * depth
+        red = self.red + variable.red[candidates] * depth
+        scores = calculate_cycle_scores(
+            green, red, self.placed_depth + depth)
+
+        # Sum the cycles in order, so that ties don't depend on the
+        # summation order of NumPy
+        total = np.zeros(len(scores))
+        for cycle in range(self.cycles):
+            total += scores[:, cycle]
+        return total / self.cycles
+
+    def get_score(self, green=None, red=None):
+        """
+        Return the worst-cycle and the mean score of the pool (or of
+        given color distributions).
+        """
+        green = self.green if green is None else green
+        red = self.red if red is None else red
+        scores = calculate_cycle_scores(green, red, self.total_depth)
+        return scores.max(axis=-1), scores.mean(axis=-1)
+
+    def improve(self, time_budget, max_iterations):
+        """
+        Run the local search until no move improves the score, or until
+        the time budget or the number of iterations is exhausted.
+        """
+        variables = [x for x in self.variables if x.scored]
+        if not variables or self.cycles == 0:
+            return
+
+        groups = {}
+        for slot in self.slots:
+            groups.setdefault(slot.group, []).append(slot)
+        swappable = [
+            slot for slot in self.slots
+            if len(set(x.depth for x in groups[slot.group])) > 1
+            and all(x.scored for x in slot.variables)
+        ]
+
+        deadline = time.monotonic() + time_budget
+        score = self.get_score()
+        stale = 0
+
+        while self.iterations < max_iterations and \
+                stale < 2 * len(variables) and time.monotonic() < deadline:
+            self.iterations += 1
+
+            if swappable and self.rng.random() < 0.5:
+                slot = swappable[self.rng.randrange(len(swappable))]
+                new_score = self.try_swap(slot, groups[slot.group], score)
+            else:
+                variable = variables[self.rng.randrange(len(variables))]
+                new_score = self.try_replace(variable, score)
+
+            if new_score is None:
+                stale += 1
+            else:
+                score = new_score
+                stale = 0
+
+            self.report_progress('improve', score)
+
+    def try_replace(self, variable, score):
+        """
+        Assign the best allowed candidate to a variable if it improves the
+        score. Return the new score or None.
+        """
+        depth = variable.slot.depth
+        green = self.green - variable.green[variable.choice] * depth
+        red = self.red - variable.red[variable.choice] * depth
+
+        worst, mean = self.get_score(
+            green + variable.green * depth, red + variable.red * depth)
+
+        allowed = self.get_allowed(variable)
+        for i in np.lexsort((mean, worst)):
+            if allowed[i]:
+                break
+        else:
+            return None
+
+        new_score = (worst[i], mean[i])
+        if i == variable.choice or not self.is_better(new_score, score):
+            return None
+
+        self.place(variable, int(i))
+        return new_score
+
+    def try_swap(self, slot, group, score):
+        """
+        Swap the assignments of a sample and a random sample (with another
+        sequencing depth) of the same group if it improves the score.
+        Return the new score or None.
+        """
+        others = [x for x in group if x.depth != slot.depth]
+        other = others[self.rng.randrange(len(others))]
+
+        green1, red1 = slot.get_colors()
+        green2, red2 = other.get_colors()
+        diff = other.depth - slot.depth
+        new_score = self.get_score(
+            self.green + (green1 - green2) * diff,
+            self.red + (red1 - red2) * diff,
+        )
+
+        if not self.is_better(new_score, score):
+            return None
+
+        # Swapping keeps the index pairs unique
+        self.used.discard(slot.get_key())
+        self.used.discard(other.get_key())
+        for variable1, variable2 in zip(slot.variables, other.variables):
+            variable1.choice, variable2.choice = \
+                variable2.choice, variable1.choice
+        self.used.add(slot.get_key())
+        self.used.add(other.get_key())
+
+        self.green += (green1 - green2) * diff
+        self.red += (red1 - red2) * diff
+
+        return new_score
+
+    def report_progress(self, stage, score=None):
+        """
+        Pass the stage ('build' or 'improve'), the number of iterations,
+        the number of complete samples and the worst-cycle score of the
+        search to the progress callback.
+        """
+        if self.progress is None:
+            return
+
+        placed = sum(
+            all(x.choice is not None for x in slot.variables)
+            for slot in self.slots
+        )
+        self.progress({
+            'stage': stage,
+            'iteration': self.iterations,
+            'samples_placed': placed,
+            'num_samples': len(self.slots),
+            'score': round(float(score[0]), 2) if score is not None else None,
+        })
+
+    @staticmethod
+    def is_better(score1, score2):
+        """ Compare (worst, mean) scores. """
+        if score1[0] < score2[0] - EPSILON:
+            return True
+        return abs(score1[0] - score2[0]) <= EPSILON and \
+            score1[1] < score2[1] - EPSILON
@@ -0,0 +1,78 @@
+import numpy as np
+
+# A/C are read in the red channel, G/T in the green one
+RED_BASES = 'AC'
+GREEN_BASES = 'GT'
+
+
+def encode_colors(indices, cycles):
+    """
+    Encode a list of index sequences as two boolean (indices x cycles)
+    matrices: one for the green and one for the red channel.
+
+    Sequences shorter than `cycles` are padded with "no color",
+    longer ones are truncated.
+    """
+    green = np.zeros((len(indices), cycles), dtype=bool)
+    red = np.zeros((len(indices), cycles), dtype=bool)
+
+    for i, index in enumerate(indices):
+        for cycle, base in enumerate(index[:cycles]):
+            if base in GREEN_BASES:
+                green[i, cycle] = True
+            elif base in RED_BASES:
+                red[i, cycle] = True
+
+    return green, red
+
+
+def calculate_cycle_scores(dist_green, dist_red, total_depth):
+    """
+    Return the per-cycle scores of one (1D arrays) or many (2D arrays)
+    color distributions: the absolute difference between the green and
+    red depths divided by the total sequencing depth (in %), or 100.0
+    if one of the channels is empty.
+    """
+    scores = np.abs((dist_green - dist_red) / total_depth) * 100
+    scores[(dist_green <= 0) | (dist_red <= 0)] = 100.0
+    return scores
+
+
+class ColorDistribution:
+    """
+    Running per-cycle color distribution of a pool. Every index is encoded
+    and added (weighted by its sequencing depth) only once.
+    """
+
+    def __init__(self, cycles=None):
+        self.cycles = cycles
+        self.green = None
+        self.red = None
+        self.total_depth = 0
+        self.num_indices = 0
+
+        if cycles is not None:
+            self._init_arrays(cycles)
+
+    def _init_arrays(self, cycles):
+        self.cycles = cycles
+        self.green = np.zeros(cycles)
+        self.red = np.zeros(cycles)
+
+    def add(self, index, depth):
+        """ Add an index with a given sequencing depth. """
+        # The first added index defines the number of cycles
+        if self.green is None:
+            self._init_arrays(len(index))
+
+        green, red = encode_colors([index], self.cycles)
+        self.green += green[0] * depth
+        self.red += red[0] * depth
+        self.total_depth += depth
+        self.num_indices += 1
+
+    def calculate_scores(self):
+        """ Return the per-cycle scores of the current distribution. """
+        if self.green is None:
+            return np.zeros(0)
+        return calculate_cycle_scores(self.green, self.red, self.total_depth)
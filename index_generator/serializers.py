@@ -8,7 +8,7 @@ from rest_framework.serializers import (
     IntegerField,
 )
 
-from .models import PoolSize
+from .models import PoolSize, IndexGeneratorJob
 
 Request = apps.get_model('request', 'Request')
 Library = apps.get_model('library', 'Library')
@@ -26,6 +26,13 @@ class PoolSizeSerializer(ModelSerializer):
         return f'{obj.multiplier}x{obj.size}'
 
 
+class IndexGeneratorJobSerializer(ModelSerializer):
+    class Meta:
+        model = IndexGeneratorJob
+        fields = ('id', 'status', 'progress', 'result', 'message',
+                  'create_time', 'update_time',)
+
+
 class IndexGeneratorListSerializer(ListSerializer):
     def update(self, instance, validated_data):
         # Maps for id->instance and id->data item.
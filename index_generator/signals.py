@@ -0,0 +1,28 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from library_sample_shared.models import IndexType, IndexI7, IndexI5, IndexPair
+from .index_generator import invalidate_catalogues
+
+
+@receiver([post_save, post_delete], sender=IndexType)
+@receiver([post_save, post_delete], sender=IndexI7)
+@receiver([post_save, post_delete], sender=IndexI5)
+@receiver([post_save, post_delete], sender=IndexPair)
+def invalidate_index_catalogues(sender, **kwargs):
+    """
+    When an index type, an index or an index pair is changed, drop the
+    cached index catalogues of the index generator.
+    """
+    invalidate_catalogues()
+
+
+@receiver(m2m_changed, sender=IndexType.indices_i7.through)
+@receiver(m2m_changed, sender=IndexType.indices_i5.through)
+def invalidate_index_catalogues_m2m(sender, action, **kwargs):
+    """
+    When indices are added to or removed from an index type, drop the
+    cached index catalogues of the index generator.
+    """
+    if action in ['post_add', 'post_remove', 'post_clear']:
+        invalidate_catalogues()
@@ -1,7 +1,15 @@
+import random
 import json
 import string
+import datetime
 from collections import namedtuple
 
+from io import StringIO
+
+from django.test import override_settings
+from django.core.management import call_command
+from django.utils import timezone
+
 from common.tests import BaseTestCase
 from common.utils import get_random_name
 
@@ -20,8 +28,22 @@ from library_sample_shared.models import (
 from library.models import Library
 from sample.models import Sample
 
-from .models import Pool, PoolSize
-from .index_generator import IndexRegistry, IndexGenerator
+from .models import (
+    Pool, PoolSize, IndexGeneratorJob, IndexCatalogueVersion,
+)
+from .index_generator import (
+    IndexRegistry, IndexGenerator, increment_catalogue_version,
+)
+from .scoring import encode_colors, ColorDistribution
+from .optimizer import PoolOptimizer, Variable, Slot
+from .jobs import run_job
+from .benchmark import BenchmarkCase, get_cases, run_case
+from .distance import (
+    encode_index,
+    encode_indices,
+    hamming_distances,
+    min_distance,
+)
 
 
 Index = namedtuple('Index', ['prefix', 'number', 'index'])
@@ -434,6 +456,55 @@ class TestIndexRegistry(BaseTestCase):
             ['B4', 'C5', 'A4', 'B5', 'A5', 'E1', 'D1', 'E2']
         )
 
+    def test_cached_catalogue(self):
+        """ Ensure index pairs are fetched only once per index type. """
+        IndexRegistry('dual', [self.index_type2], 'A1', 'right')
+
+        # Only the catalogue version is fetched
+        with self.assertNumQueries(1):
+            index_registry = IndexRegistry(
+                'dual', [self.index_type2], 'C3', 'down')
+            coordinates = [
+                x.coordinate
+                for x in index_registry.pairs[self.index_type2.pk]
+            ][:5]
+
+        self.assertEqual(coordinates, ['C3', 'D3', 'E3', 'A4', 'B4'])
+
+    def test_cached_catalogue_invalidation(self):
+        """ Ensure the cached indices are updated when an index is added. """
+        index_registry = IndexRegistry('single', [self.index_type1])
+        self.assertEqual(
+            len(index_registry.indices[self.index_type1.pk]['i7']), 6)
+
+        index = IndexI7(prefix='Z', number='01', index='ACGTAC')
+        index.save()
+        self.index_type1.indices_i7.add(index)
+
+        # The catalogues are dropped only after the commit
+        version = IndexCatalogueVersion.get()
+        increment_catalogue_version()
+        self.assertEqual(IndexCatalogueVersion.get(), version + 1)
+
+        index_registry = IndexRegistry('single', [self.index_type1])
+        self.assertEqual(
+            len(index_registry.indices[self.index_type1.pk]['i7']), 7)
+
+    def test_pair_keys_follow_rotation(self):
+        """ Ensure the keys and positions match the rotated pairs. """
+        index_registry = IndexRegistry(
+            'dual', [self.index_type2], 'C3', 'down')
+        pairs = index_registry.get_pairs(self.index_type2.pk)
+        keys = index_registry.get_keys(self.index_type2.pk, 'pair')
+        positions = index_registry.get_positions_by_key(
+            self.index_type2.pk, 'pair')
+
+        self.assertEqual(len(keys), len(pairs))
+        for i, pair in enumerate(pairs):
+            key = (pair.index1['index'], pair.index2['index'])
+            self.assertEqual(keys[i], key)
+            self.assertIn(i, positions[key])
+
     def test_invalid_start_coordinate(self):
         with self.assertRaises(ValueError) as context:
             IndexRegistry('dual', [self.index_type2], 'test')
@@ -447,7 +518,7 @@ class TestIndexRegistry(BaseTestCase):
 
 class TestIndexGenerator(BaseTestCase):
     def setUp(self):
-        self.create_user()
+        self.user = self.create_user()
         self.login()
 
         self.pool_size = PoolSize(multiplier=1, size=200)
@@ -910,6 +981,36 @@ class TestIndexGenerator(BaseTestCase):
         self.assertIn(data['data'][1]['index_i7_id'], index_i7_ids)
         self.assertIn(data['data'][1]['index_i5_id'], index_i5_ids)
 
+    def test_libraries_indices_resolved_without_queries(self):
+        """ Ensure library indices are resolved from the catalogue. """
+        libraries = []
+        for index_i7, index_i5 in zip(INDICES_2[:4], INDICES_3[:4]):
+            library = create_library(
+                get_random_name(),
+                read_length=self.read_length,
+                index_type=self.index_type2,
+            )
+            library.index_i7 = index_i7.index
+            library.index_i5 = index_i5.index
+            library.save()
+            libraries.append(library.pk)
+
+        sample = create_sample(
+            get_random_name(),
+            read_length=self.read_length,
+            index_type=self.index_type2,
+        )
+
+        index_generator = IndexGenerator(libraries, [sample.pk], None, None)
+        with self.assertNumQueries(0):
+            index_generator.add_libraries_to_result()
+
+        result = index_generator.result
+        self.assertEqual(
+            [x['index_i7_id'] for x in result], ['B01', 'B02', 'B03', 'B04'])
+        self.assertEqual(
+            [x['index_i5_id'] for x in result], ['C01', 'C02', 'C03', 'C04'])
+
     def test_libraries_and_samples_format_plate_mode_single(self):
         index_i7_ids = [x.index_id for x in self.index_type6.indices_i7.all()]
 
@@ -1068,6 +1169,146 @@ class TestIndexGenerator(BaseTestCase):
         self.assertIn(data['data'][1]['index_i7_id'], index_i7_ids)
         self.assertIn(data['data'][1]['index_i5_id'], index_i5_ids)
 
+    def test_same_seed_same_result(self):
+        """ Ensure a seed reproduces the generated indices. """
+        samples = []
+        for depth in [10, 10, 20, 30, 40]:
+            sample = create_sample(
+                get_random_name(),
+                read_length=self.read_length,
+                index_type=self.index_type2,
+            )
+            sample.sequencing_depth = depth
+            sample.save()
+            samples.append(sample.pk)
+
+        results = []
+        for _ in range(2):
+            response = self.client.post(
+                '/api/index_generator/generate_indices/', {
+                    'samples': json.dumps(samples),
+                    'seed': 42,
+                })
+            data = response.json()
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(data['success'])
+            self.assertEqual(data['seed'], 42)
+            self.assertIsNotNone(data['score'])
+            results.append(data)
+
+        self.assertEqual(results[0]['data'], results[1]['data'])
+        self.assertEqual(results[0]['score'], results[1]['score'])
+
+        # All index pairs are unique
+        pairs = [
+            (x['index_i7_id'], x['index_i5_id'])
+            for x in results[0]['data']
+        ]
+        self.assertEqual(len(pairs), len(set(pairs)))
+
+    def test_min_distance(self):
+        """ Ensure the index pairs keep the minimum Hamming distance. """
+        samples = []
+        for _ in range(4):
+            sample = create_sample(
+                get_random_name(),
+                read_length=self.read_length,
+                index_type=self.index_type2,
+            )
+            samples.append(sample.pk)
+
+        response = self.client.post(
+            '/api/index_generator/generate_indices/', {
+                'samples': json.dumps(samples),
+                'min_distance_pair': 2,
+            })
+        data = response.json()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(data['success'])
+
+        distances = data['distances']
+        self.assertEqual(set(distances.keys()), {'i7', 'i5', 'pair'})
+        self.assertGreaterEqual(distances['pair']['min_distance'], 2)
+        self.assertEqual(len(distances['pair']['closest']), 2)
+
+    @override_settings(INDEX_GENERATOR_WORKERS=1)
+    def test_generate_indices_batch(self):
+        """ Ensure every pool of a batch gets its own result. """
+        samples = []
+        for _ in range(2):
+            sample = create_sample(
+                get_random_name(),
+                read_length=self.read_length,
+                index_type=self.index_type2,
+            )
+            samples.append(sample.pk)
+
+        pools = [
+            {
+                'samples': samples,
+                'pool_size_id': self.pool_size.pk,
+                'seed': 42,
+            },
+            {'samples': []},
+            {'samples': samples[:1], 'pool_size_id': -1},
+        ]
+
+        response = self.client.post(
+            '/api/index_generator/generate_indices_batch/', {
+                'pools': json.dumps(pools),
+            })
+        data = response.json()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(data['success'])
+        self.assertEqual(len(data['pools']), 3)
+
+        result = data['pools'][0]
+        self.assertTrue(result['success'])
+        self.assertEqual(len(result['data']), 2)
+        self.assertEqual(result['seed'], 42)
+        self.assertEqual(result['pool_size_id'], self.pool_size.pk)
+
+        self.assertFalse(data['pools'][1]['success'])
+        self.assertEqual(data['pools'][1]['message'], 'No samples provided.')
+        self.assertFalse(data['pools'][2]['success'])
+        self.assertEqual(data['pools'][2]['message'], 'Invalid Pool Size id.')
+
+    def test_background_job(self):
+        """ Ensure a background job stores its progress and result. """
+        samples = []
+        for _ in range(3):
+            sample = create_sample(
+                get_random_name(),
+                read_length=self.read_length,
+                index_type=self.index_type2,
+            )
+            samples.append(sample.pk)
+
+        response = self.client.post(
+            '/api/index_generator/generate_indices/', {
+                'samples': json.dumps(samples),
+                'seed': 42,
+                'background': 'true',
+            })
+        data = response.json()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(data['success'])
+
+        job_id = data['job_id']
+        job = IndexGeneratorJob.objects.get(pk=job_id)
+        self.assertEqual(job.status, 'pending')
+
+        run_job(job_id)
+
+        response = self.client.get(f'/api/index_generator_jobs/{job_id}/')
+        data = response.json()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['status'], 'done')
+        self.assertEqual(data['progress']['num_samples'], 3)
+        self.assertEqual(data['progress']['samples_placed'], 3)
+        self.assertEqual(len(data['result']['data']), 3)
+        self.assertEqual(data['result']['seed'], 42)
+
     # Test failing data
 
     def test_save_pool_not_unique(self):
@@ -1206,6 +1447,38 @@ class TestIndexGenerator(BaseTestCase):
 
     # Test data validation
 
+    def test_invalid_seed(self):
+        sample = create_sample(
+            get_random_name(),
+            read_length=self.read_length,
+            index_type=self.index_type1,
+        )
+
+        response = self.client.post('/api/index_generator/generate_indices/', {
+            'samples': json.dumps([sample.pk]),
+            'seed': 'foo',
+        })
+        self.assertEqual(response.status_code, 400)
+        data = response.json()
+        self.assertFalse(data['success'])
+        self.assertEqual(data['message'], 'Invalid seed.')
+
+    def test_invalid_min_distance(self):
+        sample = create_sample(
+            get_random_name(),
+            read_length=self.read_length,
+            index_type=self.index_type1,
+        )
+
+        response = self.client.post('/api/index_generator/generate_indices/', {
+            'samples': json.dumps([sample.pk]),
+            'min_distance_i7': -1,
+        })
+        self.assertEqual(response.status_code, 400)
+        data = response.json()
+        self.assertFalse(data['success'])
+        self.assertEqual(data['message'], 'Invalid minimum distance.')
+
     def test_no_samples(self):
         """ Ensure error is thrown if no samples have been provided. """
         response = self.client.post('/api/index_generator/generate_indices/')
@@ -1214,6 +1487,57 @@ class TestIndexGenerator(BaseTestCase):
         self.assertFalse(data['success'])
         self.assertEqual(data['message'], 'No samples provided.')
 
+    def test_background_job_failed(self):
+        job = IndexGeneratorJob(user=self.user, parameters={
+            'libraries': [],
+            'samples': [],
+            'start_coord': None,
+            'direction': None,
+            'seed': None,
+            'min_distances': {},
+        })
+        job.save()
+
+        run_job(job.pk)
+
+        response = self.client.get(f'/api/index_generator_jobs/{job.pk}/')
+        data = response.json()
+        self.assertEqual(data['status'], 'failed')
+        self.assertEqual(data['message'], 'No samples provided.')
+        self.assertIsNone(data['result'])
+
+    def test_stale_background_job(self):
+        """ Ensure jobs without updates are failed when they are polled. """
+        job = IndexGeneratorJob(user=self.user, parameters={})
+        job.save()
+        IndexGeneratorJob.objects.filter(pk=job.pk).update(
+            status='running',
+            update_time=timezone.now() - datetime.timedelta(hours=1),
+        )
+
+        response = self.client.get(f'/api/index_generator_jobs/{job.pk}/')
+        data = response.json()
+        self.assertEqual(data['status'], 'failed')
+        self.assertEqual(data['message'], 'The job has been interrupted.')
+
+        # A failed job isn't started anymore
+        run_job(job.pk)
+        self.assertEqual(
+            IndexGeneratorJob.objects.get(pk=job.pk).status, 'failed')
+
+        job = IndexGeneratorJob(user=self.user, parameters={})
+        job.save()
+        response = self.client.get(f'/api/index_generator_jobs/{job.pk}/')
+        self.assertEqual(response.json()['status'], 'pending')
+
+    def test_generate_indices_batch_no_pools(self):
+        response = self.client.post(
+            '/api/index_generator/generate_indices_batch/')
+        self.assertEqual(response.status_code, 400)
+        data = response.json()
+        self.assertFalse(data['success'])
+        self.assertEqual(data['message'], 'No pools provided.')
+
     def test_read_length(self):
         """ Ensure error is thrown if Read Length is not the same. """
         library = create_library(get_random_name())
@@ -1306,9 +1630,102 @@ class TestIndexGenerator(BaseTestCase):
 
     # Test static methods
 
-    def test_index_convertion(self):
-        converted_index = IndexGenerator.convert_index('ATCACG')
-        self.assertEqual(converted_index, 'RGRRRG')
+    def test_color_encoding(self):
+        green, red = encode_colors(['ATCACG', 'GTN'], 6)
+        self.assertEqual(green.astype(int).tolist(), [
+            [0, 1, 0, 0, 0, 1],
+            [1, 1, 0, 0, 0, 0],
+        ])
+        self.assertEqual(red.astype(int).tolist(), [
+            [1, 0, 1, 1, 1, 0],
+            [0, 0, 0, 0, 0, 0],
+        ])
+
+    def test_candidate_scores(self):
+        """
+        Ensure the candidates are scored like the pool distribution with
+        each of them added.
+        """
+        placed = [('GTAAAT', 1.5), ('CGATCC', 4.0)]
+        candidates = [x.index for x in INDICES_2]
+        depth = 2.0
+
+        optimizer = PoolOptimizer(6, random.Random(0))
+        for i, (index, index_depth) in enumerate(placed):
+            green, red = encode_colors([index], 6)
+            optimizer.add_fixed(green[0], red[0], index_depth, (i, None))
+
+        green, red = encode_colors(candidates, 6)
+        variable = Variable(
+            'i7', candidates, green, red, [(x, None) for x in candidates])
+        Slot(depth, None, [variable])
+        avg_scores = optimizer.get_avg_scores(
+            variable, list(range(len(candidates))))
+
+        for candidate, score in zip(candidates, avg_scores):
+            distribution = ColorDistribution()
+            for index, index_depth in placed + [(candidate, depth)]:
+                distribution.add(index, index_depth)
+            self.assertAlmostEqual(
+                score, distribution.calculate_scores().mean())
+
+    def test_running_color_distribution(self):
+        """ Ensure the running distribution sums the indices' colors. """
+        distribution = ColorDistribution()
+        for index, depth in zip(['GTAAAT', 'CGATCC'], [1.5, 4.0]):
+            distribution.add(index, depth)
+
+        self.assertEqual(
+            distribution.green.tolist(), [1.5, 5.5, 0, 4.0, 0, 1.5])
+        self.assertEqual(
+            distribution.red.tolist(), [4.0, 0, 5.5, 1.5, 5.5, 4.0])
+        self.assertEqual(distribution.total_depth, 5.5)
+
+        score = (4.0 - 1.5) / 5.5 * 100
+        self.assertEqual(
+            distribution.calculate_scores().tolist(),
+            [score, 100.0, 100.0, score, 100.0, score])
+
+    def test_hamming_distances(self):
+        """ Ensure the bit-packed distances match a base-by-base count. """
+        indices = ['GTAAAT', 'CGATCC', 'TACGTT', 'GTAAAA', 'ACGTAC']
+        codes = encode_indices(indices, 6)
+        self.assertEqual(tuple(codes[0]), encode_index('GTAAAT', 6))
+
+        expected = [
+            [sum(a != b for a, b in zip(x, y)) for y in indices]
+            for x in indices
+        ]
+        distances = hamming_distances(codes, codes)
+        self.assertEqual(distances.tolist(), expected)
+        self.assertEqual(min_distance(distances), (1, (0, 3)))
+        self.assertEqual(min_distance(distances[:1, :1]), (None, None))
+
+    def test_hamming_distances_unknown_bases(self):
+        """
+        Ensure unknown bases (e.g., N) aren't compared, rather than being
+        read as A.
+        """
+        codes = encode_indices(['GTNAAT', 'GTAAAT', 'GTCAAT', 'ATAAAT'], 6)
+        self.assertEqual(hamming_distances(codes[:1], codes).tolist(), [
+            [0, 0, 0, 1],
+        ])
+        self.assertEqual(hamming_distances(codes[1:2], codes).tolist(), [
+            [0, 0, 1, 1],
+        ])
+
+    def test_hamming_distances_short_indices(self):
+        """ Ensure only the common length of indices is compared. """
+        codes = encode_indices(['ACGT', 'ACGTAA', 'ACGTCC', 'TCGT'], 6)
+        self.assertEqual(hamming_distances(codes, codes).tolist(), [
+            [0, 0, 0, 1],
+            [0, 0, 2, 1],
+            [0, 2, 0, 1],
+            [1, 1, 1, 0],
+        ])
+
+        with self.assertRaises(ValueError):
+            encode_index('ACGT', 33)
 
     def test_result_dict_creation(self):
         sample = create_sample(get_random_name())
@@ -1322,3 +1739,40 @@ class TestIndexGenerator(BaseTestCase):
             'index_i7': {},
             'index_i5': {},
         })
+
+
+class TestIndexGeneratorBenchmark(BaseTestCase):
+    def test_cases(self):
+        cases = get_cases([8], ['dual'], ['single', 'plate'], [96, 1536], 10)
+        self.assertEqual(cases, [
+            BenchmarkCase(8, 'dual', 'single', 96, 10),
+            BenchmarkCase(8, 'dual', 'single', 1536, 10),
+            BenchmarkCase(8, 'dual', 'plate', 96, 10),
+        ])
+
+    def test_run_case_tube(self):
+        report = run_case(
+            BenchmarkCase(8, 'dual', 'single', 96, 12), repeats=2)
+        self.assertEqual(report['runs'], 2)
+        self.assertEqual(report['failure_rate'], 0.0)
+        self.assertGreater(report['time'], 0)
+        self.assertGreaterEqual(report['worst_score'], report['mean_score'])
+
+        # All created objects are rolled back
+        self.assertFalse(IndexType.objects.filter(
+            name__startswith='Benchmark').exists())
+
+    def test_run_case_plate(self):
+        report = run_case(
+            BenchmarkCase(10, 'single', 'plate', 384, 24), repeats=1)
+        self.assertEqual(report['failure_rate'], 0.0)
+        self.assertIsNotNone(report['worst_score'])
+
+    def test_command(self):
+        out = StringIO()
+        call_command(
+            'benchmark_index_generator', '--lengths', '8', '--modes', 'single',
+            '--formats', 'tube', '--sizes', '96', '--samples', '4',
+            '--repeats', '1', stdout=out,
+        )
+        self.assertIn('8-mer single tube 96, 4 samples', out.getvalue())
@@ -1,9 +1,8 @@
 import json
 import logging
-import itertools
 
 from django.apps import apps
-from django.db.models import Prefetch, Q
+from django.db.models import Q
 
 from rest_framework import viewsets
 from rest_framework.response import Response
@@ -11,19 +10,25 @@ from rest_framework.decorators import action
 from rest_framework.permissions import IsAdminUser
 
 from common.mixins import LibrarySampleMultiEditMixin
+from common.streaming import (
+    StreamingJSONResponse,
+    is_streaming_requested,
+    iterate_records,
+    merge_by_barcode,
+)
 
-from .models import Pool, PoolSize
-from .index_generator import IndexGenerator
+from .models import Pool, PoolSize, IndexGeneratorJob
+from .batch import generate_pool, generate_pools
+from .jobs import submit_job
 from .serializers import (
     PoolSizeSerializer,
-    IndexGeneratorSerializer,
+    IndexGeneratorJobSerializer,
     IndexGeneratorLibrarySerializer,
     IndexGeneratorSampleSerializer,
 )
 from library_sample_shared.serializers import IndexTypeSerializer
 from django.conf import settings
 
-Request = apps.get_model('request', 'Request')
 IndexI7 = apps.get_model('library_sample_shared', 'IndexI7')
 IndexI5 = apps.get_model('library_sample_shared', 'IndexI5')
 Library = apps.get_model('library', 'Library')
@@ -74,6 +79,17 @@ class PoolSizeViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = PoolSizeSerializer
 
 
+class IndexGeneratorJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """ Get the status, progress and result of index generation jobs. """
+    permission_classes = [IsAdminUser]
+    serializer_class = IndexGeneratorJobSerializer
+
+    def get_queryset(self):
+        queryset = IndexGeneratorJob.objects.filter(user=self.request.user)
+        IndexGeneratorJob.fail_stale(queryset)
+        return queryset.order_by('-create_time')
+
+
 class IndexGeneratorViewSet(viewsets.ViewSet, LibrarySampleMultiEditMixin):
     permission_classes = [IsAdminUser]
     library_model = Library
@@ -82,7 +98,10 @@ class IndexGeneratorViewSet(viewsets.ViewSet, LibrarySampleMultiEditMixin):
     sample_serializer = IndexGeneratorSampleSerializer
 
     def list(self, request):
-        """ Get the list of libraries and samples ready for pooling. """
+        """
+        Get the list of libraries and samples ready for pooling, sorted by
+        barcode in the database. If `stream` is set, they are streamed.
+        """
 
         libraries_qs = Library.objects.select_related(
             'library_protocol',
@@ -134,35 +153,129 @@ class IndexGeneratorViewSet(viewsets.ViewSet, LibrarySampleMultiEditMixin):
             'index_type__indices_i5',
         )
 
-        queryset = Request.objects.prefetch_related(
-            Prefetch('libraries', queryset=libraries_qs),
-            Prefetch('samples', queryset=samples_qs),
+        request_fields = {
+            'request': 'request__pk',
+            'request_name': 'request__name',
+        }
+        records = merge_by_barcode(
+            iterate_records(
+                libraries_qs.filter(request__isnull=False),
+                IndexGeneratorLibrarySerializer, request_fields),
+            iterate_records(
+                samples_qs.filter(request__isnull=False),
+                IndexGeneratorSampleSerializer, request_fields),
         )
 
-        serializer = IndexGeneratorSerializer(queryset, many=True)
-        data = list(itertools.chain(*serializer.data))
-        data = sorted(data, key=lambda x: x['barcode'][3:])
-        return Response(data)
+        if is_streaming_requested(request):
+            return StreamingJSONResponse(records)
+        return Response(list(records))
 
     @action(methods=['post'], detail=False)
     def generate_indices(self, request):
-        """ Generate indices for given libraries and samples. """
-        libraries = json.loads(request.data.get('libraries', '[]'))
-        samples = json.loads(request.data.get('samples', '[]'))
-        start_coord = request.data.get('start_coord', None)
-        direction = request.data.get('direction', None)
+        """
+        Generate indices for given libraries and samples. If `background`
+        is set, start a job and return its id, the progress and the result
+        are available at `/api/index_generator_jobs/<id>/`.
+        """
+        try:
+            spec = self._get_pool_spec(request.data)
+        except ValueError as e:
+            return Response({'success': False, 'message': str(e)}, 400)
+
+        if request.data.get('background', 'False') in ['True', 'true', True]:
+            job = IndexGeneratorJob(user=request.user, parameters=spec)
+            job.save()
+            submit_job(job)
+            return Response({'success': True, 'job_id': job.pk})
+
+        result = generate_pool(spec)
+        return Response(result, 200 if result['success'] else 400)
 
+    @action(methods=['post'], detail=False)
+    def generate_indices_batch(self, request):
+        """
+        Generate indices for several pools at once. Every pool contains the
+        parameters of `generate_indices()` and an optional pool size id.
+        The pools are generated independently, errors are returned per pool.
+        """
         try:
-            index_generator = IndexGenerator(
-                libraries,
-                samples,
-                start_coord,
-                direction,
-            )
-            data = index_generator.generate()
+            pools = json.loads(request.data.get('pools', '[]'))
+            if not isinstance(pools, list) or not pools:
+                raise ValueError('No pools provided.')
+        except ValueError as e:
+            return Response({'success': False, 'message': str(e)}, 400)
+
+        pool_sizes = {x.pk: x for x in PoolSize.objects.all()}
+        results = [None] * len(pools)
+        specs = []
+
+        for i, pool in enumerate(pools):
+            try:
+                if not isinstance(pool, dict):
+                    raise ValueError('Invalid pool.')
+
+                spec = self._get_pool_spec(pool)
+                spec['position'] = i
+
+                pool_size_id = pool.get('pool_size_id', None)
+                if pool_size_id not in [None, '']:
+                    try:
+                        pool_size = pool_sizes[int(pool_size_id)]
+                    except (TypeError, ValueError, KeyError):
+                        raise ValueError('Invalid Pool Size id.')
+                    spec['capacity'] = pool_size.multiplier * pool_size.size
+
+                specs.append(spec)
+            except ValueError as e:
+                results[i] = {'success': False, 'message': str(e)}
+
+        try:
+            generated = generate_pools(specs)
         except Exception as e:
+            logger.exception(e)
             return Response({'success': False, 'message': str(e)}, 400)
-        return Response({'success': True, 'data': data})
+
+        for spec, result in zip(specs, generated):
+            results[spec['position']] = result
+
+        for pool, result in zip(pools, results):
+            if isinstance(pool, dict):
+                result['pool_size_id'] = pool.get('pool_size_id', None)
+
+        return Response({'success': True, 'pools': results})
+
+    @staticmethod
+    def _get_pool_spec(data):
+        """ Parse the index generator parameters of a pool. """
+
+        def load(value):
+            return json.loads(value) if isinstance(value, str) else value
+
+        seed = data.get('seed', None)
+        try:
+            seed = int(seed) if seed not in [None, ''] else None
+        except (TypeError, ValueError):
+            raise ValueError('Invalid seed.')
+
+        min_distances = {}
+        for part in ['i7', 'i5', 'pair']:
+            value = data.get(f'min_distance_{part}', None)
+            try:
+                value = int(value) if value not in [None, ''] else 0
+                if value < 0:
+                    raise ValueError
+            except (TypeError, ValueError):
+                raise ValueError('Invalid minimum distance.')
+            min_distances[part] = value
+
+        return {
+            'libraries': load(data.get('libraries', '[]')),
+            'samples': load(data.get('samples', '[]')),
+            'start_coord': data.get('start_coord', None),
+            'direction': data.get('direction', None),
+            'seed': seed,
+            'min_distances': min_distances,
+        }
 
     @action(methods=['post'], detail=False)
     def save_pool(self, request):
@@ -17,6 +17,7 @@ from month import Month
 from xlwt import Workbook, XFStyle
 
 from common.views import CsrfExemptSessionAuthentication
+from export.jobs import exportable
 
 from .models import (
     InvoicingReport,
@@ -164,6 +165,7 @@ class InvoicingViewSet(viewsets.ReadOnlyModelViewSet):
         return JsonResponse({'success': True})
 
     @action(methods=['get'], detail=False)
+    @exportable
     def download(self, request):
         """ Download Invoicing Report. """
         today = datetime.date.today()
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 12:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+POPULATE_SQL = '''
+UPDATE library_library
+SET barcode_key = substring(barcode from 1 for 2)::bigint * 1000000 +
+    substring(barcode from 4)::bigint
+WHERE barcode ~ '^[0-9]{2}[A-Z][0-9]+$'
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0003_library_create_time_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='library',
+            name='barcode_key',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False, verbose_name='Barcode Key'),
+        ),
+        migrations.RunSQL(POPULATE_SQL, migrations.RunSQL.noop),
+    ]
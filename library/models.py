@@ -22,3 +22,9 @@ class Library(GenericLibrarySample):
     class Meta:
         verbose_name = 'Library'
         verbose_name_plural = 'Libraries'
+        indexes = [
+            models.Index(
+                fields=['create_time', 'id'],
+                name='library_create_time_id_idx',
+            ),
+        ]
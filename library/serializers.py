@@ -8,6 +8,7 @@ from rest_framework.serializers import (
     IntegerField,
 )
 
+from common.streaming import merge_by_barcode
 from library_sample_shared.serializers import LibrarySampleBaseSerializer
 from sample.serializers import SampleSerializer
 
@@ -39,6 +40,8 @@ class RequestParentNodeSerializer(ModelSerializer):
     id = SerializerMethodField()
     cls = SerializerMethodField()
     leaf = SerializerMethodField()
+    total_records_count = SerializerMethodField()
+    total_sequencing_depth = SerializerMethodField()
 
     class Meta:
         model = Request
@@ -54,6 +57,12 @@ class RequestParentNodeSerializer(ModelSerializer):
     def get_leaf(self, obj):
         return False
 
+    def get_total_records_count(self, obj):
+        return obj.summary.records_count
+
+    def get_total_sequencing_depth(self, obj):
+        return obj.summary.total_sequencing_depth
+
 
 class LibraryChildNodeSerializer(LibrarySerializer):
     leaf = SerializerMethodField()
@@ -110,18 +119,15 @@ class RequestChildrenNodesSerializer(ModelSerializer):
 
     def to_representation(self, instance):
         data = super().to_representation(instance)
-        result = []
+        records = merge_by_barcode(data.pop('libraries'), data.pop('samples'))
 
-        for type in ['libraries', 'samples']:
-            result.extend(list(map(
+        return {
+            'children': list(map(
                 lambda x: {**x, **{
                     'id': data['id'] + x['pk'],
                     'request_id': data['request_id'],
                     'request_name': data['request_name']
                 }},
-                data.pop(type)
-            )))
-
-        return {
-            'children': sorted(result, key=lambda x: x['barcode'][3:])
+                records
+            ))
         }
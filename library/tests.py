@@ -1,7 +1,10 @@
 import json
 from datetime import datetime
+from urllib.parse import urlparse, parse_qs
 
 from django.test import TestCase
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 from django.core.urlresolvers import reverse
 
@@ -101,6 +104,10 @@ class TestLibraryModel(TestCase):
 
         updated_library = Library.objects.get(pk=self.library.pk)
         self.assertEqual(updated_library.barcode, barcode)
+        self.assertEqual(
+            updated_library.barcode_key,
+            int(barcode[:2]) * 10 ** 6 + new_counter,
+        )
 
 
 # Views
@@ -127,6 +134,17 @@ class TestLibrarySampleTree(BaseTestCase):
         self.assertEqual(response.status_code, 200)
         self.assertIn(self.request.name, data['name'])
 
+    def test_libraries_and_samples_list_cursor(self):
+        """ Ensure the requests can be paginated with a cursor. """
+        response = self.client.get(
+            reverse('libraries-and-samples-list'), {'cursor': ''})
+        data = response.json()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(data['success'])
+        self.assertIsNone(data['next'])
+        self.assertEqual(data['children'][0]['id'], self.request.pk)
+        self.assertEqual(data['children'][0]['total_records_count'], 2)
+
 
 class TestLibraries(BaseTestCase):
     """ Tests for libraries. """
@@ -172,7 +190,7 @@ class TestLibraries(BaseTestCase):
             'request_id': request.pk,
             'ids': json.dumps([library1.pk, library2.pk])
         })
-        data = response.json()
+        data = self.get_json(response)
         self.assertEqual(response.status_code, 200)
         self.assertTrue(data['success'])
         libraries = [x['name'] for x in data['data']]
@@ -180,6 +198,49 @@ class TestLibraries(BaseTestCase):
         self.assertIn(library2.name, libraries)
         self.assertNotIn(library3.name, libraries)
 
+    def test_libraries_list_number_of_queries(self):
+        """ Ensure the number of queries doesn't depend on records. """
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('libraries-list'))
+            self.get_json(response)
+        num_queries = len(context)
+
+        for _ in range(3):
+            request = Request(user=self.user)
+            request.save()
+            request.libraries.add(create_library(get_random_name()))
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('libraries-list'))
+            self.assertTrue(response.streaming)
+            data = self.get_json(response)['data']
+        self.assertEqual(len(context), num_queries)
+
+        self.assertEqual(len(data), 4)
+        self.assertEqual(data[0]['request_id'], request.pk)
+        self.assertEqual(data[0]['request_name'], request.name)
+        self.assertEqual(data[-1]['request_id'], self.request.pk)
+
+    def test_libraries_list_cursor(self):
+        """ Ensure the libraries can be paginated with a cursor. """
+        library = create_library(get_random_name())
+        self.request.libraries.add(library)
+
+        response = self.client.get(
+            reverse('libraries-list'), {'cursor': '', 'page_size': 1})
+        data = response.json()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(data['success'])
+        self.assertEqual([x['pk'] for x in data['data']], [library.pk])
+        self.assertIsNotNone(data['next'])
+
+        cursor = parse_qs(urlparse(data['next']).query)['cursor'][0]
+        response = self.client.get(
+            reverse('libraries-list'), {'cursor': cursor, 'page_size': 1})
+        data = response.json()
+        self.assertEqual([x['pk'] for x in data['data']], [self.library.pk])
+        self.assertIsNone(data['next'])
+
     def test_multiple_libraries_contains_invalid(self):
         """
         Ensure get multiple libraries containing invalid ids behaves correctly.
@@ -226,6 +287,45 @@ class TestLibraries(BaseTestCase):
         self.assertEqual(name, data['data'][0]['name'])
         self.assertEqual('Library', data['data'][0]['record_type'])
 
+    def test_add_libraries_bulk(self):
+        """ Ensure new libraries get consecutive barcodes in one insert. """
+        library = create_library(self._get_random_name())
+        items = [{
+            'name': self._get_random_name(),
+            'organism': library.organism.pk,
+            'concentration': 1.0,
+            'concentration_method': library.concentration_method.pk,
+            'read_length': library.read_length.pk,
+            'sequencing_depth': 1,
+            'library_protocol': library.library_protocol.pk,
+            'library_type': library.library_type.pk,
+            'amplification_cycles': 1,
+            'index_type': library.index_type.pk,
+            'index_reads': 0,
+            'mean_fragment_size': 1,
+        } for _ in range(5)]
+        prev_counter = BarcodeCounter.load().last_id
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(reverse('libraries-list'), {
+                'data': json.dumps(items),
+            })
+        inserts = [x for x in context.captured_queries
+                   if x['sql'].startswith('INSERT INTO "library_library"')]
+        self.assertEqual(len(inserts), 1)
+
+        data = response.json()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            [x['name'] for x in data['data']], [x['name'] for x in items])
+        self.assertTrue(all(x['pk'] for x in data['data']))
+
+        prefix = datetime.now().strftime('%y') + 'L'
+        self.assertEqual([x['barcode'] for x in data['data']], [
+            prefix + str(prev_counter + i).zfill(6) for i in range(1, 6)
+        ])
+        self.assertEqual(BarcodeCounter.load().last_id, prev_counter + 5)
+
     def test_add_library_contains_invalid(self):
         """ Ensure add library containing invalid data behaves correctly. """
         name = self._get_random_name()
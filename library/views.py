@@ -1,4 +1,5 @@
 import logging
+from collections import OrderedDict
 
 from django.apps import apps
 from django.db.models import Prefetch
@@ -6,6 +7,7 @@ from django.db.models import Prefetch
 from rest_framework import viewsets
 from rest_framework.response import Response
 
+from common.views import KeysetPagination
 from library_sample_shared.views import LibrarySampleBaseViewSet
 
 from .serializers import (
@@ -23,13 +25,10 @@ logger = logging.getLogger('db')
 
 class LibrarySampleTree(viewsets.ViewSet):
     def get_queryset(self,showAll=False):
-        libraries_qs = Library.objects.all().only('sequencing_depth')
-        samples_qs = Sample.objects.all().only('sequencing_depth')
-
-        queryset = Request.objects.prefetch_related(
-            Prefetch('libraries', queryset=libraries_qs),
-            Prefetch('samples', queryset=samples_qs),
-        ).only('name').order_by('-create_time')
+        # Record counts and depths are read from the request summaries
+        queryset = Request.objects.select_related('summary').only(
+            'name', 'create_time',
+        ).order_by('-create_time')
         if not showAll:
 
             queryset = queryset.filter(sequenced=False)
@@ -39,7 +38,11 @@ class LibrarySampleTree(viewsets.ViewSet):
         return queryset
 
     def list(self, request):
-        """ Get the list of libraries and samples. """
+        """
+        Get the list of requests (the parent nodes) or, if `node` is
+        passed, the libraries and samples of a request. If `cursor` is
+        passed, the requests are paginated by (create_time, id).
+        """
         showAll = False
         if request.GET.get('showAll') == 'True':
             showAll = True
@@ -54,14 +57,14 @@ class LibrarySampleTree(viewsets.ViewSet):
                 'read_length',
                 'index_type',
                 'organism'
-            )
+            ).order_by('barcode_key', 'pk')
             samples_qs = Sample.objects.all().select_related(
                 'nucleic_acid_type',
                 'library_protocol',
                 'library_type',
                 'read_length',
                 'organism'
-            )
+            ).order_by('barcode_key', 'pk')
 
             queryset = Request.objects.filter(pk=request_id).prefetch_related(
                 Prefetch('libraries', queryset=libraries_qs),
@@ -85,9 +88,21 @@ class LibrarySampleTree(viewsets.ViewSet):
                     'children': [],
                 }, 400)
 
+        if KeysetPagination.is_requested(request):
+            paginator = KeysetPagination()
+            page = paginator.paginate_queryset(queryset, request, self)
+            serializer = RequestParentNodeSerializer(page, many=True)
+            data = OrderedDict([('success', True)])
+            data.update(paginator.get_page_info())
+            data['children'] = serializer.data
+            return Response(data)
+
         serializer = RequestParentNodeSerializer(queryset, many=True)
         return Response({'success': True, 'children': serializer.data})
 
 
 class LibraryViewSet(LibrarySampleBaseViewSet):
     serializer_class = LibrarySerializer
+    list_select_related = LibrarySampleBaseViewSet.list_select_related + (
+        'index_type',
+    )
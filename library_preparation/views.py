@@ -15,6 +15,7 @@ from xlwt import Workbook, XFStyle, Formula
 
 from common.views import CsrfExemptSessionAuthentication
 from common.mixins import MultiEditMixin
+from export.jobs import exportable
 
 from .models import LibraryPreparation
 from .serializers import LibraryPreparationSerializer
@@ -43,7 +44,9 @@ class LibraryPreparationViewSet(MultiEditMixin, viewsets.ReadOnlyModelViewSet):
         ).prefetch_related(
             'sample__index_type__indices_i7',
             'sample__index_type__indices_i5',
-        ).filter(Q(sample__status=2) | Q(sample__status=-2))
+        ).filter(
+            Q(sample__status=2) | Q(sample__status=-2)
+        ).order_by('sample__barcode_key', 'sample')
 
     def get_context(self, queryset):
         sample_ids = queryset.values_list('sample', flat=True)
@@ -85,14 +88,14 @@ class LibraryPreparationViewSet(MultiEditMixin, viewsets.ReadOnlyModelViewSet):
         serializer = LibraryPreparationSerializer(
             queryset, many=True, context=self.get_context(queryset)
         )
-        data = sorted(serializer.data, key=lambda x: x['barcode'][3:])
-        return Response(data)
+        return Response(serializer.data)
 
 
 
     @action(methods=['post'], detail=False,
             authentication_classes=[CsrfExemptSessionAuthentication])
     # @authentication_classes((CsrfExemptSessionAuthentication))
+    @exportable
     def download_benchtop_protocol(self, request):
         """ Generate Benchtop Protocol as XLS file for selected samples. """
         ids = json.loads(request.data.get('ids', '[]'))
@@ -105,7 +108,7 @@ class LibraryPreparationViewSet(MultiEditMixin, viewsets.ReadOnlyModelViewSet):
         serializer = LibraryPreparationSerializer(
             queryset, many=True, context=self.get_context(queryset)
         )
-        data = sorted(serializer.data, key=lambda x: x['barcode'][3:])
+        data = serializer.data
 
         font_style = XFStyle()
         font_style.alignment.wrap = 1
@@ -1,9 +1,10 @@
 from datetime import datetime
 
-from django.db import models
+from django.db import connection, models
 from django.core.validators import MinValueValidator, RegexValidator
 
 from common.models import DateTimeMixin
+from common.utils import get_barcode_key
 from django.conf import settings
 
 AlphaValidator = RegexValidator(
@@ -195,6 +196,25 @@ class BarcodeCounter(models.Model):
         obj, created = cls.objects.get_or_create(year=year)
         return obj
 
+    @classmethod
+    def reserve(cls, count=1, year=None):
+        """
+        Reserve `count` consecutive ids in one statement and return the
+        first one. The counter row is locked by the statement itself, so
+        concurrent reservations never overlap.
+        """
+        year = year or datetime.now().year
+        with connection.cursor() as cursor:
+            cursor.execute(f'''
+                INSERT INTO {cls._meta.db_table} (year, last_id)
+                VALUES (%s, %s)
+                ON CONFLICT (year)
+                DO UPDATE SET last_id = {cls._meta.db_table}.last_id + %s
+                RETURNING last_id
+            ''', [year, count, count])
+            last_id = cursor.fetchone()[0]
+        return last_id - count + 1
+
     def increment(self):
         self.last_id += 1
 
@@ -312,6 +332,10 @@ class GenericLibrarySample(DateTimeMixin):
 
     barcode = models.CharField('Barcode', max_length=9)
 
+    # Sort key of the barcode, see get_barcode_key()
+    barcode_key = models.BigIntegerField(
+        'Barcode Key', default=0, db_index=True, editable=False)
+
     index_type = models.ForeignKey(
         IndexType,
         verbose_name='Index Type',
@@ -403,24 +427,32 @@ class GenericLibrarySample(DateTimeMixin):
     class Meta:
         abstract = True
 
-    def generate_barcode(self):
-        counter = BarcodeCounter.load()
-        counter.increment()
-        counter.save()
-
-        record_type = self.__class__.__name__[0]
-        barcode = datetime.now().strftime('%y') + record_type
-        barcode += '0' * (6 - len(str(counter))) + str(counter)
+    @classmethod
+    def assign_barcodes(cls, objects):
+        """
+        Set the barcodes of new records, reserving a range of ids for all
+        of them at once. The records can then be saved with bulk_create().
+        """
+        objects = list(objects)
+        if not objects:
+            return
+
+        first_id = BarcodeCounter.reserve(len(objects))
+        prefix = datetime.now().strftime('%y') + cls.__name__[0]
+        for i, obj in enumerate(objects):
+            obj.barcode = prefix + str(first_id + i).zfill(6)
+            obj.barcode_key = get_barcode_key(obj.barcode)
 
-        self.barcode = barcode
-        self.save(update_fields=['barcode'])
+    def generate_barcode(self):
+        self.assign_barcodes([self])
+        self.save(update_fields=['barcode', 'barcode_key'])
 
     def save(self, *args, **kwargs):
-        created = self.pk is None
+        # Set the barcode before inserting a new record
+        if self.pk is None:
+            self.assign_barcodes([self])
+        self.barcode_key = get_barcode_key(self.barcode)
         super().save(*args, **kwargs)
 
-        if created:
-            self.generate_barcode()
-
     def __str__(self):
         return self.name
@@ -1,3 +1,5 @@
+from django.db import transaction
+
 from rest_framework.serializers import (
     ModelSerializer,
     ListSerializer,
@@ -90,6 +92,21 @@ class LibraryTypeSerializer(ModelSerializer):
 
 class LibrarySampleBaseListSerializer(ListSerializer):
 
+    def create(self, validated_data):
+        """
+        Create all records with one query, after reserving their barcodes.
+        """
+        model = self.child.Meta.model
+        objects = []
+        for item in validated_data:
+            item = dict(item)
+            item.pop('pk', None)
+            objects.append(model(**item))
+
+        with transaction.atomic():
+            model.assign_barcodes(objects)
+            return model.objects.bulk_create(objects)
+
     def update(self, instance, validated_data):
         # Maps for id->instance and id->data item.
         object_mapping = {obj.pk: obj for obj in instance}
@@ -128,9 +145,14 @@ class LibrarySampleBaseSerializer(ModelSerializer):
         extra_kwargs = {'barcode': {'required': False}}
 
     def get_request_id(self, obj):
+        # The request might have been annotated to avoid extra queries
+        if hasattr(obj, 'request_pk'):
+            return obj.request_pk
         return obj.request.get().pk
 
     def get_request_name(self, obj):
+        if hasattr(obj, 'request_name'):
+            return obj.request_name
         return obj.request.get().name
 
     def get_library_protocol_name(self, obj):
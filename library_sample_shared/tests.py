@@ -129,6 +129,15 @@ class BarcodeCounterTest(TestCase):
         counter = BarcodeCounter.load()
         self.assertEqual(str(counter), str(counter.last_id))
 
+    def test_reserve(self):
+        self.assertEqual(BarcodeCounter.reserve(3), 2)
+        self.assertEqual(BarcodeCounter.reserve(), 5)
+        self.assertEqual(BarcodeCounter.load().last_id, 5)
+
+    def test_reserve_new_year(self):
+        self.assertEqual(BarcodeCounter.reserve(2, 2016), 1)
+        self.assertEqual(BarcodeCounter.load(2016).last_id, 2)
+
 
 class LibraryProtocolTest(TestCase):
     def setUp(self):
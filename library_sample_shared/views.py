@@ -1,12 +1,15 @@
 import json
 import logging
+from collections import OrderedDict
 
 from django.apps import apps
+from django.db.models import F
 from rest_framework import viewsets
 from rest_framework.response import Response
 from rest_framework.decorators import action
 
-from common.views import StandardResultsSetPagination
+from common.views import StandardResultsSetPagination, KeysetPagination
+from common.streaming import StreamingJSONResponse, iterate_queryset
 
 from .models import (
     ConcentrationMethod,
@@ -31,7 +34,7 @@ from .serializers import (
 )
 from django.conf import settings
 
-Request = apps.get_model('request', 'Request')
+RequestSummary = apps.get_model('request', 'RequestSummary')
 
 logger = logging.getLogger('db')
 
@@ -178,41 +181,78 @@ class LibraryTypeViewSet(MoveOtherMixin, viewsets.ReadOnlyModelViewSet):
 
 class LibrarySampleBaseViewSet(viewsets.ModelViewSet):
     pagination_class = StandardResultsSetPagination
+    keyset_pagination_class = KeysetPagination
+    list_select_related = (
+        'library_protocol',
+        'library_type',
+        'concentration_method',
+        'read_length',
+        'organism',
+    )
 
     def get_queryset(self):
         return self.get_serializer().Meta.model.objects.all()
 
-    # TODO: add pagination
     def list(self, request):
-        """ Get the list of all libraries or samples. """
-        data = []
+        """
+        Get the list of all libraries or samples. If `cursor` is passed,
+        the records are paginated by (create_time, id) instead of being
+        grouped by request, see `KeysetPagination`.
+        """
+        try:
+            queryset = self._get_list_queryset(request)
+        except ValueError:
+            return Response({
+                'success': False,
+                'message': 'Invalid payload.',
+            }, 400)
 
+        if self.keyset_pagination_class.is_requested(request):
+            paginator = self.keyset_pagination_class()
+            page = paginator.paginate_queryset(queryset, request, self)
+            serializer = self.serializer_class(page, many=True)
+
+            data = OrderedDict([('success', True)])
+            data.update(paginator.get_page_info())
+            data['data'] = serializer.data
+            return Response(data)
+
+        # Newest requests first, the records are serialized and written
+        # one by one from a server-side cursor
+        queryset = queryset.order_by('-request__create_time', 'request', 'pk')
+        return StreamingJSONResponse(
+            (self.serializer_class(x).data
+             for x in iterate_queryset(queryset)),
+            envelope={'success': True},
+        )
+
+    def _get_list_queryset(self, request):
+        """
+        Get the libraries or samples of the requests visible to the user,
+        together with their request and all displayed related objects.
+        """
         request_id = request.query_params.get('request_id', None)
         ids = json.loads(request.query_params.get('ids', '[]'))
 
+        # All conditions on the request must be in the same filter() call
+        # to share one join
+        filters = {'request__isnull': False}
         if request_id:
-            request_queryset = Request.objects.all().filter(pk=request_id)
-        else:
-            request_queryset = Request.objects.all().order_by('-create_time')
-
+            filters['request__pk'] = request_id
         if not request.user.is_staff:
-            request_queryset = request_queryset.filter(user=request.user)
-
-        for request_obj in request_queryset:
-            # TODO: sort by item['barcode'][3:]
-            records = getattr(request_obj, self._get_model_name_plural())
-            if ids:
-                try:
-                    records = records.filter(pk__in=ids)
-                except ValueError:
-                    return Response({
-                        'success': False,
-                        'message': 'Invalid payload.',
-                    }, 400)
-            serializer = self.serializer_class(records, many=True)
-            data += serializer.data
-
-        return Response({'success': True, 'data': data})
+            filters['request__user'] = request.user
+
+        queryset = self.get_queryset().filter(**filters).select_related(
+            *self.list_select_related
+        ).annotate(
+            request_pk=F('request__pk'),
+            request_name=F('request__name'),
+        )
+
+        if ids:
+            queryset = queryset.filter(pk__in=ids)
+
+        return queryset
 
     def create(self, request):
         """ Add new libraries/samples. """
@@ -282,7 +322,8 @@ class LibrarySampleBaseViewSet(viewsets.ModelViewSet):
             data=post_data, instance=objects, many=True)
 
         if serializer.is_valid():
-            serializer.save()
+            with RequestSummary.batch():
+                serializer.save()
             return Response({'success': True})
 
         else:
@@ -293,7 +334,8 @@ class LibrarySampleBaseViewSet(viewsets.ModelViewSet):
             if any(valid_data):
                 message = 'Invalid payload. Some records cannot be updated.'
                 ids = [x['pk'] for x in valid_data]
-                self._create_or_update_valid(valid_data, ids)
+                with RequestSummary.batch():
+                    self._create_or_update_valid(valid_data, ids)
                 return Response({'success': True, 'message': message}, 200)
 
             else:
@@ -315,6 +357,3 @@ class LibrarySampleBaseViewSet(viewsets.ModelViewSet):
 
     def _get_model(self):
         return self.get_serializer().Meta.model
-
-    def _get_model_name_plural(self):
-        return self._get_model()._meta.verbose_name_plural.lower()
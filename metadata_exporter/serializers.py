@@ -2,6 +2,8 @@ from django.apps import apps
 
 from rest_framework.serializers import ModelSerializer, SerializerMethodField
 
+from common.streaming import merge_by_barcode
+
 
 Request = apps.get_model('request', 'Request')
 Library = apps.get_model('library', 'Library')
@@ -105,13 +107,13 @@ class MetadataSerializer(ModelSerializer):
         flowcell = instance.flowcell.only('sequencer__name').first()
         sequencer_name = flowcell.sequencer.name if flowcell else None
 
-        for type in ['libraries', 'samples']:
-            result.extend(list(map(
-                lambda x: {**{
-                    'design_description': data['description'],
-                    'instrument_model': sequencer_name,
-                }, **x},
-                data.pop(type),
-            )))
+        records = merge_by_barcode(data.pop('libraries'), data.pop('samples'))
+        result.extend(list(map(
+            lambda x: {**{
+                'design_description': data['description'],
+                'instrument_model': sequencer_name,
+            }, **x},
+            records,
+        )))
 
         return {'result': result}
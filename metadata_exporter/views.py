@@ -16,6 +16,7 @@ from rest_framework.decorators import action
 from bioblend.galaxy import GalaxyInstance
 
 from common.views import CsrfExemptSessionAuthentication
+from export.jobs import exportable
 from .serializers import MetadataSerializer
 
 
@@ -71,8 +72,10 @@ class MetadataExporterViewSet(viewsets.ViewSet):
         ).filter(status__gte=5)
 
         queryset = Request.objects.prefetch_related(
-            Prefetch('libraries', queryset=libraries_qs),
-            Prefetch('samples', queryset=samples_qs),
+            Prefetch('libraries', queryset=libraries_qs.order_by(
+                'barcode_key', 'pk')),
+            Prefetch('samples', queryset=samples_qs.order_by(
+                'barcode_key', 'pk')),
         ).only(
             'description',
             'libraries',
@@ -85,8 +88,6 @@ class MetadataExporterViewSet(viewsets.ViewSet):
         req = get_object_or_404(queryset, pk=pk)
         serializer = MetadataSerializer(req)
         data = serializer.data.get('result')
-
-        data = sorted(data, key=lambda x: x['barcode'][3:])
         return Response(data)
 
     @action(methods=['post'], detail=False)
@@ -103,6 +104,7 @@ class MetadataExporterViewSet(viewsets.ViewSet):
 
     @action(methods=['post'], detail=True,
             authentication_classes=[CsrfExemptSessionAuthentication])
+    @exportable
     def download(self, request, pk=None):
         samples = json.loads(request.data.get('samples', '[]'))
         study_type = request.data.get('study_type', '')
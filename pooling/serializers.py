@@ -9,6 +9,8 @@ from rest_framework.serializers import (
     CharField,
 )
 
+from common.streaming import merge_by_barcode
+
 Library = apps.get_model('library', 'Library')
 Sample = apps.get_model('sample', 'Sample')
 Pool = apps.get_model('index_generator', 'Pool')
@@ -210,20 +212,20 @@ class PoolSerializer(ModelSerializer):
         if not any(data['libraries']) and not any(data['samples']):
             return []
 
-        for type in ['libraries', 'samples']:
-            result.extend(list(map(
-                lambda x: {**{
-                    'pool': data['pool'],
-                    'pool_name': data['pool_name'],
-                    'pool_size': data['pool_size'],
-                    'percentage_library': '{}%'.format(round(
-                        x['sequencing_depth'] /
-                        instance.total_sequencing_depth * 100
-                    )),
-
-                    'comment': data['comment']
-                }, **x},
-                data.pop(type),
-            )))
+        records = merge_by_barcode(data.pop('libraries'), data.pop('samples'))
+        result.extend(list(map(
+            lambda x: {**{
+                'pool': data['pool'],
+                'pool_name': data['pool_name'],
+                'pool_size': data['pool_size'],
+                'percentage_library': '{}%'.format(round(
+                    x['sequencing_depth'] /
+                    instance.total_sequencing_depth * 100
+                )),
+
+                'comment': data['comment']
+            }, **x},
+            records,
+        )))
 
         return result
@@ -120,6 +120,35 @@ class TestPooling(BaseTestCase):
         self.assertIn(pooling_object2.sample.name, objects)
         self.assertNotIn(failed_sample.name, objects)
 
+    def test_pooling_list_order(self):
+        """
+        Ensure the records are sorted by barcode, and by pool and barcode
+        in the streamed list.
+        """
+        library1 = create_library(get_random_name(), 2)
+        library2 = create_library(get_random_name(), 2)
+        library3 = create_library(get_random_name(), 2)
+        request = Request(user=self.user)
+        request.save()
+        request.libraries.add(library1, library2, library3)
+
+        pool1 = create_pool(self.user)
+        pool1.libraries.add(library3, library1)
+        pool2 = create_pool(self.user)
+        pool2.libraries.add(library2)
+
+        response = self.client.get('/api/pooling/')
+        self.assertEqual(
+            [x['name'] for x in response.json()],
+            [library1.name, library2.name, library3.name],
+        )
+
+        response = self.client.get('/api/pooling/?stream=true')
+        self.assertEqual(
+            [x['name'] for x in self.get_json(response)],
+            [library1.name, library3.name, library2.name],
+        )
+
     def test_pooling_list_non_staff(self):
         """Ensure error is thrown if a non-staff user tries to get the list."""
         self.create_user('non-staff@test.io', 'test', False)
@@ -1,7 +1,6 @@
 import json
 import time
 import logging
-import itertools
 
 from django.apps import apps
 from django.http import HttpResponse
@@ -16,6 +15,14 @@ from xlwt import Workbook, XFStyle, Formula
 
 from common.views import CsrfExemptSessionAuthentication
 from common.mixins import LibrarySampleMultiEditMixin
+from common.streaming import (
+    StreamingJSONResponse,
+    is_streaming_requested,
+    iterate_chunks,
+    merge_by_barcode,
+)
+from common.utils import merge_records
+from export.jobs import exportable
 
 from .models import Pooling
 
@@ -84,8 +91,10 @@ class PoolingViewSet(LibrarySampleMultiEditMixin, viewsets.ModelViewSet):
         return Pool.objects.select_related(
             'size'
         ).prefetch_related(
-            Prefetch('libraries', queryset=libraries_qs),
-            Prefetch('samples', queryset=samples_qs),
+            Prefetch('libraries', queryset=libraries_qs.order_by(
+                'barcode_key', 'pk')),
+            Prefetch('samples', queryset=samples_qs.order_by(
+                'barcode_key', 'pk')),
         )
 
     def get_context(self, queryset):
@@ -175,13 +184,30 @@ class PoolingViewSet(LibrarySampleMultiEditMixin, viewsets.ModelViewSet):
         }
 
     def list(self, request):
-        """ Get the list of all pooling objects. """
+        """
+        Get the list of all pooling objects, sorted by barcode. If `stream`
+        is set, the pools are fetched and streamed in chunks, ordered by
+        their ids, and the records are sorted by barcode within every pool
+        (in the database). Sorting across all pools would require loading
+        every pool first.
+        """
         queryset = self.get_queryset()
+
+        if is_streaming_requested(request):
+            return StreamingJSONResponse(self._iterate_records(queryset))
+
         serializer = PoolSerializer(
             queryset, many=True, context=self.get_context(queryset))
-        data = list(itertools.chain(*serializer.data))
-        data = sorted(data, key=lambda x: x['barcode'][3:])
-        return Response(data)
+        return Response(list(merge_by_barcode(*serializer.data)))
+
+    def _iterate_records(self, queryset, chunk_size=50):
+        """ Serialize the records pool by pool, see `list()`. """
+        for pools in iterate_chunks(queryset.order_by('pk'), chunk_size):
+            context = self.get_context(
+                queryset.filter(pk__in=[x.pk for x in pools]))
+            serializer = PoolSerializer(pools, many=True, context=context)
+            for records in serializer.data:
+                yield from records
 
     @action(methods=['post'], detail=True)
     def edit_comment(self, request, pk=None):
@@ -196,6 +222,7 @@ class PoolingViewSet(LibrarySampleMultiEditMixin, viewsets.ModelViewSet):
 
     @action(methods=['post'], detail=False,
             authentication_classes=[CsrfExemptSessionAuthentication])
+    @exportable
     def download_benchtop_protocol(self, request):
         """ Generate Benchtop Protocol as XLS file for selected records. """
         response = HttpResponse(content_type='application/ms-excel')
@@ -206,11 +233,10 @@ class PoolingViewSet(LibrarySampleMultiEditMixin, viewsets.ModelViewSet):
         pool_id = request.POST.get('pool_id', '')
         pool = Pool.objects.get(pk=pool_id)
 
-        records = list(itertools.chain(
+        records = merge_records(
             Library.objects.filter(pk__in=libraries),
             Sample.objects.filter(pk__in=samples),
-        ))
-        records = sorted(records, key=lambda x: x.barcode[3:])
+        )
 
         f_name = 'Pooling_Benchtop_Protocol.xls'
         response['Content-Disposition'] = 'attachment; filename="%s"' % f_name
@@ -402,17 +428,17 @@ class PoolingViewSet(LibrarySampleMultiEditMixin, viewsets.ModelViewSet):
 
     @action(methods=['post'], detail=False,
             authentication_classes=[CsrfExemptSessionAuthentication])
+    @exportable
     def download_pooling_template(self, request):
         """ Generate Pooling Template as XLS file for selected records. """
         response = HttpResponse(content_type='application/ms-excel')
         libraries = json.loads(request.data.get('libraries', '[]'))
         samples = json.loads(request.data.get('samples', '[]'))
 
-        records = list(itertools.chain(
+        records = merge_records(
             Library.objects.filter(pk__in=libraries),
             Sample.objects.filter(pk__in=samples),
-        ))
-        records = sorted(records, key=lambda x: x.barcode[3:])
+        )
 
         f_name = 'QC_Normalization_and_Pooling_Template.xls'
         response['Content-Disposition'] = 'attachment; filename="%s"' % f_name
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from report.turnaround import update_rollups
+
+
+class Command(BaseCommand):
+    help = ('Add the workflow stages completed since the last update to '
+            'the daily turnaround rollups.')
+
+    def handle(self, *args, **options):
+        update_rollups()
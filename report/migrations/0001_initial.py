@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 12:00
+from __future__ import unicode_literals
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+
+# Log the initial status of every new library/sample and every status
+# change, also those made by bulk updates
+TRIGGERS_SQL = '''
+-- TG_ARGV[0]: record type
+CREATE FUNCTION report_status_changed() RETURNS trigger AS $$
+DECLARE
+    previous_status smallint;
+BEGIN
+    IF TG_OP = 'UPDATE' THEN
+        previous_status := OLD.status;
+    END IF;
+    INSERT INTO report_statusevent
+        (record_type, record_id, status, previous_status, create_time)
+    VALUES (TG_ARGV[0], NEW.id, NEW.status, previous_status, now());
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER report_library_created
+    AFTER INSERT ON library_library
+    FOR EACH ROW EXECUTE PROCEDURE report_status_changed('Library');
+
+CREATE TRIGGER report_library_status_changed
+    AFTER UPDATE OF status ON library_library
+    FOR EACH ROW
+    WHEN (OLD.status IS DISTINCT FROM NEW.status)
+    EXECUTE PROCEDURE report_status_changed('Library');
+
+CREATE TRIGGER report_sample_created
+    AFTER INSERT ON sample_sample
+    FOR EACH ROW EXECUTE PROCEDURE report_status_changed('Sample');
+
+CREATE TRIGGER report_sample_status_changed
+    AFTER UPDATE OF status ON sample_sample
+    FOR EACH ROW
+    WHEN (OLD.status IS DISTINCT FROM NEW.status)
+    EXECUTE PROCEDURE report_status_changed('Sample');
+'''
+
+# The events are inserted by the triggers, which don't set `processed`.
+# Unprocessed events are looked up by a partial index.
+PROCESSED_SQL = '''
+ALTER TABLE report_statusevent ALTER COLUMN processed SET DEFAULT false;
+CREATE INDEX report_statusevent_unprocessed_idx
+    ON report_statusevent (id) WHERE NOT processed;
+'''
+
+DROP_PROCESSED_SQL = '''
+DROP INDEX IF EXISTS report_statusevent_unprocessed_idx;
+ALTER TABLE report_statusevent ALTER COLUMN processed DROP DEFAULT;
+'''
+
+DROP_SQL = '''
+DROP TRIGGER IF EXISTS report_sample_status_changed ON sample_sample;
+DROP TRIGGER IF EXISTS report_sample_created ON sample_sample;
+DROP TRIGGER IF EXISTS report_library_status_changed ON library_library;
+DROP TRIGGER IF EXISTS report_library_created ON library_library;
+DROP FUNCTION IF EXISTS report_status_changed();
+'''
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('library', '0004_library_barcode_key'),
+        ('sample', '0005_sample_barcode_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatusEvent',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('record_type', models.CharField(choices=[('Library', 'Library'), ('Sample', 'Sample')], max_length=10, verbose_name='Record Type')),
+                ('record_id', models.IntegerField(verbose_name='Record Id')),
+                ('status', models.SmallIntegerField(verbose_name='Status')),
+                ('previous_status', models.SmallIntegerField(blank=True, null=True, verbose_name='Previous Status')),
+                ('create_time', models.DateTimeField(verbose_name='Create Time')),
+                ('processed', models.BooleanField(default=False, verbose_name='Processed')),
+            ],
+            options={
+                'verbose_name': 'Status Event',
+                'verbose_name_plural': 'Status Events',
+            },
+        ),
+        migrations.AlterIndexTogether(
+            name='statusevent',
+            index_together=set([('record_type', 'record_id')]),
+        ),
+        migrations.CreateModel(
+            name='TurnaroundRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('record_type', models.CharField(choices=[('Library', 'Library'), ('Sample', 'Sample')], max_length=10, verbose_name='Record Type')),
+                ('stage', models.CharField(max_length=100, verbose_name='Stage')),
+                ('count', models.BigIntegerField(default=0, verbose_name='Count')),
+                ('buckets', django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), size=None, verbose_name='Buckets')),
+            ],
+            options={
+                'verbose_name': 'Turnaround Rollup',
+                'verbose_name_plural': 'Turnaround Rollups',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='turnaroundrollup',
+            unique_together=set([('date', 'record_type', 'stage')]),
+        ),
+        migrations.RunSQL(PROCESSED_SQL, DROP_PROCESSED_SQL),
+        migrations.RunSQL(TRIGGERS_SQL, DROP_SQL),
+    ]
@@ -0,0 +1,76 @@
+from django.db import models, connection
+from django.contrib.postgres.fields import ArrayField
+
+RECORD_TYPE_CHOICES = (
+    ('Library', 'Library'),
+    ('Sample', 'Sample'),
+)
+
+
+class StatusEvent(models.Model):
+    """
+    A status change of a library or a sample. The events are written by
+    database triggers (on every insert and status update, including bulk
+    updates). Only `processed` is changed afterwards, once the event has
+    been added to the turnaround rollups.
+    """
+    id = models.BigAutoField(primary_key=True)
+    record_type = models.CharField(
+        'Record Type', max_length=10, choices=RECORD_TYPE_CHOICES)
+    record_id = models.IntegerField('Record Id')
+    status = models.SmallIntegerField('Status')
+    previous_status = models.SmallIntegerField(
+        'Previous Status', blank=True, null=True)
+    create_time = models.DateTimeField('Create Time')
+    processed = models.BooleanField('Processed', default=False)
+
+    class Meta:
+        verbose_name = 'Status Event'
+        verbose_name_plural = 'Status Events'
+        index_together = [('record_type', 'record_id')]
+
+    def __str__(self):
+        return (f'{self.record_type} {self.record_id}: '
+                f'{self.previous_status} -> {self.status}')
+
+
+class TurnaroundRollup(models.Model):
+    """
+    Number of the records which completed a workflow stage on one day and
+    a histogram of their durations, with fixed log-scale buckets (see
+    `report.turnaround.get_bucket()`).
+    """
+    date = models.DateField('Date')
+    record_type = models.CharField(
+        'Record Type', max_length=10, choices=RECORD_TYPE_CHOICES)
+    stage = models.CharField('Stage', max_length=100)
+    count = models.BigIntegerField('Count', default=0)
+    buckets = ArrayField(models.BigIntegerField(), verbose_name='Buckets')
+
+    class Meta:
+        verbose_name = 'Turnaround Rollup'
+        verbose_name_plural = 'Turnaround Rollups'
+        unique_together = ('date', 'record_type', 'stage')
+
+    def __str__(self):
+        return f'{self.date} {self.record_type} {self.stage}'
+
+    @classmethod
+    def add(cls, date, record_type, stage, count, buckets):
+        """ Add a histogram to a rollup (bucket by bucket) in one statement. """
+        table = cls._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(f'''
+                INSERT INTO {table} (date, record_type, stage, count, buckets)
+                VALUES (%s, %s, %s, %s, %s)
+                ON CONFLICT (date, record_type, stage)
+                DO UPDATE SET
+                    count = {table}.count + EXCLUDED.count,
+                    buckets = ARRAY(
+                        SELECT a + b
+                        FROM unnest({table}.buckets, EXCLUDED.buckets)
+                            WITH ORDINALITY AS x(a, b, i)
+                        ORDER BY i
+                    )
+            ''', [date, record_type, stage, count, buckets])
+
@@ -28,6 +28,7 @@ QUERY = '''
 SELECT *
 FROM (
     SELECT record.id AS t1_id,
+        record.barcode_key AS barcode_key,
         record.name AS "Name",
         record.barcode AS "Barcode",
         record.status AS "Status",
@@ -154,3 +155,7 @@ LEFT JOIN (
     GROUP BY record.id, f.create_time::date
 ) t2 ON t1_id = t2_id
 '''
+
+ORDER_BY_BARCODE = '''
+ORDER BY barcode_key, t1_id
+'''
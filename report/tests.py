@@ -1,3 +1,250 @@
+import datetime
+
 from django.test import TestCase
+from django.utils import timezone
+
+from library.tests import create_library
+from sample.tests import create_sample
+from sample.models import Sample
+from request.tests import create_request
+from index_generator.tests import create_pool
+from flowcell.tests import create_sequencer, create_lane, create_flowcell
+from common.models import Organization, PrincipalInvestigator
+from common.tests import BaseTestCase
+from common.utils import get_random_name
+
+from .models import StatusEvent, TurnaroundRollup
+from .turnaround import update_rollups, get_turnaround, get_bucket
+from .views import Report
+
+
+class ReportTest(BaseTestCase):
+    def setUp(self):
+        organization = Organization(name=get_random_name())
+        organization.save()
+        self.pi = PrincipalInvestigator(
+            name=get_random_name(), organization=organization)
+        self.pi.save()
+
+        self.user = self.create_user()
+        self.user.organization = organization
+        self.user.pi = self.pi
+        self.user.save()
+
+        library1 = create_library(get_random_name())
+        library2 = create_library(get_random_name())
+        sample = create_sample(get_random_name())
+        request = create_request(self.user)
+        request.libraries.add(library1, library2)
+        request.samples.add(sample)
+
+        # The pool is loaded on two lanes of the same flowcell
+        pool = create_pool(self.user)
+        pool.libraries.add(library1)
+        pool.samples.add(sample)
+        self.sequencer = create_sequencer(get_random_name())
+        flowcell = create_flowcell(get_random_name(), self.sequencer)
+        flowcell.lanes.add(
+            create_lane('Lane 1', pool), create_lane('Lane 2', pool))
+        create_flowcell(get_random_name(), self.sequencer)
+
+        # Unloaded pools are not counted
+        pool = create_pool(self.user)
+        pool.libraries.add(library2)
+
+        now = timezone.now()
+        self.report = Report(
+            now - datetime.timedelta(days=1),
+            now + datetime.timedelta(days=1),
+        )
+        self.organization = organization
+
+    def test_counts(self):
+        self.assertEqual(self.report.get_total_counts(), [
+            {'type': 'Samples', 'count': 1},
+            {'type': 'Libraries', 'count': 2},
+        ])
+        self.assertEqual(self.report.get_organization_counts(), [{
+            'name': self.organization.name,
+            'libraries_count': 2,
+            'samples_count': 1,
+        }])
+        self.assertEqual(self.report.get_library_protocol_counts(), [{
+            'name': 'Protocol',
+            'libraries_count': 2,
+            'samples_count': 1,
+        }])
+        self.assertEqual(self.report.get_pi_counts(), [{
+            'name': self.pi.name,
+            'libraries_count': 2,
+            'samples_count': 1,
+        }])
+
+    def test_sequencer_counts(self):
+        self.assertEqual(self.report.get_sequencer_counts(), [{
+            'name': self.sequencer.name,
+            'items_count': 2,
+            'runs_count': 2,
+        }])
+        self.assertEqual(
+            self.report.get_sequencers_list(), [self.sequencer.name])
+        self.assertEqual(
+            self.report.get_pi_sequencer_counts(),
+            {self.pi.name: {self.sequencer.name: 2}},
+        )
+
+    def test_date_range(self):
+        start = timezone.now() + datetime.timedelta(days=1)
+        report = Report(start, start + datetime.timedelta(days=1))
+        self.assertEqual(report.get_total_counts(), [])
+        self.assertEqual(report.get_sequencer_counts(), [])
+
+
+class TurnaroundTest(TestCase):
+    def set_event_times(self, record_type, record_id, hours):
+        """ Move the events of a record `hours` apart. """
+        start = timezone.now() - datetime.timedelta(days=1)
+        events = StatusEvent.objects.filter(
+            record_type=record_type, record_id=record_id).order_by('pk')
+        for event, offset in zip(events, hours):
+            StatusEvent.objects.filter(pk=event.pk).update(
+                create_time=start + datetime.timedelta(hours=offset))
+
+    @staticmethod
+    def get_histogram(rollup):
+        return {i: x for i, x in enumerate(rollup.buckets) if x}
+
+    def test_status_events(self):
+        """ Ensure status changes are logged, also by bulk updates. """
+        sample = create_sample(get_random_name(), status=1)
+        sample.status = 2
+        sample.save()
+        sample.save()
+        Sample.objects.filter(pk=sample.pk).update(status=3)
+
+        events = StatusEvent.objects.filter(
+            record_type='Sample', record_id=sample.pk).order_by('pk')
+        self.assertEqual(
+            [(x.previous_status, x.status) for x in events],
+            [(None, 1), (1, 2), (2, 3)],
+        )
+
+    def test_update_rollups(self):
+        """ Ensure only new stages are added to the rollups. """
+        sample = create_sample(get_random_name(), status=1)
+        for status in [2, 3]:
+            sample.status = status
+            sample.save()
+        self.set_event_times('Sample', sample.pk, [0, 1, 3])
+
+        library = create_library(get_random_name(), status=1)
+        library.status = -2
+        library.save()
+        self.set_event_times('Library', library.pk, [0, 2])
+
+        update_rollups(settle_time=datetime.timedelta(0))
+        rollups = {
+            (x.record_type, x.stage): self.get_histogram(x)
+            for x in TurnaroundRollup.objects.all()
+        }
+        self.assertEqual(rollups, {
+            ('Sample', 'Submission -> Quality Check'): {
+                get_bucket(3600000): 1},
+            ('Sample', 'Quality Check -> Preparation'): {
+                get_bucket(7200000): 1},
+            ('Library', 'Submission -> Quality Check'): {
+                get_bucket(7200000): 1},
+        })
+
+        # Only the new event of the library is processed
+        library.status = 4
+        library.save()
+        self.set_event_times('Library', library.pk, [0, 2, 6])
+
+        update_rollups(settle_time=datetime.timedelta(0))
+        self.assertFalse(StatusEvent.objects.filter(processed=False).exists())
+        self.assertEqual(TurnaroundRollup.objects.count(), 4)
+        rollup = TurnaroundRollup.objects.get(stage='Quality Check -> Pooling')
+        self.assertEqual(
+            self.get_histogram(rollup), {get_bucket(4 * 3600000): 1})
+
+    def test_late_events(self):
+        """ Ensure events committed after newer events are processed. """
+        sample = create_sample(get_random_name(), status=1)
+        sample.status = 2
+        sample.save()
+        self.set_event_times('Sample', sample.pk, [0, 2])
+
+        # The status change is committed after a newer event was processed
+        late = StatusEvent.objects.filter(
+            record_type='Sample', record_id=sample.pk).latest('pk')
+        late_id = late.pk
+        late.delete()
+        create_sample(get_random_name(), status=1)
+        update_rollups(settle_time=datetime.timedelta(0))
+        self.assertFalse(TurnaroundRollup.objects.exists())
+
+        late.pk = late_id
+        late.save(force_insert=True)
+        update_rollups(settle_time=datetime.timedelta(0))
+        rollup = TurnaroundRollup.objects.get()
+        self.assertEqual(
+            self.get_histogram(rollup), {get_bucket(2 * 3600000): 1})
+
+    def test_unsettled_events(self):
+        """ Ensure recent events are left for the next update. """
+        sample = create_sample(get_random_name(), status=1)
+        sample.status = 2
+        sample.save()
+
+        update_rollups()
+        self.assertFalse(TurnaroundRollup.objects.exists())
+
+    def create_samples(self, hours_list):
+        for hours in hours_list:
+            sample = create_sample(get_random_name(), status=1)
+            sample.status = 2
+            sample.save()
+            self.set_event_times('Sample', sample.pk, hours)
+
+    def test_get_turnaround(self):
+        self.create_samples([[0, 1], [0, 3], [0, 5]])
+        update_rollups(settle_time=datetime.timedelta(0))
+
+        rollup = TurnaroundRollup.objects.get()
+        self.assertEqual(rollup.count, 3)
+
+        data = get_turnaround()
+        self.assertEqual(len(data['rows']), 1)
+        row = data['rows'][0]
+        self.assertEqual(row['Turnaround'], 'Submission -> Quality Check')
+        self.assertEqual(row['Sample Count'], 3)
+        # The percentiles are read from the log-scale buckets
+        self.assertAlmostEqual(
+            row['Sample Median (ms)'], 3 * 3600000, delta=0.05 * 3 * 3600000)
+        self.assertAlmostEqual(
+            row['Sample 90th Percentile (ms)'], 5 * 3600000,
+            delta=0.05 * 5 * 3600000)
+        self.assertEqual(row['Library Count'], 0)
+
+    def test_get_turnaround_date_range(self):
+        """ Ensure only the stages completed in the date range count. """
+        self.create_samples([[0, 1]])
+        update_rollups(settle_time=datetime.timedelta(0))
+
+        today = timezone.now()
+        tomorrow = today + datetime.timedelta(days=1)
+        self.assertEqual(len(get_turnaround(today - datetime.timedelta(
+            days=2), today)['rows']), 1)
+        self.assertEqual(get_turnaround(tomorrow, tomorrow)['rows'], [])
+
+    def test_report_updates_rollups(self):
+        """ Ensure the report adds the new events to the rollups. """
+        self.create_samples([[0, 1]])
+        now = timezone.now()
+        report = Report(now - datetime.timedelta(days=2), now)
 
-# Create your tests here.
+        rows = report.get_turnaround()['rows']
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['Sample Count'], 1)
+        self.assertFalse(StatusEvent.objects.filter(processed=False).exists())
@@ -0,0 +1,240 @@
+import math
+import datetime
+import itertools
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from usage.buckets import to_date
+
+from .models import StatusEvent, TurnaroundRollup
+
+# Workflow milestones and the statuses which reach them
+MILESTONES = (
+    ('Submission', (1,)),
+    ('Quality Check', (2, -2)),
+    ('Preparation', (3,)),
+    ('Pooling', (4,)),
+    ('Sequencing', (5,)),
+    ('Completion', (6,)),
+)
+MILESTONE_INDEX = {
+    status: i
+    for i, (_, statuses) in enumerate(MILESTONES)
+    for status in statuses
+}
+SUBMISSION = 0
+SEQUENCING = 4
+
+COMPLETE_WORKFLOW = 'Complete Workflow'
+
+# A stage is the time between two consecutive milestones of a record
+# (libraries skip the preparation), in the order of the milestones
+STAGES = [
+    f'{MILESTONES[i][0]} -> {MILESTONES[j][0]}'
+    for i, j in itertools.combinations(range(len(MILESTONES)), 2)
+] + [COMPLETE_WORKFLOW]
+
+PERCENTILES = (0.5, 0.9)
+
+# The durations (in ms) are counted in log-scale buckets: bucket i holds
+# the durations from BUCKET_GROWTH ** i to BUCKET_GROWTH ** (i + 1), so
+# the percentiles are off by less than 5%. The last bucket also holds
+# all longer durations (more than 80 years).
+BUCKET_GROWTH = 1.1
+NUM_BUCKETS = 300
+
+# Events younger than this are left for the next update, so that the
+# earlier events of their records are likely to be committed already
+SETTLE_TIME = datetime.timedelta(minutes=5)
+
+# Advisory lock, which serializes the updates of the rollups
+UPDATE_LOCK_ID = 0x7475726e61726f
+
+# Number of records whose events are fetched at once
+CHUNK_SIZE = 1000
+
+
+def get_stage_durations(events):
+    """
+    Get the completed stages of a record from its events (ordered by
+    time) as (stage, end event, duration in ms) tuples. Only the first
+    time a milestone is reached counts.
+    """
+    reached = {}
+    stages = []
+
+    def add(stage, start, event):
+        duration = event.create_time - reached[start]
+        stages.append((stage, event, int(duration.total_seconds() * 1000)))
+
+    for event in events:
+        index = MILESTONE_INDEX.get(event.status)
+        if index is None or index in reached:
+            continue
+
+        earlier = [i for i in reached if i < index]
+        reached[index] = event.create_time
+
+        if earlier:
+            start = max(earlier)
+            add(f'{MILESTONES[start][0]} -> {MILESTONES[index][0]}',
+                start, event)
+
+        if index == SEQUENCING and SUBMISSION in reached:
+            add(COMPLETE_WORKFLOW, SUBMISSION, event)
+
+    return stages
+
+
+def get_bucket(duration):
+    """ Return the histogram bucket of a duration (in ms). """
+    if duration < BUCKET_GROWTH:
+        return 0
+    return min(int(math.log(duration, BUCKET_GROWTH)), NUM_BUCKETS - 1)
+
+
+def get_bucket_value(bucket):
+    """ Return the (geometric) middle of a histogram bucket. """
+    return BUCKET_GROWTH ** (bucket + 0.5)
+
+
+def get_percentile(buckets, count, percentile):
+    """
+    Return a percentile of the durations in a histogram, given as
+    {bucket: count}, from the bucket which contains it.
+    """
+    rank = max(math.ceil(percentile * count), 1)
+    total = 0
+    for bucket in sorted(buckets):
+        total += buckets[bucket]
+        if total >= rank:
+            return get_bucket_value(bucket)
+    return None
+
+
+def update_rollups(settle_time=SETTLE_TIME, wait=True):
+    """
+    Add the stages completed by the unprocessed status events to the
+    daily rollups and mark the events as processed. Events committed
+    late are picked up by a later update. Only the events of the changed
+    records are read.
+
+    If `wait` is False and another update is running, return False
+    instead of waiting for it.
+    """
+    settled = timezone.now() - settle_time
+
+    with transaction.atomic():
+        with connection.cursor() as c:
+            if wait:
+                c.execute(
+                    'SELECT pg_advisory_xact_lock(%s)', [UPDATE_LOCK_ID])
+            else:
+                c.execute(
+                    'SELECT pg_try_advisory_xact_lock(%s)', [UPDATE_LOCK_ID])
+                if not c.fetchone()[0]:
+                    return False
+
+        records = StatusEvent.objects.filter(
+            processed=False, create_time__lt=settled,
+        ).values_list('record_type', 'record_id').distinct().order_by()
+        record_ids = defaultdict(list)
+        for record_type, record_id in records:
+            record_ids[record_type].append(record_id)
+
+        for record_type, ids in record_ids.items():
+            for i in range(0, len(ids), CHUNK_SIZE):
+                update_records(record_type, ids[i:i + CHUNK_SIZE], settled)
+
+    return True
+
+
+def update_records(record_type, record_ids, settled):
+    """ Process the new events of given records. """
+    events = StatusEvent.objects.filter(
+        record_type=record_type,
+        record_id__in=record_ids,
+        create_time__lt=settled,
+    ).order_by('record_id', 'create_time', 'pk')
+
+    rollups = defaultdict(list)
+    processed = []
+    for _, group in itertools.groupby(events, key=lambda x: x.record_id):
+        group = list(group)
+        processed += [x.pk for x in group if not x.processed]
+
+        for stage, event, duration in get_stage_durations(group):
+            if event.processed:
+                continue
+            date = timezone.localtime(event.create_time).date()
+            rollups[(date, record_type, stage)].append(duration)
+
+    for (date, record_type, stage), durations in rollups.items():
+        buckets = [0] * NUM_BUCKETS
+        for duration in durations:
+            buckets[get_bucket(duration)] += 1
+        TurnaroundRollup.add(
+            date, record_type, stage, len(durations), buckets)
+
+    StatusEvent.objects.filter(pk__in=processed).update(processed=True)
+
+
+def get_turnaround(start=None, end=None):
+    """
+    Get the number of records, the median and the 90th percentile of
+    the duration (in ms) of every stage, per record type, of the stages
+    completed from the start to the end day (inclusive). They are merged
+    from the histograms of the daily rollups.
+    """
+    filters = []
+    params = []
+    if start is not None:
+        filters.append('r.date >= %s')
+        params.append(to_date(start))
+    if end is not None:
+        filters.append('r.date <= %s')
+        params.append(to_date(end))
+    where = f'WHERE {" AND ".join(filters)}' if filters else ''
+
+    with connection.cursor() as c:
+        c.execute(f'''
+            SELECT r.record_type, r.stage, b.i - 1, SUM(b.n)::bigint
+            FROM {TurnaroundRollup._meta.db_table} r,
+                unnest(r.buckets) WITH ORDINALITY AS b(n, i)
+            {where}
+            GROUP BY r.record_type, r.stage, b.i
+            HAVING SUM(b.n) > 0
+        ''', params)
+        rows = c.fetchall()
+
+    histograms = defaultdict(dict)
+    for record_type, stage, bucket, count in rows:
+        histograms[(record_type, stage)][bucket] = count
+
+    columns = [
+        'Turnaround',
+        'Sample Count',
+        'Sample Median (ms)',
+        'Sample 90th Percentile (ms)',
+        'Library Count',
+        'Library Median (ms)',
+        'Library 90th Percentile (ms)',
+    ]
+
+    data = {}
+    for (record_type, stage), buckets in histograms.items():
+        count = sum(buckets.values())
+        median, p90 = [
+            get_percentile(buckets, count, x) for x in PERCENTILES]
+        row = data.setdefault(stage, dict.fromkeys(columns[1:], 0))
+        row['Turnaround'] = stage
+        row[f'{record_type} Count'] = count
+        row[f'{record_type} Median (ms)'] = round(median)
+        row[f'{record_type} 90th Percentile (ms)'] = round(p90)
+
+    return {
+        'columns': columns,
+        'rows': [data[x] for x in STAGES if x in data],
+    }
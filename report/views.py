@@ -1,18 +1,32 @@
+import heapq
 from datetime import datetime
-from collections import OrderedDict, Counter
+from collections import OrderedDict
 
 from django.apps import apps
 from django.http import JsonResponse
+from django.core.serializers.json import DjangoJSONEncoder
 from django.shortcuts import render
 from django.db import connection
-from django.db.models import Prefetch
+from django.db.models import Count
 from django.contrib.auth.decorators import login_required
 from django.contrib.admin.views.decorators import staff_member_required
 
-import numpy as np
-from pandas import DataFrame
-
-from .sql import QUERY, LIBRARY_SELECT, SAMPLE_SELECT, SAMPLE_JOINS
+from common.streaming import (
+    CHUNK_SIZE,
+    StreamingJSONResponse,
+    is_streaming_requested,
+)
+from export.jobs import exportable
+from usage.buckets import get_counts
+
+from .turnaround import update_rollups, get_turnaround
+from .sql import (
+    QUERY,
+    LIBRARY_SELECT,
+    SAMPLE_SELECT,
+    SAMPLE_JOINS,
+    ORDER_BY_BARCODE,
+)
 
 Organization = apps.get_model('common', 'Organization')
 PrincipalInvestigator = apps.get_model('common', 'PrincipalInvestigator')
@@ -29,289 +43,79 @@ Lane = apps.get_model('flowcell', 'Lane')
 
 
 class Report:
-    def __init__(self, start, end):
-        libraries_qs = Library.objects.select_related(
-            'library_protocol').only('id', 'library_protocol__name').filter(
-                create_time__gt=start, create_time__lt=end)
-
-        samples_qs = Sample.objects.select_related(
-            'library_protocol').only('id', 'library_protocol__name').filter(
-                create_time__gt=start, create_time__lt=end)
-
-        self.requests = Request.objects.select_related(
-            'user__organization', 'user__pi',
-        ).prefetch_related(
-            Prefetch('libraries', queryset=libraries_qs,
-                     to_attr='fetched_libraries'),
-            Prefetch('samples', queryset=samples_qs,
-                     to_attr='fetched_samples'),
-        ).only(
-            'id',
-            'libraries',
-            'samples',
-            'user__organization__name',
-            'user__pi__name',
-        )
+    """
+    Count the libraries and samples created in a date range (whole days),
+    summed from the cached daily usage buckets.
+    """
 
-        lanes_qs = Lane.objects.select_related('pool').prefetch_related(
-            Prefetch('pool__libraries', queryset=libraries_qs,
-                     to_attr='fetched_libraries'),
-            Prefetch('pool__samples', queryset=samples_qs,
-                     to_attr='fetched_samples'),
-        ).only('id', 'pool__libraries', 'pool__samples')
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
 
-        self.flowcells = Flowcell.objects.select_related(
-            'sequencer',
-        ).prefetch_related(
-            Prefetch('lanes', queryset=lanes_qs, to_attr='fetched_lanes'),
-        ).only('id', 'sequencer__name', 'lanes')
+    def get_counts(self, name):
+        return get_counts(name, self.start, self.end)
 
     def get_total_counts(self):
         data = []
-        num_libraries = 0
-        num_samples = 0
+        count = self.get_counts('records').get(
+            (), {'libraries': 0, 'samples': 0})
 
-        for req in self.requests:
-            num_libraries += len(req.fetched_libraries)
-            num_samples += len(req.fetched_samples)
+        if count['samples'] > 0:
+            data.append({'type': 'Samples', 'count': count['samples']})
 
-        if num_samples > 0:
-            data.append({'type': 'Samples', 'count': num_samples})
-
-        if num_libraries > 0:
-            data.append({'type': 'Libraries', 'count': num_libraries})
+        if count['libraries'] > 0:
+            data.append({'type': 'Libraries', 'count': count['libraries']})
 
         return data
 
     def get_organization_counts(self):
-        counts = {}
-
-        for req in self.requests:
-            organization = req.user.organization
-            org_name = organization.name if organization else 'None'
-            if org_name not in counts.keys():
-                counts[org_name] = {'libraries': 0, 'samples': 0}
-            counts[org_name]['libraries'] += len(req.fetched_libraries)
-            counts[org_name]['samples'] += len(req.fetched_samples)
-
-        return self._get_data(counts)
+        return self._get_data(self.get_counts('record_organizations'))
 
     def get_library_protocol_counts(self):
-        counts = {}
-
-        for req in self.requests:
-            # Extract Library Protocols
-            library_protocols = [
-                x.library_protocol.name for x in req.fetched_libraries]
-            sample_protocols = [
-                x.library_protocol.name for x in req.fetched_samples]
-
-            # Merge the counts
-            library_cnt = {x[0]: {'libraries': x[1]}
-                           for x in Counter(library_protocols).items()}
-            sample_cnt = {x[0]: {'samples': x[1]}
-                          for x in Counter(sample_protocols).items()}
-            count = {
-                k: {
-                    **library_cnt.get(k, {'libraries': 0}),
-                    **sample_cnt.get(k, {'samples': 0}),
-                }
-                for k in library_cnt.keys() | sample_cnt.keys()
-            }
-
-            for k, v in count.items():
-                temp_dict = counts.get(k, {'libraries': 0, 'samples': 0})
-                temp_dict['libraries'] += v['libraries']
-                temp_dict['samples'] += v['samples']
-                counts[k] = temp_dict
-
-        return self._get_data(counts)
+        return self._get_data(self.get_counts('record_protocols'))
 
     def get_pi_counts(self):
-        counts = {}
-
-        for req in self.requests:
-            pi = req.user.pi
-            pi_name = pi.name if pi else 'None'
-            if pi_name not in counts.keys():
-                counts[pi_name] = {'libraries': 0, 'samples': 0}
-            counts[pi_name]['libraries'] += len(req.fetched_libraries)
-            counts[pi_name]['samples'] += len(req.fetched_samples)
-
-        return self._get_data(counts)
+        return self._get_data(
+            self.get_counts('record_principal_investigators'))
 
     def get_sequencer_counts(self):
-        counts = {}
-
-        for flowcell in self.flowcells:
-            sequencer_name = flowcell.sequencer.name
-            if sequencer_name not in counts.keys():
-                counts[sequencer_name] = {
-                    'libraries': 0, 'samples': 0, 'runs': 0}
-            counts[sequencer_name]['runs'] += 1
-
-            pools = {x.pool for x in flowcell.fetched_lanes}
-            for pool in pools:
-                counts[sequencer_name]['libraries'] += \
-                    len(pool.fetched_libraries)
-                counts[sequencer_name]['samples'] += \
-                    len(pool.fetched_samples)
+        counts = self.get_counts('sequencers')
+        runs = dict(Flowcell.objects.values_list(
+            'sequencer__name').annotate(Count('pk')).order_by())
 
         data = [
             {
                 'name': name,
                 'items_count': count['libraries'] + count['samples'],
-                'runs_count': count['runs'],
+                'runs_count': runs.get(name, 0),
             }
-            for name, count in counts.items()
+            for (name,), count in counts.items()
             if count['libraries'] + count['samples'] > 0
         ]
 
         return sorted(data, key=lambda x: x['name'])
 
     def get_sequencers_list(self):
-        return sorted({x.sequencer.name for x in self.flowcells})
+        return sorted(Flowcell.objects.values_list(
+            'sequencer__name', flat=True).distinct().order_by())
 
     def get_pi_sequencer_counts(self):
-        sequencer_mapping = {}
-        for flowcell in self.flowcells:    # gets records from flowcell
-            sequencer_name = flowcell.sequencer.name
-            pools = {x.pool for x in flowcell.fetched_lanes}
-            for pool in pools:
-                records = pool.fetched_libraries + pool.fetched_samples
-                for record in records:
-                    if record not in sequencer_mapping:
-                        sequencer_mapping[record] = []
-                    sequencer_mapping[record].append(sequencer_name)
-        items = sequencer_mapping.keys()
-
-        pi_mapping = {}
-        for req in self.requests:    # gets records from requests
-            pi = req.user.pi
-            pi_name = pi.name if pi else 'None'
-            records = req.fetched_libraries + req.fetched_samples
-
-            pi_mapping.update({
-                record: pi_name for record in records if record in items
-            })
-
-        pairs = []
-        for k, v in sequencer_mapping.items():
-            for sequencer_name in v:
-                try:
-                    pairs.append((pi_mapping[k], sequencer_name))
-                except KeyError:    # KeyError if record exists under flowcell but the correspond. request was deleted.
-                    pass    # could add a warning pop-up here
-        counts = Counter(pairs)
+        counts = self.get_counts('pi_sequencers')
 
         data = {}
-        for item, count in counts.items():
-            if item[0] not in data:
-                data[item[0]] = {}
-            data[item[0]][item[1]] = count
+        for (pi_name, sequencer_name), count in counts.items():
+            data.setdefault(pi_name, {})[sequencer_name] = \
+                count['libraries'] + count['samples']
 
         return OrderedDict(sorted(data.items()))
 
     def get_turnaround(self):
-        query = '''
-        CREATE TEMPORARY TABLE IF NOT EXISTS temp1 AS SELECT
-            L.id,
-            CAST('Library' AS CHAR(7)) rtype,
-            L.create_time date1,
-            CAST(NULL AS TIMESTAMPTZ) date2
-        FROM library_library L;
-
-        CREATE TEMPORARY TABLE IF NOT EXISTS temp2 AS SELECT
-            L.id,
-            MIN(F.create_time) date3
-        FROM library_library L
-        LEFT JOIN index_generator_pool_libraries PR
-            ON L.id = PR.library_id
-        LEFT JOIN index_generator_pool P
-            ON PR.pool_id = P.id
-        LEFT JOIN flowcell_lane La
-            ON P.id = La.pool_id
-        LEFT JOIN flowcell_flowcell_lanes FL
-            ON La.id = FL.lane_id
-        LEFT JOIN flowcell_flowcell F
-            ON FL.flowcell_id = F.id
-        GROUP BY L.id;
-
-        CREATE TEMPORARY TABLE IF NOT EXISTS temp3 AS SELECT
-            S.id,
-            CAST('Sample' AS CHAR(6)) rtype,
-            S.create_time date1,
-            LP.create_time date2
-        FROM sample_sample S
-        LEFT JOIN library_preparation_librarypreparation LP
-            ON S.id = LP.sample_id;
-
-        CREATE TEMPORARY TABLE IF NOT EXISTS temp4 AS SELECT
-            S.id,
-            MIN(F.create_time) date3
-        FROM sample_sample S
-        LEFT JOIN index_generator_pool_samples PR
-            ON S.id = PR.sample_id
-        LEFT JOIN index_generator_pool P
-            ON PR.pool_id = P.id
-        LEFT JOIN flowcell_lane L
-            ON P.id = L.pool_id
-        LEFT JOIN flowcell_flowcell_lanes FL
-            ON L.id = FL.lane_id
-        LEFT JOIN flowcell_flowcell F
-            ON FL.flowcell_id = F.id
-        GROUP BY S.id;
-
-        SELECT
-            rtype, date1, date2, date3
-        FROM (
-            SELECT *
-            FROM temp1 t1
-            LEFT JOIN temp2 t2 ON t1.id = t2.id
-            UNION ALL
-            SELECT *
-            FROM temp3 t1
-            LEFT JOIN temp4 t2 ON t1.id = t2.id
-        ) t
-        '''
-
-        with connection.cursor() as c:
-            c.execute(query)
-            columns = [x[0] for x in c.description]
-            df = DataFrame(c.fetchall(), columns=columns)
-
-        df['Request -> Preparation'] = df.date2 - df.date1
-        df['Preparation -> Sequencing'] = df.date3 - df.date2
-        df['Complete Workflow'] = df.date3 - df.date1
-
-        agg_samples_df = \
-            df[df.rtype == 'Sample'].aggregate(['mean', 'std']).fillna(0)
-        agg_samples_df = (agg_samples_df / np.timedelta64(1, 'D')).astype(int)
-
-        agg_libraries_df = df[df.rtype == 'Library'].iloc[:, -1]\
-            .aggregate(['mean', 'std']).fillna(0)
-        agg_libraries_df = \
-            (agg_libraries_df / np.timedelta64(1, 'D')).astype(int)
-
-        columns = [
-            'Turnaround',
-            'Sample (days)',
-            'Sample Deviation (days)',
-            'Library (days)',
-            'Library Deviation (days)',
-        ]
-
-        result_df = DataFrame(columns=columns)
-        result_df[columns[0]] = df.columns[4:]
-        result_df[columns[1]] = agg_samples_df.loc['mean'].values
-        result_df[columns[2]] = agg_samples_df.loc['std'].values
-        result_df[columns[3]] = [0] * 2 + [agg_libraries_df.loc['mean']]
-        result_df[columns[4]] = [0] * 2 + [agg_libraries_df.loc['std']]
-
-        return {
-            'columns': columns,
-            'rows': result_df.T.to_dict().values(),
-        }
+        """
+        Add the new status events to the rollups first, unless another
+        process is doing it already.
+        """
+        update_rollups(wait=False)
+        return get_turnaround(self.start, self.end)
 
     @staticmethod
     def _get_data(counts):
@@ -321,7 +125,7 @@ class Report:
                 'libraries_count': count['libraries'],
                 'samples_count': count['samples'],
             }
-            for name, count in counts.items()
+            for (name,), count in counts.items()
             if count['libraries'] + count['samples'] > 0
         ]
 
@@ -388,17 +192,110 @@ def report(request):
 def database(request):
     return render(request, 'database.html')
 
+
+DATABASE_COLUMNS = [
+    'Name',
+    'Barcode',
+    'Status',
+    'Request',
+    'User',
+    'Library Type',
+    'Library Protocol',
+    'Concentration',
+    'Sequencing Depth',
+    'Read Length',
+    'Concentration Method',
+    'Equal Representation of Nucleotides',
+    'Index Type',
+    'Index Reads',
+    'Index I7 ID',
+    'Index I7',
+    'Index I5 ID',
+    'Index I5',
+    'Amplification Cycles',
+    'Dilution Factor',
+    'Concentration (Facility)',
+    'Sample Volume (Facility)',
+    'Amount (Facility)',
+    'Size Distribution (Facility)',
+    'Concentration Method (Facility)',
+    'RNA Quality (Facility)',
+    'Organism',
+    'Concentration C1',
+    'RNA Quality',
+    'Nucleic Acid Type',
+    'Starting Amount',
+    'Spike-in Volume',
+    'PCR Cycles',
+    'Concentration Library',
+    'Mean Fragment Size',
+    'nM',
+    'qPCR Result',
+    'qPCR Result (Facility)',
+    'Pool',
+    'Pool Size',
+    'Flowcell ID',
+    'Flowcell create time',
+    'Sequencer',
+]
+
+
+def iterate_database_rows(table_name, table_name_plural, select, joins):
+    """
+    Fetch the database rows of libraries or samples, ordered by barcode,
+    from a server-side cursor.
+    """
+    query = QUERY.format(
+        table_name=table_name,
+        table_name_plural=table_name_plural,
+        select=select,
+        joins=joins,
+    ) + ORDER_BY_BARCODE
+
+    with connection.chunked_cursor() as c:
+        c.execute(query)
+        # The description of a server-side cursor is available only
+        # after the first fetch
+        rows = c.fetchmany(CHUNK_SIZE)
+        columns = [col[0] for col in c.description]
+        while rows:
+            for row in rows:
+                yield dict(zip(columns, row))
+            rows = c.fetchmany(CHUNK_SIZE)
+
+
+def barcode_key(row):
+    return row['barcode_key']
+
+
 # @print_sql_queries
 @login_required
 @staff_member_required
+@exportable
 def database_data(request):
+    """
+    Get all libraries and samples with their requests, pools and
+    flowcells, sorted by barcode in the database. If `stream` is set,
+    the rows are streamed.
+    """
+    if is_streaming_requested(request):
+        data = heapq.merge(
+            iterate_database_rows(
+                'library', 'libraries', LIBRARY_SELECT, ''),
+            iterate_database_rows(
+                'sample', 'samples', SAMPLE_SELECT, SAMPLE_JOINS),
+            key=barcode_key,
+        )
+        return StreamingJSONResponse(
+            data, {'columns': DATABASE_COLUMNS}, encoder=DjangoJSONEncoder)
+
     with connection.cursor() as c:
         query = QUERY.format(
             table_name='library',
             table_name_plural='libraries',
             select=LIBRARY_SELECT,
             joins='',
-        )
+        ) + ORDER_BY_BARCODE
         c.execute(query)
         columns = [col[0] for col in c.description]
         libraries = [dict(zip(columns, row)) for row in c.fetchall()]
@@ -408,60 +305,11 @@ def database_data(request):
             table_name_plural='samples',
             select=SAMPLE_SELECT,
             joins=SAMPLE_JOINS,
-        )
+        ) + ORDER_BY_BARCODE
         c.execute(query)
         columns = [col[0] for col in c.description]
         samples = [dict(zip(columns, row)) for row in c.fetchall()]
 
-    data = sorted(libraries + samples, key=lambda x: (
-        int(x['Barcode'][:2]),
-        int(x['Barcode'][3:]),
-    ))
-
-    columns = [
-        'Name',
-        'Barcode',
-        'Status',
-        'Request',
-        'User',
-        'Library Type',
-        'Library Protocol',
-        'Concentration',
-        'Sequencing Depth',
-        'Read Length',
-        'Concentration Method',
-        'Equal Representation of Nucleotides',
-        'Index Type',
-        'Index Reads',
-        'Index I7 ID',
-        'Index I7',
-        'Index I5 ID',
-        'Index I5',
-        'Amplification Cycles',
-        'Dilution Factor',
-        'Concentration (Facility)',
-        'Sample Volume (Facility)',
-        'Amount (Facility)',
-        'Size Distribution (Facility)',
-        'Concentration Method (Facility)',
-        'RNA Quality (Facility)',
-        'Organism',
-        'Concentration C1',
-        'RNA Quality',
-        'Nucleic Acid Type',
-        'Starting Amount',
-        'Spike-in Volume',
-        'PCR Cycles',
-        'Concentration Library',
-        'Mean Fragment Size',
-        'nM',
-        'qPCR Result',
-        'qPCR Result (Facility)',
-        'Pool',
-        'Pool Size',
-        'Flowcell ID',
-        'Flowcell create time',
-        'Sequencer',
-    ]
-
-    return JsonResponse({'columns': columns, 'data': data})
+    data = list(heapq.merge(libraries, samples, key=barcode_key))
+
+    return JsonResponse({'columns': DATABASE_COLUMNS, 'data': data})
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class RequestConfig(AppConfig):
     name = 'request'
+
+    def ready(self):
+        import request.signals
@@ -0,0 +1,335 @@
+import io
+import hashlib
+
+from django.apps import apps
+
+from docx import Document
+from docx.enum.style import WD_STYLE_TYPE
+from docx.shared import Pt, Cm
+
+from common.utils import merge_records
+
+Library = apps.get_model('library', 'Library')
+Sample = apps.get_model('sample', 'Sample')
+LibraryPreparation = apps.get_model(
+    'library_preparation', 'LibraryPreparation')
+Flowcell = apps.get_model('flowcell', 'Flowcell')
+Lane = apps.get_model('flowcell', 'Lane')
+RequestReport = apps.get_model('request', 'RequestReport')
+
+# Increment to invalidate the cached reports when the layout changes
+REPORT_VERSION = 1
+
+TABLE_STYLE = 'Report Table'
+
+
+class CompleteReport:
+    """
+    The QC complete report of a request as a DOCX document. Its data is
+    fetched in a fixed number of queries. The last rendered document of a
+    request is stored in the database, together with a key made of the
+    versions (update times) of the request's records and of the related
+    names shown in the report.
+    """
+
+    def __init__(self, request):
+        self.request = request
+
+    def render(self):
+        """ Get the document's content, the stored one if possible. """
+        key = self.get_cache_key()
+        content = RequestReport.objects.filter(
+            request=self.request, cache_key=key,
+        ).values_list('content', flat=True).first()
+        if content is not None:
+            return bytes(content)
+
+        content = self.build()
+        RequestReport.store(self.request.pk, key, content)
+        return content
+
+    def get_cache_key(self):
+        """
+        Hash the update times of the request's records, preparations and
+        flowcells and the names from other objects (nucleic acid types,
+        protocols, sequencers and the pools on the lanes), which don't
+        change the update times of the records.
+        """
+        request = self.request
+        versions = [
+            ('Request', request.pk, request.update_time),
+            ('Library', list(Library.objects.filter(
+                request=request).order_by('pk').values_list(
+                    'pk', 'update_time'))),
+            ('Sample', list(Sample.objects.filter(
+                request=request).order_by('pk').values_list(
+                    'pk', 'update_time', 'nucleic_acid_type__name'))),
+            ('LibraryPreparation', list(LibraryPreparation.objects.filter(
+                sample__request=request).order_by('pk').values_list(
+                    'pk', 'update_time', 'sample__library_protocol__name'))),
+            ('Flowcell', list(Flowcell.objects.filter(
+                requests=request).order_by('pk').values_list(
+                    'pk', 'update_time', 'sequencer__name'))),
+            ('Lane', list(Lane.objects.filter(
+                flowcell__requests=request).order_by('pk').values_list(
+                    'pk', 'flowcell', 'pool', 'pool__name'))),
+        ]
+        return hashlib.sha256(
+            repr((REPORT_VERSION, versions)).encode()).hexdigest()
+
+    def get_data(self):
+        request = self.request
+
+        records = merge_records(
+            Library.objects.filter(request=request),
+            Sample.objects.filter(request=request).select_related(
+                'nucleic_acid_type'),
+        )
+
+        preparations = LibraryPreparation.objects.filter(
+            sample__request=request,
+        ).select_related(
+            'sample',
+            'sample__library_protocol',
+        ).order_by('sample__barcode_key', 'pk')
+
+        # Only requests sequenced on one flowcell have the sequencing table
+        flowcells = list(Flowcell.objects.filter(
+            requests=request).select_related('sequencer')[:2])
+        flowcell = flowcells[0] if len(flowcells) == 1 else None
+
+        pool_names = []
+        if flowcell:
+            pool_names = sorted(set(Lane.objects.filter(
+                flowcell=flowcell).values_list('pool__name', flat=True)))
+
+        return records, list(preparations), flowcell, pool_names
+
+    def build(self):
+        records, preparations, flowcell, pool_names = self.get_data()
+
+        # Create DOCX document and set default font family
+        doc = Document()
+        font = doc.styles['Normal'].font
+        font.name = 'Arial'
+
+        # The font size of all tables is set by their style
+        table_style = doc.styles.add_style(TABLE_STYLE, WD_STYLE_TYPE.TABLE)
+        table_style.font.size = Pt(9)
+
+        # Page 1
+        doc.add_heading('Complete Report', 0)
+        p = doc.add_paragraph('')
+        p.add_run('Date, Request ID').bold = True
+
+        doc.add_paragraph('')
+
+        p = doc.add_paragraph('')
+        p.add_run('Table of Contents').bold = True
+        doc.add_paragraph('Summary')
+        doc.add_paragraph('Quality Control of received samples')
+        doc.add_paragraph('Library Construction')
+        doc.add_paragraph('Cluster Generation and Sequencing')
+        doc.add_paragraph('Acknowledgements')
+        doc.add_paragraph('Appendix')
+        doc.add_page_break()
+
+        # Page 2
+        doc.add_heading('General Summary of Workflow', 1)
+        doc.add_paragraph()
+        doc.add_paragraph('Submitted samples or libraries undergo an ' +
+                          'incoming quality control using appropriate ' +
+                          'analytical instruments (Fluorometer, Capillary ' +
+                          'Electrophoresis, qPCR etc). All samples that ' +
+                          'pass international quality standards are ' +
+                          'subjected to appropriate library preparation ' +
+                          'methods. Qualified libraries are pooled for ' +
+                          'multiplex sequencing. An Index Generator ' +
+                          'Software assures suitable index design. Pooled ' +
+                          'libraries are sequenced to reach desired ' +
+                          'depth/coverage using installed sequencing ' +
+                          'instruments. Immediately after the sequencing ' +
+                          'run bcl to fastq conversion and demultiplexing ' +
+                          'is done and the user informed.')
+        doc.add_page_break()
+
+        # Page 3
+        doc.add_heading('Quality Control of received samples/libraries', 1)
+        doc.add_paragraph()
+        doc.add_paragraph('All documented measurements were conducted by ' +
+                          'the deep sequencing facility, MPI-IE Freiburg. ' +
+                          'Raw data and reports of fluorometric ' +
+                          'quantification (Qubit) and size distribution ' +
+                          'measurements (Fragment Analyzer) can be found as ' +
+                          'attachment to each request in Parkour ' +
+                          '(parkour.ie-freiburg.mpg.de).')
+        header = [
+            'Date',
+            'ID',
+            'Name',
+            'L/S',
+            'Nuc.Type',
+            'ng/µl',
+            'bp',
+            'Comments',
+        ]
+        data = []
+        for r in records:
+            rtype = r.__class__.__name__
+            row = [
+                r.create_time.strftime('%d.%m.%Y'),
+                r.barcode,
+                r.name,
+                rtype[0],
+                r.nucleic_acid_type.name if rtype == 'Sample' else '-',
+                r.concentration,
+                r.mean_fragment_size if rtype == 'Library' else '-',
+                r.comments
+            ]
+            data.append(row)
+        self.add_table(doc, header, data)
+        doc.add_page_break()
+
+        # Page 4
+        doc.add_heading('Library Construction', 1)
+        doc.add_paragraph()
+        doc.add_paragraph('Documentation is only possible if libraries were ' +
+                          'constructed in the deep sequencing facility, ' +
+                          'MPI-IE Freiburg. Raw data and reports of ' +
+                          'fluorometric quantification (Qubit) and size ' +
+                          'distribution measurements (Fragment Analyzer) ' +
+                          'can be found as attachment to each request in ' +
+                          'Parkour (parkour.ie-freiburg.mpg.de). Given ' +
+                          'Library Preparation Methods are detailed in the ' +
+                          'appendix.')
+        header = [
+            'Date',
+            'ID',
+            'Name',
+            'Protocol',
+            'Index I7',
+            'Index I5',
+            'PCR',
+            'ng/µl',
+            'bp',
+            'nM',
+            'Comments',
+        ]
+        data = []
+        for r in preparations:
+            row = [
+                r.create_time.strftime('%d.%m.%Y'),
+                r.sample.barcode,
+                r.sample.name,
+                r.sample.library_protocol.name,
+                r.sample.index_i7,
+                r.sample.index_i5,
+                r.pcr_cycles,
+                r.concentration_library,
+                r.mean_fragment_size,
+                r.nM,
+                r.comments
+            ]
+            data.append(row)
+        self.add_table(doc, header, data)
+        doc.add_page_break()
+
+        # Page 5
+        doc.add_heading('Cluster Generation and Sequencing', 1)
+        doc.add_paragraph()
+        header = [
+            'Date',
+            'ID',
+            'Name',
+            'Pool ID',
+            'Flowcell ID',
+            'Sequencer',
+            'Depth (M)',
+            '% Confident off species reads',
+        ]
+        data = []
+        if flowcell:
+            pool_ids = ', '.join(pool_names)
+            sequences = flowcell.sequences if flowcell.sequences else []
+            conf_reads = {
+                s['barcode']: s.get('confident_reads', '')
+                for s in sequences
+            }
+            for r in records:
+                row = [
+                    flowcell.create_time.strftime('%d.%m.%Y'),
+                    r.barcode,
+                    r.name,
+                    pool_ids,
+                    flowcell.flowcell_id,
+                    flowcell.sequencer.name,
+                    r.sequencing_depth,
+                    conf_reads.get(r.barcode, ''),
+                ]
+                data.append(row)
+        self.add_table(doc, header, data, contains_comments=False)
+        doc.add_page_break()
+
+        # Page 6
+        doc.add_heading('Acknowledgements', 1)
+        doc.add_paragraph()
+        doc.add_paragraph('If data produced in the Deep Sequencing Facility ' +
+                          'at MPI-IE, Freiburg is published, include an ' +
+                          'acknowledgement in your paper. Also, review if ' +
+                          'contributions are substantial and should lead to ' +
+                          'an authorship of staff of the facility. ')
+        doc.add_paragraph()
+        doc.add_paragraph('Additionally, let us know of any publications ' +
+                          'involving the facility. Tracking citations and ' +
+                          'publications demonstrate the usefulness of the ' +
+                          'facility as a research resource which is needed ' +
+                          'to obtain further funding.')
+        doc.add_paragraph()
+        doc.add_paragraph('Example acknowledgement')
+        doc.add_paragraph()
+        doc.add_paragraph('We thank the Deep Sequencing Facility @ MPI-IE ' +
+                          'Freiburg, for performance of quality controls, ' +
+                          'library construction and Illumina sequencing.')
+        doc.add_page_break()
+
+        # Page 7
+        doc.add_heading('Appendix', 1)
+        doc.add_paragraph()
+        doc.add_paragraph('Detailed list of different library preparation ' +
+                          'protocols, sequencing devices and installed ' +
+                          'software')
+
+        output = io.BytesIO()
+        doc.save(output)
+        return output.getvalue()
+
+    @staticmethod
+    def add_table(document, header, data, contains_comments=True):
+        """
+        Add a table with a header, one row per item and, if
+        `contains_comments` is set, a row with the comments (the last
+        value) after every item.
+        """
+        columns = header[:-1] if contains_comments else header
+        table = document.add_table(rows=1, cols=len(columns))
+        table.style = document.styles[TABLE_STYLE]
+
+        header_row = table.rows[0]
+        header_row.height = Cm(0.7)
+        for cell, h in zip(header_row.cells, columns):
+            cell.text = h
+
+        for row in data:
+            table_row = table.add_row()
+            table_row.height = Cm(0.7)
+            for cell, value in zip(table_row.cells, row[:-1]):
+                cell.text = str(value)
+
+            if contains_comments:
+                comment_row = table.add_row()
+                comment_row.height = Cm(0.7)
+                comment_cells = comment_row.cells
+                comment_cells[0].merge(comment_cells[-1])
+                comment_cells[0].text = 'Comments: ' + str(row[-1])
+
+        return table
@@ -0,0 +1,53 @@
+import os
+import hashlib
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from request.models import FileRequest, UPLOAD_BLOCK_SIZE, get_blob_name
+
+
+class Command(BaseCommand):
+    help = ('Store the files attached to requests before deduplication by '
+            'their checksums, keeping one copy of every content.')
+
+    def handle(self, *args, **options):
+        processed, missing = 0, 0
+        queryset = FileRequest.objects.filter(sha256='').order_by('pk')
+
+        for obj in queryset.iterator():
+            storage = obj.file.storage
+            name = obj.file.name
+            if not name or not storage.exists(name):
+                missing += 1
+                continue
+
+            checksum = hashlib.sha256()
+            with storage.open(name, 'rb') as f:
+                for block in iter(lambda: f.read(UPLOAD_BLOCK_SIZE), b''):
+                    checksum.update(block)
+            sha256 = checksum.hexdigest()
+
+            with transaction.atomic():
+                FileRequest.lock_blob(sha256)
+                stored_name = FileRequest.get_stored_name(sha256) or \
+                    get_blob_name(sha256, name)
+
+                # Move the file there if the shared file is missing
+                if not storage.exists(stored_name):
+                    path = storage.path(stored_name)
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    os.replace(storage.path(name), path)
+
+                FileRequest.objects.filter(pk=obj.pk).update(
+                    file=stored_name, size=storage.size(stored_name),
+                    sha256=sha256)
+
+                if stored_name != name and storage.exists(name) and \
+                        not FileRequest.objects.filter(file=name).exists():
+                    storage.delete(name)
+
+            processed += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Deduplicated {processed} files, {missing} files are missing.'))
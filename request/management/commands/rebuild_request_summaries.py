@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from request.models import Request, RequestSummary
+
+
+class Command(BaseCommand):
+    help = ('Rebuild the summaries (record counts, sequencing depths and '
+            'statuses) of all requests.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='number of requests per transaction')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        request_ids = list(
+            Request.objects.order_by('pk').values_list('pk', flat=True))
+
+        for i in range(0, len(request_ids), batch_size):
+            RequestSummary.refresh(request_ids[i:i + batch_size])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {len(request_ids)} request summaries.'))
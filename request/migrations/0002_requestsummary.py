@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 12:00
+from __future__ import unicode_literals
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+from django.db.models import Count, Sum
+import django.db.models.deletion
+
+BATCH_SIZE = 500
+
+
+def create_summaries(apps, schema_editor):
+    """
+    Summarize the existing requests: count their libraries and samples by
+    status and sum their sequencing depths, with the historical models.
+    """
+    Request = apps.get_model('request', 'Request')
+    RequestSummary = apps.get_model('request', 'RequestSummary')
+
+    request_ids = list(
+        Request.objects.order_by('pk').values_list('pk', flat=True))
+    for i in range(0, len(request_ids), BATCH_SIZE):
+        summaries = {
+            pk: RequestSummary(request_id=pk, status_counts={})
+            for pk in request_ids[i:i + BATCH_SIZE]
+        }
+
+        for relation, record in [('libraries', 'library'),
+                                 ('samples', 'sample')]:
+            rows = getattr(Request, relation).through.objects.filter(
+                request_id__in=list(summaries),
+            ).order_by().values(
+                'request_id', f'{record}__status',
+            ).annotate(
+                count=Count('pk'),
+                depth=Sum(f'{record}__sequencing_depth'),
+            )
+
+            for row in rows:
+                summary = summaries[row['request_id']]
+                status = row[f'{record}__status']
+                count_field = f'{relation}_count'
+                setattr(summary, count_field,
+                        getattr(summary, count_field) + row['count'])
+                summary.total_sequencing_depth += row['depth'] or 0
+
+                key = str(status)
+                summary.status_counts[key] = \
+                    summary.status_counts.get(key, 0) + row['count']
+
+                if summary.min_status is None or status < summary.min_status:
+                    summary.min_status = status
+                if summary.max_status is None or status > summary.max_status:
+                    summary.max_status = status
+
+        RequestSummary.objects.bulk_create(summaries.values())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('request', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestSummary',
+            fields=[
+                ('request', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='request.Request', verbose_name='Request')),
+                ('libraries_count', models.PositiveIntegerField(default=0, verbose_name='Libraries')),
+                ('samples_count', models.PositiveIntegerField(default=0, verbose_name='Samples')),
+                ('total_sequencing_depth', models.FloatField(default=0, verbose_name='Total Sequencing Depth')),
+                ('min_status', models.SmallIntegerField(blank=True, null=True, verbose_name='Min Status')),
+                ('max_status', models.SmallIntegerField(blank=True, null=True, verbose_name='Max Status')),
+                ('status_counts', django.contrib.postgres.fields.jsonb.JSONField(default=dict, verbose_name='Status Counts')),
+            ],
+            options={
+                'verbose_name': 'Request Summary',
+                'verbose_name_plural': 'Request Summaries',
+            },
+        ),
+        migrations.RunPython(create_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 12:00
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('request', '0003_request_create_time_id_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FileUpload',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('create_time', models.DateTimeField(auto_now_add=True, verbose_name='Create Time')),
+                ('update_time', models.DateTimeField(auto_now=True, verbose_name='Update Time')),
+                ('name', models.CharField(max_length=200, verbose_name='Name')),
+                ('size', models.BigIntegerField(verbose_name='Size')),
+                ('offset', models.BigIntegerField(default=0, verbose_name='Offset')),
+                ('sha256', models.CharField(blank=True, max_length=64, verbose_name='SHA-256')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='User')),
+            ],
+            options={
+                'verbose_name': 'File Upload',
+                'verbose_name_plural': 'File Uploads',
+            },
+        ),
+    ]
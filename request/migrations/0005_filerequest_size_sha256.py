@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 12:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('request', '0004_fileupload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='filerequest',
+            name='sha256',
+            field=models.CharField(blank=True, db_index=True, max_length=64, verbose_name='SHA-256'),
+        ),
+        migrations.AddField(
+            model_name='filerequest',
+            name='size',
+            field=models.BigIntegerField(blank=True, null=True, verbose_name='Size'),
+        ),
+    ]
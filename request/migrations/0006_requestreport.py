@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 12:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('request', '0005_filerequest_size_sha256'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestReport',
+            fields=[
+                ('request', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='report', serialize=False, to='request.Request', verbose_name='Request')),
+                ('cache_key', models.CharField(max_length=64, verbose_name='Cache Key')),
+                ('content', models.BinaryField(verbose_name='Content')),
+            ],
+            options={
+                'verbose_name': 'Request Report',
+                'verbose_name_plural': 'Request Reports',
+            },
+        ),
+    ]
@@ -1,8 +1,14 @@
+import os
+import hashlib
 import itertools
+import threading
+from contextlib import contextmanager
 
-from django.db import models
+from django.db import models, connection, transaction
+from django.db.models import Count, Sum
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.fields import JSONField
 
 from common.models import DateTimeMixin, CostUnit
 from library.models import Library
@@ -13,13 +19,223 @@ def get_sentinel_user():
     return get_user_model().objects.get_or_create(username='deleted')[0]
 
 
+def get_blob_name(sha256, name):
+    """
+    Get the content-addressed name of a file, e.g.,
+    request_files/sha256/ab/ab12...ef.pdf. The extension is kept, so the
+    files are served with the right content type.
+    """
+    extension = os.path.splitext(name)[1].lower()
+    return f'request_files/sha256/{sha256[:2]}/{sha256}{extension}'
+
+
 class FileRequest(models.Model):
+    """
+    A file attached to a request. The files are stored by their SHA-256
+    checksums, so the same content uploaded several times is stored once
+    and is shared by all its FileRequest objects; it's deleted with the
+    last of them. Files uploaded before that have no checksum.
+    """
     name = models.CharField('Name', max_length=200)
     file = models.FileField(upload_to='request_files/%Y/%m/%d/')
+    size = models.BigIntegerField('Size', null=True, blank=True)
+    sha256 = models.CharField(
+        'SHA-256', max_length=64, blank=True, db_index=True)
 
     def __str__(self):
         return self.name
 
+    @property
+    def file_size(self):
+        return self.size if self.size is not None else self.file.size
+
+    @classmethod
+    def get_stored_name(cls, sha256):
+        """
+        Get the name of the stored file with a given checksum. The file
+        itself may be missing, the callers have to check it.
+        """
+        return cls.objects.filter(sha256=sha256).exclude(file='') \
+            .values_list('file', flat=True).first()
+
+    @staticmethod
+    def lock_blob(sha256):
+        """
+        Lock the stored file with a given checksum until the end of the
+        transaction, so that it isn't deleted while it's being attached.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT pg_advisory_xact_lock(%s)', [int(sha256[:15], 16)])
+
+    @classmethod
+    def create_from_file(cls, name, file):
+        """ Attach an uploaded file, storing it only if it's new. """
+        checksum = hashlib.sha256()
+        for chunk in file.chunks():
+            checksum.update(chunk)
+
+        obj = cls(name=name, size=file.size, sha256=checksum.hexdigest())
+        storage = obj.file.storage
+
+        with transaction.atomic():
+            cls.lock_blob(obj.sha256)
+            stored_name = cls.get_stored_name(obj.sha256) or \
+                get_blob_name(obj.sha256, name)
+
+            # Store the file again if the shared file has gone missing
+            if not storage.exists(stored_name):
+                file.seek(0)
+                stored_name = storage.save(stored_name, file)
+
+            obj.file = stored_name
+            obj.save()
+        return obj
+
+    @classmethod
+    def create_from_upload(cls, upload):
+        """
+        Attach a complete chunked upload (see FileUpload), moving it to
+        the storage only if it's new.
+        """
+        obj = cls(name=upload.name, size=upload.size, sha256=upload.sha256)
+        storage = obj.file.storage
+
+        with transaction.atomic():
+            cls.lock_blob(obj.sha256)
+            stored_name = cls.get_stored_name(obj.sha256) or \
+                get_blob_name(obj.sha256, obj.name)
+
+            # Store the file again if the shared file has gone missing
+            if storage.exists(stored_name):
+                obj.file = stored_name
+                upload.delete()
+            else:
+                upload.move_to(obj, 'file', stored_name)
+
+            obj.save()
+        return obj
+
+
+# Size of the blocks read from uploaded chunks and partial files
+UPLOAD_BLOCK_SIZE = 64 * 1024
+
+# Running checksums of the uploads in progress, by upload id, with the
+# offsets they were computed up to. If a chunk arrives at another
+# process, the checksum is recomputed from the partial file.
+_upload_checksums = {}
+
+
+class FileUpload(DateTimeMixin):
+    """
+    A file uploaded in chunks. The chunks are appended to a partial file
+    in `UPLOADS_PATH`, so an interrupted upload can be resumed from its
+    offset. Complete uploads are moved to the storage of a file field.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        verbose_name='User',
+        on_delete=models.CASCADE,
+    )
+    name = models.CharField('Name', max_length=200)
+    size = models.BigIntegerField('Size')
+    offset = models.BigIntegerField('Offset', default=0)
+    sha256 = models.CharField('SHA-256', max_length=64, blank=True)
+
+    class Meta:
+        verbose_name = 'File Upload'
+        verbose_name_plural = 'File Uploads'
+
+    def __str__(self):
+        return self.name
+
+    @property
+    def path(self):
+        return os.path.join(settings.UPLOADS_PATH, str(self.pk))
+
+    @property
+    def is_complete(self):
+        return self.offset == self.size
+
+    def _get_checksum(self):
+        offset, checksum = _upload_checksums.get(self.pk, (None, None))
+        if offset == self.offset:
+            return checksum
+
+        checksum = hashlib.sha256()
+        if self.offset:
+            with open(self.path, 'rb') as f:
+                remaining = self.offset
+                while remaining:
+                    block = f.read(min(UPLOAD_BLOCK_SIZE, remaining))
+                    if not block:
+                        raise ValueError('The uploaded file is incomplete.')
+                    checksum.update(block)
+                    remaining -= len(block)
+        return checksum
+
+    def append(self, stream):
+        """
+        Append a chunk, read from a file-like object, at the current
+        offset and update the checksum. Any data written after the offset
+        by an interrupted request is overwritten. The upload must be
+        locked by the caller (e.g., with select_for_update()).
+        """
+        checksum = self._get_checksum()
+        _upload_checksums.pop(self.pk, None)
+        offset = self.offset
+
+        os.makedirs(settings.UPLOADS_PATH, exist_ok=True)
+        with open(self.path, 'r+b' if offset else 'wb') as f:
+            f.seek(offset)
+            f.truncate()
+            while True:
+                block = stream.read(UPLOAD_BLOCK_SIZE)
+                if not block:
+                    break
+                offset += len(block)
+                if offset > self.size:
+                    raise ValueError('The chunk exceeds the file size.')
+                f.write(block)
+                checksum.update(block)
+            f.flush()
+            os.fsync(f.fileno())
+
+        self.offset = offset
+        if self.is_complete:
+            self.sha256 = checksum.hexdigest()
+        else:
+            _upload_checksums[self.pk] = (offset, checksum)
+        self.save(update_fields=['offset', 'sha256', 'update_time'])
+
+    def move_to(self, instance, field_name, name=None):
+        """
+        Move a complete upload to the storage of a file field of a model
+        instance (which is left to the caller to save) and delete it. If
+        `name` isn't given, the field's upload_to is used.
+        """
+        if not self.is_complete:
+            raise ValueError(f'The upload of "{self.name}" is incomplete.')
+
+        field = instance._meta.get_field(field_name)
+        if name is None:
+            name = field.storage.get_available_name(
+                field.generate_filename(instance, self.name),
+                max_length=field.max_length,
+            )
+        path = field.storage.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(self.path, path)
+
+        setattr(instance, field_name, name)
+        self.delete()
+
+    def delete(self, *args, **kwargs):
+        _upload_checksums.pop(self.pk, None)
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        super().delete(*args, **kwargs)
+
 
 class Request(DateTimeMixin):
     name = models.CharField('Name', max_length=100, blank=True)
@@ -74,6 +290,14 @@ class Request(DateTimeMixin):
         default=False,
     )
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['create_time', 'id'],
+                name='request_create_time_id_idx',
+            ),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -113,3 +337,177 @@ class Request(DateTimeMixin):
         self.files.all().delete()
 
         super().delete(*args, **kwargs)
+
+
+class RequestReport(models.Model):
+    """
+    The last rendered QC complete report of a request (see
+    `request.complete_report`), shared by all processes.
+    """
+    request = models.OneToOneField(
+        Request,
+        verbose_name='Request',
+        related_name='report',
+        primary_key=True,
+        on_delete=models.CASCADE,
+    )
+    cache_key = models.CharField('Cache Key', max_length=64)
+    content = models.BinaryField('Content')
+
+    class Meta:
+        verbose_name = 'Request Report'
+        verbose_name_plural = 'Request Reports'
+
+    def __str__(self):
+        return str(self.request_id)
+
+    @classmethod
+    def store(cls, request_id, cache_key, content):
+        """ Insert or replace the report of a request in one statement. """
+        table = cls._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(f'''
+                INSERT INTO {table} (request_id, cache_key, content)
+                VALUES (%s, %s, %s)
+                ON CONFLICT (request_id) DO UPDATE SET
+                    cache_key = EXCLUDED.cache_key,
+                    content = EXCLUDED.content
+            ''', [request_id, cache_key, content])
+
+
+class RequestSummary(models.Model):
+    """
+    Record counts, sequencing depths and statuses of a request's libraries
+    and samples. Kept up to date by signals (see `request.signals`).
+    """
+    request = models.OneToOneField(
+        Request,
+        verbose_name='Request',
+        related_name='summary',
+        primary_key=True,
+        on_delete=models.CASCADE,
+    )
+
+    libraries_count = models.PositiveIntegerField('Libraries', default=0)
+    samples_count = models.PositiveIntegerField('Samples', default=0)
+
+    total_sequencing_depth = models.FloatField(
+        'Total Sequencing Depth', default=0)
+
+    min_status = models.SmallIntegerField('Min Status', null=True, blank=True)
+    max_status = models.SmallIntegerField('Max Status', null=True, blank=True)
+
+    # {status: number of records}, the keys are strings
+    status_counts = JSONField('Status Counts', default=dict)
+
+    # Requests to refresh at the end of `batch()`, per thread
+    _batch = threading.local()
+
+    class Meta:
+        verbose_name = 'Request Summary'
+        verbose_name_plural = 'Request Summaries'
+
+    def __str__(self):
+        return str(self.request_id)
+
+    @property
+    def records_count(self):
+        return self.libraries_count + self.samples_count
+
+    @property
+    def is_complete(self):
+        """ Return True if all libraries and samples have status 5. """
+        return self.records_count == 0 or \
+            self.min_status == self.max_status == 5
+
+    def count_status(self, status):
+        return self.status_counts.get(str(status), 0)
+
+    @classmethod
+    @contextmanager
+    def batch(cls):
+        """
+        Refresh the summaries once at the end of the block, e.g., when
+        many records are edited at once.
+        """
+        if getattr(cls._batch, 'request_ids', None) is not None:
+            yield
+            return
+
+        cls._batch.request_ids = set()
+        try:
+            yield
+            request_ids = cls._batch.request_ids
+        finally:
+            cls._batch.request_ids = None
+        cls.refresh(request_ids)
+
+    @classmethod
+    def refresh(cls, request_ids):
+        """
+        Recalculate the summaries of given requests. Libraries and samples
+        are grouped by request and status in the database, the records
+        themselves aren't fetched.
+        """
+        request_ids = set(request_ids) - {None}
+        if not request_ids:
+            return
+
+        batch = getattr(cls._batch, 'request_ids', None)
+        if batch is not None:
+            batch.update(request_ids)
+            return
+
+        with transaction.atomic():
+            # Lock the requests, so that concurrent refreshes of the same
+            # request don't interfere
+            locked_ids = Request.objects.select_for_update().filter(
+                pk__in=request_ids).order_by('pk').values_list(
+                'pk', flat=True)
+            summaries = summarize_requests(Request, cls, locked_ids)
+
+            cls.objects.filter(request_id__in=list(summaries)).delete()
+            cls.objects.bulk_create(summaries.values())
+
+
+def summarize_requests(request_model, summary_model, request_ids):
+    """
+    Calculate (unsaved) summaries of given requests, see
+    `RequestSummary.refresh()`.
+    """
+    summaries = {
+        pk: summary_model(request_id=pk, status_counts={})
+        for pk in request_ids
+    }
+
+    for relation in ['libraries', 'samples']:
+        through = getattr(request_model, relation).through
+        record = request_model._meta.get_field(
+            relation).m2m_reverse_field_name()
+        rows = through.objects.filter(
+            request_id__in=list(summaries),
+        ).order_by().values(
+            'request_id', f'{record}__status',
+        ).annotate(
+            count=Count('pk'),
+            depth=Sum(f'{record}__sequencing_depth'),
+        )
+
+        for row in rows:
+            summary = summaries[row['request_id']]
+            status = row[f'{record}__status']
+            count_field = f'{relation}_count'
+            setattr(summary, count_field,
+                    getattr(summary, count_field) + row['count'])
+            summary.total_sequencing_depth += row['depth'] or 0
+
+            key = str(status)
+            summary.status_counts[key] = \
+                summary.status_counts.get(key, 0) + row['count']
+
+            if summary.min_status is None or status < summary.min_status:
+                summary.min_status = status
+            if summary.max_status is None or status > summary.max_status:
+                summary.max_status = status
+
+    return summaries
@@ -13,6 +13,7 @@ class RequestSerializer(ModelSerializer):
     completed = SerializerMethodField()
     files = SerializerMethodField()
     number_of_samples = SerializerMethodField()
+    total_sequencing_depth = SerializerMethodField()
 
     class Meta:
         model = Request
@@ -38,19 +39,31 @@ class RequestSerializer(ModelSerializer):
         return obj.user.full_name
 
     def get_number_of_samples(self,obj):
-        return len(obj.statuses)
+        if hasattr(obj, 'records_count'):
+            return obj.records_count
+        return obj.summary.records_count
+
+    def get_total_sequencing_depth(self, obj):
+        if hasattr(obj, 'records_depth'):
+            return obj.records_depth
+        return obj.summary.total_sequencing_depth
 
     def get_restrict_permissions(self, obj):
         """
         Don't allow the users to modify the requests and libraries/samples
         if they have reached status 1 or higher (or failed).
         """
-        return True if not obj.user.is_staff and obj.statuses.count(0) == 0 \
-            else False
+        if hasattr(obj, 'records_new'):
+            num_new = obj.records_new
+        else:
+            num_new = obj.summary.count_status(0)
+        return True if not obj.user.is_staff and num_new == 0 else False
 
     def get_completed(self, obj):
         """ Return True if request's libraries and samples are sequenced. """
-        return obj.statuses.count(6) > 0
+        if hasattr(obj, 'records_sequenced'):
+            return obj.records_sequenced > 0
+        return obj.summary.count_status(6) > 0
 
     def get_deep_seq_request_name(self, obj):
         return obj.deep_seq_request.name.split('/')[-1] \
@@ -123,7 +136,7 @@ class RequestFileSerializer(ModelSerializer):
         fields = ('id', 'name', 'size', 'path')
 
     def get_size(self, obj):
-        return obj.file.size
+        return obj.file_size
 
     def get_path(self, obj):
         return settings.MEDIA_URL + obj.file.name
@@ -0,0 +1,125 @@
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_init,
+    post_save,
+    pre_delete,
+)
+from django.db import transaction
+from django.dispatch import receiver
+
+from library.models import Library
+from sample.models import Sample
+from .models import Request, RequestSummary, FileRequest
+
+# Fields of libraries and samples which are part of the request summary
+SUMMARY_FIELDS = ('status', 'sequencing_depth')
+
+
+def get_summary_values(instance):
+    """ The loaded summary fields of a record (deferred ones are None). """
+    return tuple(instance.__dict__.get(x) for x in SUMMARY_FIELDS)
+
+
+@receiver(post_save, sender=Request)
+def create_request_summary(sender, instance, created, **kwargs):
+    """ When a request is created, create an empty summary for it. """
+    if created:
+        RequestSummary.refresh([instance.pk])
+
+
+@receiver(post_init, sender=Library)
+@receiver(post_init, sender=Sample)
+def remember_summary_values(sender, instance, **kwargs):
+    """ Remember the summary fields of a record as loaded. """
+    instance._summary_values = get_summary_values(instance)
+
+
+@receiver(post_save, sender=Library)
+@receiver(post_save, sender=Sample)
+def update_request_summary(sender, instance, created, update_fields,
+                           **kwargs):
+    """
+    When the status or the sequencing depth of a library or a sample is
+    changed, update the summary of its request. New records don't belong
+    to any request yet.
+    """
+    old_values = getattr(instance, '_summary_values', None)
+    instance._summary_values = get_summary_values(instance)
+    if created:
+        return
+
+    if update_fields is not None and \
+            not set(SUMMARY_FIELDS) & set(update_fields):
+        return
+
+    if old_values is not None and None not in old_values and \
+            old_values == instance._summary_values:
+        return
+
+    RequestSummary.refresh(instance.request.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Library)
+@receiver(pre_delete, sender=Sample)
+def remember_request_ids(sender, instance, **kwargs):
+    """
+    Remember the requests of a library or a sample before it is deleted,
+    the relations are gone afterwards.
+    """
+    instance._summary_request_ids = list(
+        instance.request.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Library)
+@receiver(post_delete, sender=Sample)
+def update_request_summary_delete(sender, instance, **kwargs):
+    """ When a library or a sample is deleted, update its request. """
+    RequestSummary.refresh(getattr(instance, '_summary_request_ids', []))
+
+
+@receiver(m2m_changed, sender=Request.libraries.through)
+@receiver(m2m_changed, sender=Request.samples.through)
+def update_request_summary_m2m(sender, instance, action, reverse, pk_set,
+                               **kwargs):
+    """
+    When libraries or samples are added to or removed from a request,
+    update its summary.
+    """
+    if not reverse:
+        if action in ['post_add', 'post_remove', 'post_clear']:
+            RequestSummary.refresh([instance.pk])
+        return
+
+    # The relation has been changed from the library or sample side
+    if action == 'pre_clear':
+        instance._summary_request_ids = list(
+            instance.request.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        RequestSummary.refresh(getattr(instance, '_summary_request_ids', []))
+    elif action in ['post_add', 'post_remove']:
+        RequestSummary.refresh(pk_set or [])
+
+
+@receiver(post_delete, sender=FileRequest)
+def delete_unused_file(sender, instance, **kwargs):
+    """
+    When the last FileRequest of a stored file is deleted, delete the
+    file (once the transaction is committed).
+    """
+    if not instance.sha256 or not instance.file:
+        return
+
+    storage = instance.file.storage
+    name = instance.file.name
+    sha256 = instance.sha256
+
+    def delete_file():
+        # Wait for the requests attaching the same file to finish
+        with transaction.atomic():
+            FileRequest.lock_blob(sha256)
+            if not FileRequest.objects.filter(file=name).exists():
+                storage.delete(name)
+
+    transaction.on_commit(delete_file)
+
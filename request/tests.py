@@ -1,17 +1,37 @@
+import os
 import json
+import shutil
+import hashlib
 import tempfile
+from io import StringIO
+from urllib.parse import urlparse, parse_qs
 
 from django.contrib.auth import get_user_model
-# from django.core.files.base import ContentFile
-from django.test import TestCase
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 from common.models import Organization, PrincipalInvestigator
 from common.tests import BaseTestCase
 from common.utils import get_random_name
 
-from .models import Request, FileRequest
+from .models import (
+    Request,
+    RequestReport,
+    RequestSummary,
+    FileRequest,
+    FileUpload,
+    _upload_checksums,
+)
+from .complete_report import CompleteReport
 from library.tests import create_library
+from library.models import Library
 from sample.tests import create_sample
+from index_generator.models import Pool, PoolSize
+from flowcell.models import Sequencer, Lane, Flowcell
 
 User = get_user_model()
 
@@ -88,6 +108,117 @@ class TestRequestModel(TestCase):
         self.assertEqual(request.total_records_count, 2)
 
 
+class TestRequestSummary(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='foo@bar.io',
+            password='foo-foo',
+        )
+        self.request = create_request(self.user)
+
+    def get_summary(self):
+        return RequestSummary.objects.get(request=self.request)
+
+    def test_empty_summary(self):
+        summary = self.get_summary()
+        self.assertEqual(summary.records_count, 0)
+        self.assertEqual(summary.total_sequencing_depth, 0)
+        self.assertIsNone(summary.min_status)
+        self.assertEqual(summary.status_counts, {})
+        self.assertTrue(summary.is_complete)
+
+    def test_add_records(self):
+        self.request.libraries.add(
+            create_library(get_random_name(), status=1),
+            create_library(get_random_name(), status=2),
+        )
+        self.request.samples.add(create_sample(get_random_name(), status=2))
+
+        summary = self.get_summary()
+        self.assertEqual(summary.libraries_count, 2)
+        self.assertEqual(summary.samples_count, 1)
+        self.assertEqual(summary.records_count, 3)
+        self.assertEqual(summary.total_sequencing_depth, 3)
+        self.assertEqual(summary.min_status, 1)
+        self.assertEqual(summary.max_status, 2)
+        self.assertEqual(summary.status_counts, {'1': 1, '2': 2})
+        self.assertEqual(summary.count_status(2), 2)
+        self.assertEqual(summary.count_status(6), 0)
+        self.assertFalse(summary.is_complete)
+
+    def test_update_record(self):
+        library = create_library(get_random_name(), status=4)
+        self.request.libraries.add(library)
+
+        library.status = 5
+        library.sequencing_depth = 10
+        library.save()
+
+        summary = self.get_summary()
+        self.assertEqual(summary.status_counts, {'5': 1})
+        self.assertEqual(summary.total_sequencing_depth, 10)
+        self.assertTrue(summary.is_complete)
+
+    def test_unchanged_record(self):
+        """ Ensure saving a record without summary changes is cheap. """
+        library = create_library(get_random_name(), status=4)
+        self.request.libraries.add(library)
+        library = Library.objects.get(pk=library.pk)
+
+        library.name = get_random_name()
+        with CaptureQueriesContext(connection) as context:
+            library.save()
+        table = RequestSummary._meta.db_table
+        self.assertFalse(any(table in x['sql'] for x in context))
+
+        library.status = 5
+        library.save(update_fields=['name'])
+        self.assertEqual(self.get_summary().status_counts, {'4': 1})
+
+    def test_batch(self):
+        """ Ensure the summaries are refreshed once, after a batch. """
+        libraries = [
+            create_library(get_random_name(), status=1) for _ in range(3)]
+        self.request.libraries.add(*libraries)
+
+        with RequestSummary.batch():
+            for library in libraries:
+                library.status = 2
+                library.save()
+            self.assertEqual(self.get_summary().status_counts, {'1': 3})
+
+        self.assertEqual(self.get_summary().status_counts, {'2': 3})
+
+    def test_remove_and_delete_records(self):
+        library = create_library(get_random_name())
+        sample = create_sample(get_random_name())
+        self.request.libraries.add(library)
+        self.request.samples.add(sample)
+
+        self.request.libraries.remove(library)
+        self.assertEqual(self.get_summary().records_count, 1)
+
+        sample.delete()
+        self.assertEqual(self.get_summary().records_count, 0)
+
+    def test_reverse_relation(self):
+        library = create_library(get_random_name())
+        library.request.add(self.request)
+        self.assertEqual(self.get_summary().libraries_count, 1)
+
+        library.request.clear()
+        self.assertEqual(self.get_summary().libraries_count, 0)
+
+    def test_rebuild_command(self):
+        self.request.libraries.add(create_library(get_random_name()))
+        RequestSummary.objects.all().delete()
+
+        out = StringIO()
+        call_command('rebuild_request_summaries', stdout=out)
+        self.assertEqual(self.get_summary().libraries_count, 1)
+        self.assertIn('Rebuilt 1 request summaries.', out.getvalue())
+
+
 class FileRequestTest(TestCase):
     def setUp(self):
         tmp_file = tempfile.NamedTemporaryFile()
@@ -136,6 +267,79 @@ class TestRequests(BaseTestCase):
         self.assertIn(request1.name, requests)
         self.assertNotIn(request2.name, requests)
 
+    def test_request_list_aggregates(self):
+        """ Ensure record counts, depths and statuses are aggregated. """
+        request = create_request(self.user)
+        request.libraries.add(
+            create_library(get_random_name(), status=0),
+            create_library(get_random_name(), status=6),
+        )
+        request.samples.add(create_sample(get_random_name(), status=2))
+
+        response = self.client.get('/api/requests/')
+        self.assertEqual(response.status_code, 200)
+        data = [
+            x for x in response.json()['results']
+            if x['pk'] == request.pk
+        ][0]
+        self.assertEqual(data['number_of_samples'], 3)
+        self.assertEqual(data['total_sequencing_depth'], 3)
+        self.assertTrue(data['completed'])
+        self.assertFalse(data['restrict_permissions'])
+
+    def test_request_list_number_of_queries(self):
+        """ Ensure the number of queries doesn't depend on records. """
+        request = create_request(self.user)
+        request.samples.add(create_sample(get_random_name()))
+
+        with CaptureQueriesContext(connection) as context:
+            self.client.get('/api/requests/')
+        num_queries = len(context)
+
+        for _ in range(3):
+            request = create_request(self.user)
+            request.libraries.add(create_library(get_random_name()))
+            request.samples.add(create_sample(get_random_name()))
+
+        with CaptureQueriesContext(connection) as context:
+            self.client.get('/api/requests/')
+        self.assertEqual(len(context), num_queries)
+
+    def test_request_list_cursor(self):
+        """ Ensure the requests can be paginated with a cursor. """
+        requests = [create_request(self.user) for _ in range(3)]
+
+        response = self.client.get(
+            '/api/requests/', {'cursor': '', 'page_size': 2})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertNotIn('count', data)
+        self.assertEqual(
+            [x['pk'] for x in data['results']],
+            [requests[2].pk, requests[1].pk],
+        )
+
+        cursor = parse_qs(urlparse(data['next']).query)['cursor'][0]
+        response = self.client.get(
+            '/api/requests/', {'cursor': cursor, 'page_size': 2})
+        data = response.json()
+        self.assertIsNone(data['next'])
+        self.assertIn(requests[0].pk, [x['pk'] for x in data['results']])
+        self.assertNotIn(requests[1].pk, [x['pk'] for x in data['results']])
+
+    def test_request_list_cursor_count(self):
+        create_request(self.user)
+        response = self.client.get(
+            '/api/requests/', {'cursor': '', 'count': 'true'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()['count'], Request.objects.filter(
+                sequenced=False).count())
+
+    def test_request_list_invalid_cursor(self):
+        response = self.client.get('/api/requests/', {'cursor': 'blah'})
+        self.assertEqual(response.status_code, 400)
+
     def test_search(self):
         """ Ensure search behaves correctly. """
         request1 = create_request(self.user)
@@ -277,6 +481,23 @@ class TestRequests(BaseTestCase):
         request = Request.objects.get(pk=request.pk)
         self.assertTrue(request.samples_submitted)
 
+    def test_mark_as_complete(self):
+        """ Ensure a request is complete if all records have status 5. """
+        request = create_request(self.user)
+        library = create_library(get_random_name(), status=4)
+        request.libraries.add(library)
+
+        url = f'/api/requests/{request.pk}/mark_as_complete/'
+        data = {'data': json.dumps({'override': 'False'})}
+        response = self.client.post(url, data)
+        self.assertTrue(response.json()['noncomplete'])
+
+        library.status = 5
+        library.save(update_fields=['status'])
+        response = self.client.post(url, data)
+        self.assertTrue(response.json()['success'])
+        self.assertTrue(Request.objects.get(pk=request.pk).sequenced)
+
     def test_delete_request(self):
         """ Ensure delete request behaves correctly. """
         request = create_request(self.user)
@@ -302,10 +523,274 @@ class TestRequests(BaseTestCase):
         self.assertIn(library.name, records)
         self.assertIn(sample.name, records)
 
+    def test_get_records_ordered_by_barcode(self):
+        """ Ensure request's records are ordered by barcode. """
+        request = create_request(self.user)
+        sample = create_sample(get_random_name())
+        library = create_library(get_random_name())
+        old_library = create_library(get_random_name())
+        old_library.barcode = '17L000999'
+        old_library.save()
+        request.libraries.add(library, old_library)
+        request.samples.add(sample)
+
+        response = self.client.get(f'/api/requests/{request.pk}/get_records/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [x['barcode'] for x in response.json()],
+            [old_library.barcode, sample.barcode, library.barcode],
+        )
+
     def test_get_files(self):
         """ Ensure get request's files behaves correctly. """
         pass
 
+    def test_download_complete_report(self):
+        """ Ensure the complete report is stored until a record changes. """
+        request = create_request(self.user)
+        library = create_library(get_random_name())
+        request.libraries.add(library, create_library(get_random_name()))
+        request.samples.add(create_sample(get_random_name()))
+        url = f'/api/requests/{request.pk}/download_complete_report/'
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content.startswith(b'PK'))
+        num_queries = len(context)
+
+        report = CompleteReport(request)
+        key = report.get_cache_key()
+        stored = RequestReport.objects.get(request=request)
+        self.assertEqual(stored.cache_key, key)
+        self.assertEqual(bytes(stored.content), response.content)
+
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(url)
+        self.assertLess(len(context), num_queries)
+
+        library.comments = 'Changed'
+        library.save()
+        self.assertNotEqual(report.get_cache_key(), key)
+
+    def test_complete_report_related_names(self):
+        """
+        Ensure the complete report key changes with the names of related
+        objects and with the pools on the lanes.
+        """
+        request = create_request(self.user)
+        sample = create_sample(get_random_name())
+        request.samples.add(sample)
+
+        pool_size = PoolSize(multiplier=1, size=200)
+        pool_size.save()
+        pool = Pool(user=self.user, size=pool_size, name='Pool 1')
+        pool.save()
+        other_pool = Pool(user=self.user, size=pool_size, name='Pool 2')
+        other_pool.save()
+
+        sequencer = Sequencer(
+            name=get_random_name(), lanes=8, lane_capacity=200)
+        sequencer.save()
+        lane = Lane(name='Lane 1', pool=pool, loading_concentration=1.0)
+        lane.save()
+        flowcell = Flowcell(flowcell_id=get_random_name(), sequencer=sequencer)
+        flowcell.save()
+        flowcell.lanes.add(lane)
+        flowcell.requests.add(request)
+
+        report = CompleteReport(request)
+        keys = [report.get_cache_key()]
+
+        def changed(obj, **values):
+            # Don't touch the update times
+            type(obj).objects.filter(pk=obj.pk).update(**values)
+            keys.append(report.get_cache_key())
+            self.assertNotEqual(keys[-1], keys[-2])
+
+        changed(sequencer, name=get_random_name())
+        changed(pool, name='Pool 3')
+        changed(lane, pool=other_pool)
+        changed(sample.nucleic_acid_type, name=get_random_name())
+
+
+class TestFileUploads(BaseTestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings = override_settings(
+            MEDIA_ROOT=self.media_root,
+            UPLOADS_PATH=f'{self.media_root}/uploads',
+        )
+        self.settings.enable()
+
+        self.user = self.create_user()
+        self.login()
+        self.content = b'0123456789' * 1000
+
+    def tearDown(self):
+        self.settings.disable()
+        shutil.rmtree(self.media_root)
+
+    def create_upload(self):
+        response = self.client.post('/api/file_uploads/', {
+            'name': 'File.txt',
+            'size': len(self.content),
+        })
+        self.assertEqual(response.status_code, 201)
+        return response.json()['id']
+
+    def put_chunk(self, upload_id, offset, chunk):
+        return self.client.put(
+            f'/api/file_uploads/{upload_id}/?offset={offset}', chunk,
+            content_type='application/octet-stream',
+        )
+
+    def test_chunked_upload(self):
+        upload_id = self.create_upload()
+
+        response = self.put_chunk(upload_id, 0, self.content[:4000])
+        data = response.json()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['offset'], 4000)
+        self.assertFalse(data['complete'])
+
+        # A chunk sent again after a dropped response is rejected
+        response = self.put_chunk(upload_id, 0, self.content[:4000])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['offset'], 4000)
+
+        response = self.put_chunk(upload_id, 4000, self.content[4000:])
+        data = response.json()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(data['complete'])
+        self.assertEqual(
+            data['sha256'], hashlib.sha256(self.content).hexdigest())
+
+        response = self.client.post('/api/requests/upload_files/', {
+            'upload_ids': json.dumps([upload_id]),
+        })
+        self.assertEqual(response.status_code, 200)
+        file_ids = response.json()['fileIds']
+        self.assertFalse(FileUpload.objects.filter(pk=upload_id).exists())
+
+        file = FileRequest.objects.get(pk=file_ids[0])
+        self.assertEqual(file.name, 'File.txt')
+        with open(file.file.path, 'rb') as f:
+            self.assertEqual(f.read(), self.content)
+
+        response = self.client.get('/api/requests/get_files_after_upload/', {
+            'file_ids': json.dumps(file_ids),
+        })
+        data = response.json()['data']
+        self.assertEqual([x['id'] for x in data], file_ids)
+        self.assertEqual(data[0]['size'], len(self.content))
+
+    def test_deduplicated_files(self):
+        """ Ensure the same content is stored once. """
+        file_ids = []
+        for name in ['File.txt', 'Copy.txt']:
+            response = self.client.post('/api/requests/upload_files/', {
+                'files': SimpleUploadedFile(name, self.content),
+            })
+            self.assertEqual(response.status_code, 200)
+            file_ids += response.json()['fileIds']
+
+        upload_id = self.create_upload()
+        self.put_chunk(upload_id, 0, self.content)
+        response = self.client.post('/api/requests/upload_files/', {
+            'upload_ids': json.dumps([upload_id]),
+        })
+        file_ids += response.json()['fileIds']
+
+        files = FileRequest.objects.filter(pk__in=file_ids)
+        sha256 = hashlib.sha256(self.content).hexdigest()
+        self.assertEqual({x.sha256 for x in files}, {sha256})
+        self.assertEqual({x.size for x in files}, {len(self.content)})
+        self.assertEqual(
+            {x.file.name for x in files},
+            {f'request_files/sha256/{sha256[:2]}/{sha256}.txt'},
+        )
+        self.assertEqual(
+            sorted(x.name for x in files), ['Copy.txt', 'File.txt', 'File.txt'])
+        self.assertEqual(
+            os.listdir(os.path.join(self.media_root, 'uploads')), [])
+
+    def test_missing_stored_file(self):
+        """ Ensure a shared file which has gone missing is stored again. """
+        first = FileRequest.create_from_file(
+            'File.txt', SimpleUploadedFile('File.txt', self.content))
+        os.remove(first.file.path)
+
+        second = FileRequest.create_from_file(
+            'Copy.txt', SimpleUploadedFile('Copy.txt', self.content))
+        self.assertEqual(second.file.name, first.file.name)
+        with open(first.file.path, 'rb') as f:
+            self.assertEqual(f.read(), self.content)
+
+        # The same for chunked uploads
+        os.remove(first.file.path)
+        upload_id = self.create_upload()
+        self.put_chunk(upload_id, 0, self.content)
+        third = FileRequest.create_from_upload(
+            FileUpload.objects.get(pk=upload_id))
+        self.assertEqual(third.file.name, first.file.name)
+        self.assertTrue(os.path.exists(first.file.path))
+
+    def test_deduplicate_command(self):
+        for name in ['File.txt', 'Copy.txt']:
+            file = FileRequest(name=name)
+            file.file.save(name, ContentFile(self.content))
+
+        out = StringIO()
+        call_command('deduplicate_request_files', stdout=out)
+        self.assertIn('Deduplicated 2 files', out.getvalue())
+
+        names = set(FileRequest.objects.values_list('file', flat=True))
+        self.assertEqual(len(names), 1)
+        self.assertEqual(FileRequest.objects.first().size, len(self.content))
+        self.assertEqual(
+            len(os.listdir(
+                os.path.join(self.media_root, 'request_files', 'sha256',
+                             names.pop().split('/')[2]))), 1)
+
+    def test_checksum_after_restart(self):
+        """ Ensure the checksum is recomputed if it isn't cached. """
+        upload_id = self.create_upload()
+        self.put_chunk(upload_id, 0, self.content[:4000])
+
+        _upload_checksums.clear()
+
+        response = self.put_chunk(upload_id, 4000, self.content[4000:])
+        self.assertEqual(
+            response.json()['sha256'],
+            hashlib.sha256(self.content).hexdigest(),
+        )
+
+    def test_chunk_exceeds_size(self):
+        upload_id = self.create_upload()
+        response = self.put_chunk(upload_id, 0, self.content + b'0')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.json()['message'], 'The chunk exceeds the file size.')
+        self.assertEqual(FileUpload.objects.get(pk=upload_id).offset, 0)
+
+    def test_attach_incomplete_upload(self):
+        upload_id = self.create_upload()
+        self.put_chunk(upload_id, 0, self.content[:10])
+        response = self.client.post('/api/requests/upload_files/', {
+            'upload_ids': json.dumps([upload_id]),
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.json()['success'])
+
+    def test_other_users_upload(self):
+        upload_id = self.create_upload()
+        self.create_user('foo@bar.io', 'foo-foo', False)
+        self.client.login(email='foo@bar.io', password='foo-foo')
+        response = self.client.get(f'/api/file_uploads/{upload_id}/')
+        self.assertEqual(response.status_code, 404)
+
+
 
 # class GenerateDeepSeqRequestTest(TestCase):
 #     def setUp(self):
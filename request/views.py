@@ -1,12 +1,16 @@
+import io
 import json
 import logging
-import itertools
 from unicodedata import normalize
 
 from django.apps import apps
 from django.http import HttpResponse, JsonResponse,Http404
 from django.conf import settings
-from django.db.models import Prefetch
+from django.db import transaction
+from django.db.models import F, Value, IntegerField, FloatField
+from django.db.models.functions import Cast, Coalesce
+from django.contrib.postgres.fields.jsonb import KeyTextTransform
+from django.shortcuts import get_object_or_404
 from django.core.mail import send_mail
 from django.contrib.auth import get_user_model
 from django.template.loader import render_to_string
@@ -18,26 +22,43 @@ from rest_framework.exceptions import NotFound
 from rest_framework.permissions import IsAdminUser
 
 from fpdf import FPDF, HTMLMixin
-from docx import Document
-from docx.shared import Pt,Cm
-from docx.enum.text import WD_BREAK
 
 from common.views import (
     CsrfExemptSessionAuthentication,
     StandardResultsSetPagination,
+    KeysetPaginationMixin,
 )
-from .models import Request, FileRequest
+from common.utils import merge_records
+from export.jobs import exportable
+from .models import Request, RequestSummary, FileRequest, FileUpload
 from .serializers import RequestSerializer, RequestFileSerializer
+from .complete_report import CompleteReport
 import os
 User = get_user_model()
 Library = apps.get_model('library', 'Library')
 Sample = apps.get_model('sample', 'Sample')
-LibraryPreparation = apps.get_model(
-    'library_preparation', 'LibraryPreparation')
 
 logger = logging.getLogger('db')
 
 
+def get_complete_uploads(request, upload_ids):
+    """ Get the complete chunked uploads of the current user. """
+    try:
+        upload_ids = [int(x) for x in upload_ids]
+    except (TypeError, ValueError):
+        raise ValueError('Invalid upload id.')
+
+    uploads = FileUpload.objects.filter(pk__in=upload_ids, user=request.user)
+    if len(uploads) != len(set(upload_ids)):
+        raise ValueError('Invalid upload id.')
+
+    for upload in uploads:
+        if not upload.is_complete:
+            raise ValueError(f'The upload of "{upload.name}" is incomplete.')
+
+    return list(uploads)
+
+
 class PDF(FPDF):  # pragma: no cover
     def __init__(self, title='Title', font='Arial'):
         self.title = title
@@ -149,7 +170,38 @@ class Report(FPDF, HTMLMixin):
         return html
 
 
-class RequestViewSet(viewsets.ModelViewSet):
+def annotate_records(queryset):
+    """
+    Annotate every request with the number of its libraries and samples
+    (`records_count`), their total sequencing depth (`records_depth`) and
+    the number of records with status 0 (`records_new`) and 6
+    (`records_sequenced`).
+
+    The values are read from the request summaries in the same query,
+    libraries and samples aren't aggregated per request.
+    """
+    def count_status(status):
+        return Coalesce(
+            Cast(KeyTextTransform(str(status), 'summary__status_counts'),
+                 IntegerField()),
+            Value(0),
+        )
+
+    return queryset.annotate(
+        records_count=Coalesce(
+            F('summary__libraries_count') + F('summary__samples_count'),
+            Value(0), output_field=IntegerField(),
+        ),
+        records_depth=Coalesce(
+            F('summary__total_sequencing_depth'), Value(0),
+            output_field=FloatField(),
+        ),
+        records_new=count_status(0),
+        records_sequenced=count_status(6),
+    )
+
+
+class RequestViewSet(KeysetPaginationMixin, viewsets.ModelViewSet):
     serializer_class = RequestSerializer
     pagination_class = StandardResultsSetPagination
 
@@ -158,15 +210,10 @@ class RequestViewSet(viewsets.ModelViewSet):
                      'user__last_name',)
 
     def get_queryset(self,showAll=False):
-        libraries_qs = Library.objects.all().only('status', 'sequencing_depth')
-        samples_qs = Sample.objects.all().only('status', 'sequencing_depth')
-        #   print(libraries_qs.values())
-
-
-        queryset = Request.objects.select_related('user').prefetch_related(
-            Prefetch('libraries', queryset=libraries_qs),
-            Prefetch('samples', queryset=samples_qs),
-            'files',
+        # Record counts, depths and statuses are annotated from the request
+        # summaries, libraries and samples aren't fetched
+        queryset = annotate_records(
+            Request.objects.select_related('user').prefetch_related('files')
         ).order_by('-create_time')
 
         if not showAll:
@@ -188,7 +235,10 @@ class RequestViewSet(viewsets.ModelViewSet):
         return queryset
 
     def list(self, request):
-        """ Get the list of requests. """
+        """
+        Get the list of requests. If `cursor` is passed, the list is
+        paginated by (create_time, id), see `KeysetPagination`.
+        """
 
         showAll = False
         if request.GET.get('showAll') == 'True':
@@ -263,11 +313,6 @@ class RequestViewSet(viewsets.ModelViewSet):
         else:
             override = True
 
-        def checkifcomplete(element):
-            if element==5:
-                return True
-            else:
-                return False
 
 
         if override:
@@ -279,9 +324,8 @@ class RequestViewSet(viewsets.ModelViewSet):
             print("Override is false")
             #print(instance.statuses)
             #check if all libraries/samples related to this requested have been sequenced
-            statuses = [status for x in instance for status  in x.statuses]
-
-            complete = all([checkifcomplete(x) for x in statuses])
+            summary = RequestSummary.objects.filter(request_id=pk).first()
+            complete = summary is None or summary.is_complete
 
             if complete:
                 print("all statuses are complete")
@@ -305,20 +349,19 @@ class RequestViewSet(viewsets.ModelViewSet):
     @action(methods=['get'], detail=True)
     def get_records(self, request, pk=None):
         """ Get the list of record's submitted libraries and samples. """
-        libraries_qs = Library.objects.all().only(
-            'name',
-            'barcode',
+        records = merge_records(
+            Library.objects.filter(request__pk=pk).only(
+                'name',
+                'barcode',
+                'barcode_key',
+            ),
+            Sample.objects.filter(request__pk=pk).only(
+                'name',
+                'barcode',
+                'barcode_key',
+                'is_converted',
+            ),
         )
-        samples_qs = Sample.objects.all().only(
-            'name',
-            'barcode',
-            'is_converted',
-        )
-
-        instance = Request.objects.filter(pk=pk).prefetch_related(
-            Prefetch('libraries', queryset=libraries_qs),
-            Prefetch('samples', queryset=samples_qs),
-        ).only('libraries', 'samples').first()
 
         data = [{
             'pk': obj.pk,
@@ -327,9 +370,8 @@ class RequestViewSet(viewsets.ModelViewSet):
             'record_type': obj.__class__.__name__,
             'is_converted': True
             if hasattr(obj, 'is_converted') and obj.is_converted else False,
-        } for obj in instance.records]
+        } for obj in records]
 
-        data = sorted(data, key=lambda x: x['barcode'][3:])
         return Response(data)
 
     @action(methods=['get'], detail=True)
@@ -343,17 +385,31 @@ class RequestViewSet(viewsets.ModelViewSet):
     @action(methods=['post'], detail=False,
             authentication_classes=[CsrfExemptSessionAuthentication])
     def upload_files(self, request):
+        """
+        Attach files, uploaded in the request itself or, if `upload_ids`
+        is given, by chunks to `/api/file_uploads/`.
+        """
         file_ids = []
 
-        if not any(request.FILES):
+        try:
+            uploads = get_complete_uploads(
+                request, json.loads(request.data.get('upload_ids', '[]')))
+        except ValueError as e:
+            return JsonResponse({'success': False, 'message': str(e)},
+                                status=400)
+
+        if not any(request.FILES) and not uploads:
             return JsonResponse({
                 'success': False,
                 'message': 'No files provided.'
             }, status=400)
 
         for file in request.FILES.getlist('files'):
-            f = FileRequest(name=file.name, file=file)
-            f.save()
+            f = FileRequest.create_from_file(file.name, file)
+            file_ids.append(f.id)
+
+        for upload in uploads:
+            f = FileRequest.create_from_upload(upload)
             file_ids.append(f.id)
 
         return JsonResponse({'success': True, 'fileIds': file_ids})
@@ -365,12 +421,12 @@ class RequestViewSet(viewsets.ModelViewSet):
         data = []
 
         try:
-            files = [f for f in FileRequest.objects.all() if f.id in file_ids]
+            files = FileRequest.objects.filter(pk__in=file_ids)
             data = [
                 {
                     'id': file.id,
                     'name': file.name,
-                    'size': file.file.size,
+                    'size': file.file_size,
                     'path': settings.MEDIA_URL + file.file.name,
                 }
                 for file in files
@@ -408,17 +464,16 @@ class RequestViewSet(viewsets.ModelViewSet):
         user = instance.user
         organization = user.organization.name if user.organization else ''
         cost_unit = instance.cost_unit.name if instance.cost_unit else ''
-        objects = list(itertools.chain(
+        objects = merge_records(
             instance.samples.all(),
             instance.libraries.all(),
-        ))
+        )
         records = [{
             'name': obj.name,
             'type': obj.__class__.__name__,
             'barcode': obj.barcode,
             'depth': obj.sequencing_depth,
         } for obj in objects]
-        records = sorted(records, key=lambda x: x['barcode'][3:])
 
         pdf = PDF('Deep Sequencing Request')
         pdf.set_draw_color(217, 217, 217)
@@ -497,14 +552,25 @@ class RequestViewSet(viewsets.ModelViewSet):
         change request's libraries' and samples' statuses to 1.
         """
         instance = self.get_object()
+        upload_id = request.data.get('upload_id', None)
 
-        if not any(request.FILES):
+        if upload_id:
+            try:
+                upload, = get_complete_uploads(request, [upload_id])
+            except ValueError as e:
+                return JsonResponse({'success': False, 'message': str(e)},
+                                    status=400)
+            upload.move_to(instance, 'deep_seq_request')
+
+        elif any(request.FILES):
+            instance.deep_seq_request = request.FILES.get('file')
+
+        else:
             return JsonResponse({
                 'success': False,
                 'message': 'File is missing.'
             }, status=400)
 
-        instance.deep_seq_request = request.FILES.get('file')
         instance.save()
 
         file_name = instance.deep_seq_request.name.split('/')[-1]
@@ -512,6 +578,7 @@ class RequestViewSet(viewsets.ModelViewSet):
 
         instance.libraries.all().update(status=1)
         instance.samples.all().update(status=1)
+        RequestSummary.refresh([instance.pk])
 
         return JsonResponse({
              'success': True,
@@ -538,9 +605,10 @@ class RequestViewSet(viewsets.ModelViewSet):
                 raise ValueError('Email subject and/or message is missing.')
 
             if include_failed_records:
-                records = list(instance.libraries.filter(status=-1)) + \
-                    list(instance.samples.filter(status=-1))
-                records = sorted(records, key=lambda x: x.barcode[3:])
+                records = merge_records(
+                    instance.libraries.filter(status=-1),
+                    instance.samples.filter(status=-1),
+                )
 
             send_mail(
                 subject=subject,
@@ -562,269 +630,18 @@ class RequestViewSet(viewsets.ModelViewSet):
         return JsonResponse({'success': not error, 'error': error})
 
     @action(methods=['get'], detail=True)
+    @exportable
     def download_complete_report(self, request, pk=None):
-        def add_table(document, header, data, contains_comments = True):
-
-            if contains_comments:
-
-                # Create table
-                #table = document.add_table(rows=1, cols=len(header))
-                table = document.add_table(rows=1, cols=len(header)-1)
-                hdr_cells = table.rows[0].cells
-                #for i, h in enumerate(header):
-                for i, h in enumerate(header[:-1]):
-                    hdr_cells[i].text = h
-                for row in data:
-                    row_cells = table.add_row().cells
-                    #for i, value in enumerate(row):
-                    for i, value in enumerate(row[:-1]):
-                        row_cells[i].text = str(value)
-                    #add comment row
-                    comment_cells = table.add_row().cells
-                    comment_cells[0].merge(comment_cells[-1])
-                    comment_cells[0].text = "Comments: " + str(row[-1])
-
-
-                # Change font size for all cells
-                for row in table.rows:
-                    row.height = Cm(0.7)
-                    for cell in row.cells:
-                        paragraphs = cell.paragraphs
-                        for paragraph in paragraphs:
-                            for run in paragraph.runs:
-                                font = run.font
-                                font.size = Pt(9)
-            else:
-                # Create table
-                table = document.add_table(rows=1, cols=len(header))
-                hdr_cells = table.rows[0].cells
-                for i, h in enumerate(header):
-
-                    hdr_cells[i].text = h
-                for row in data:
-                    row_cells = table.add_row().cells
-                    # for i, value in enumerate(row):
-                    for i, value in enumerate(row[:-1]):
-                        row_cells[i].text = str(value)
-
-
-                # Change font size for all cells
-                for row in table.rows:
-                    row.height = Cm(0.7)
-                    for cell in row.cells:
-                        paragraphs = cell.paragraphs
-                        for paragraph in paragraphs:
-                            for run in paragraph.runs:
-                                font = run.font
-                                font.size = Pt(9)
-
+        """ Download the QC complete report of a request as a DOCX file. """
+        instance = self.get_object()
 
         f_name = 'QC Complete Report.docx'
-        response = HttpResponse(content_type='application/vnd.openxmlformats' +
-                                '-officedocument.wordprocessingml.document')
+        response = HttpResponse(
+            CompleteReport(instance).render(),
+            content_type='application/vnd.openxmlformats' +
+                         '-officedocument.wordprocessingml.document',
+        )
         response['Content-Disposition'] = f'attachment; filename="{f_name}"'
-
-        instance = self.get_object()
-        records = sorted(list(itertools.chain(
-            instance.libraries.all(),
-            instance.samples.all(),
-        )), key=lambda x: x.barcode[3:])
-
-        # Create DOCX document and set default font family
-        doc = Document()
-        font = doc.styles['Normal'].font
-        font.name = 'Arial'
-
-        # Page 1
-        doc.add_heading('Complete Report', 0)
-        p = doc.add_paragraph('')
-        p.add_run('Date, Request ID').bold = True
-
-        doc.add_paragraph('')
-
-        p = doc.add_paragraph('')
-        p.add_run('Table of Contents').bold = True
-        doc.add_paragraph('Summary')
-        doc.add_paragraph('Quality Control of received samples')
-        doc.add_paragraph('Library Construction')
-        doc.add_paragraph('Cluster Generation and Sequencing')
-        doc.add_paragraph('Acknowledgements')
-        doc.add_paragraph('Appendix')
-        doc.add_page_break()
-
-        # Page 2
-        doc.add_heading('General Summary of Workflow', 1)
-        doc.add_paragraph()
-        doc.add_paragraph('Submitted samples or libraries undergo an ' +
-                          'incoming quality control using appropriate ' +
-                          'analytical instruments (Fluorometer, Capillary ' +
-                          'Electrophoresis, qPCR etc). All samples that ' +
-                          'pass international quality standards are ' +
-                          'subjected to appropriate library preparation ' +
-                          'methods. Qualified libraries are pooled for ' +
-                          'multiplex sequencing. An Index Generator ' +
-                          'Software assures suitable index design. Pooled ' +
-                          'libraries are sequenced to reach desired ' +
-                          'depth/coverage using installed sequencing ' +
-                          'instruments. Immediately after the sequencing ' +
-                          'run bcl to fastq conversion and demultiplexing ' +
-                          'is done and the user informed.')
-        doc.add_page_break()
-
-        # Page 3
-        doc.add_heading('Quality Control of received samples/libraries', 1)
-        doc.add_paragraph()
-        doc.add_paragraph('All documented measurements were conducted by ' +
-                          'the deep sequencing facility, MPI-IE Freiburg. ' +
-                          'Raw data and reports of fluorometric ' +
-                          'quantification (Qubit) and size distribution ' +
-                          'measurements (Fragment Analyzer) can be found as ' +
-                          'attachment to each request in Parkour ' +
-                          '(parkour.ie-freiburg.mpg.de).')
-        header = [
-            'Date',
-            'ID',
-            'Name',
-            'L/S',
-            'Nuc.Type',
-            'ng/µl',
-            'bp',
-            'Comments',
-        ]
-        data = []
-        for r in records:
-            rtype = r.__class__.__name__
-            row = [
-                r.create_time.strftime('%d.%m.%Y'),
-                r.barcode,
-                r.name,
-                rtype[0],
-                r.nucleic_acid_type.name if rtype == 'Sample' else '-',
-                r.concentration,
-                r.mean_fragment_size if rtype == 'Library' else '-',
-                r.comments
-            ]
-            data.append(row)
-        add_table(doc, header, data)
-        doc.add_page_break()
-
-        # Page 4
-        doc.add_heading('Library Construction', 1)
-        doc.add_paragraph()
-        doc.add_paragraph('Documentation is only possible if libraries were ' +
-                          'constructed in the deep sequencing facility, ' +
-                          'MPI-IE Freiburg. Raw data and reports of ' +
-                          'fluorometric quantification (Qubit) and size ' +
-                          'distribution measurements (Fragment Analyzer) ' +
-                          'can be found as attachment to each request in ' +
-                          'Parkour (parkour.ie-freiburg.mpg.de). Given ' +
-                          'Library Preparation Methods are detailed in the ' +
-                          'appendix.')
-        lib_prep_objects = LibraryPreparation.objects.filter(
-            sample__in=instance.samples.all())
-        header = [
-            'Date',
-            'ID',
-            'Name',
-            'Protocol',
-            'Index I7',
-            'Index I5',
-            'PCR',
-            'ng/µl',
-            'bp',
-            'nM',
-            'Comments',
-        ]
-        data = []
-        for r in lib_prep_objects:
-            row = [
-                r.create_time.strftime('%d.%m.%Y'),
-                r.sample.barcode,
-                r.sample.name,
-                r.sample.library_protocol.name,
-                r.sample.index_i7,
-                r.sample.index_i5,
-                r.pcr_cycles,
-                r.concentration_library,
-                r.mean_fragment_size,
-                r.nM,
-                r.comments
-            ]
-            data.append(row)
-        add_table(doc, header, data)
-        doc.add_page_break()
-
-        # Page 5
-        doc.add_heading('Cluster Generation and Sequencing', 1)
-        doc.add_paragraph()
-        header = [
-            'Date',
-            'ID',
-            'Name',
-            'Pool ID',
-            'Flowcell ID',
-            'Sequencer',
-            'Depth (M)',
-            '% Confident off species reads',
-        ]
-        data = []
-        try:
-            flowcell = instance.flowcell.get()
-        except Exception:
-            flowcell = None
-        if flowcell:
-            pool_ids = ', '.join(sorted(set(
-                flowcell.lanes.values_list('pool__name', flat=True))))
-            sequences = flowcell.sequences if flowcell.sequences else []
-            conf_reads = {
-                s['barcode']: s.get('confident_reads', '')
-                for s in sequences
-            }
-            for r in records:
-                row = [
-                    flowcell.create_time.strftime('%d.%m.%Y'),
-                    r.barcode,
-                    r.name,
-                    pool_ids,
-                    flowcell.flowcell_id,
-                    flowcell.sequencer.name,
-                    r.sequencing_depth,
-                    conf_reads.get(r.barcode, ''),
-                ]
-                data.append(row)
-        add_table(doc, header, data, contains_comments=False)
-        doc.add_page_break()
-
-        # Page 6
-        doc.add_heading('Acknowledgements', 1)
-        doc.add_paragraph()
-        doc.add_paragraph('If data produced in the Deep Sequencing Facility ' +
-                          'at MPI-IE, Freiburg is published, include an ' +
-                          'acknowledgement in your paper. Also, review if ' +
-                          'contributions are substantial and should lead to ' +
-                          'an authorship of staff of the facility. ')
-        doc.add_paragraph()
-        doc.add_paragraph('Additionally, let us know of any publications ' +
-                          'involving the facility. Tracking citations and ' +
-                          'publications demonstrate the usefulness of the ' +
-                          'facility as a research resource which is needed ' +
-                          'to obtain further funding.')
-        doc.add_paragraph()
-        doc.add_paragraph('Example acknowledgement')
-        doc.add_paragraph()
-        doc.add_paragraph('We thank the Deep Sequencing Facility @ MPI-IE ' +
-                          'Freiburg, for performance of quality controls, ' +
-                          'library construction and Illumina sequencing.')
-        doc.add_page_break()
-
-        # Page 7
-        doc.add_heading('Appendix', 1)
-        doc.add_paragraph()
-        doc.add_paragraph('Detailed list of different library preparation ' +
-                          'protocols, sequencing devices and installed ' +
-                          'software')
-
-        doc.save(response)
         return response
 
     def _get_post_data(self, request):
@@ -836,3 +653,85 @@ class RequestViewSet(viewsets.ModelViewSet):
         else:
             post_data = json.loads(request.data.get('data', '{}'))
         return post_data
+
+
+class FileUploadViewSet(viewsets.ViewSet):
+    """
+    Upload files in chunks. An upload is created with the file's `name`
+    and `size`, then the chunks are sent as PUT bodies with their
+    `offset`. If a chunk fails, the upload is resumed from the offset it
+    returns. Complete uploads are attached by their ids.
+    """
+    authentication_classes = [CsrfExemptSessionAuthentication]
+
+    def get_queryset(self):
+        return FileUpload.objects.filter(user=self.request.user)
+
+    def create(self, request):
+        name = request.data.get('name', '')
+        try:
+            size = int(request.data.get('size', None))
+            if not name or size <= 0:
+                raise ValueError
+        except (TypeError, ValueError):
+            return Response({
+                'success': False,
+                'message': 'Invalid file name or size.',
+            }, 400)
+
+        upload = FileUpload(user=request.user, name=name, size=size)
+        upload.save()
+        return Response(self._get_data(upload), 201)
+
+    def retrieve(self, request, pk=None):
+        upload = get_object_or_404(self.get_queryset(), pk=pk)
+        return Response(self._get_data(upload))
+
+    def update(self, request, pk=None):
+        """ Append the chunk in the request body at `offset`. """
+        with transaction.atomic():
+            upload = get_object_or_404(
+                self.get_queryset().select_for_update(), pk=pk)
+
+            try:
+                offset = int(request.query_params.get('offset', None))
+            except (TypeError, ValueError):
+                offset = None
+
+            if offset != upload.offset:
+                return Response({
+                    **self._get_data(upload),
+                    'success': False,
+                    'message': 'Invalid offset.',
+                }, 409)
+
+            if upload.is_complete:
+                return Response({
+                    **self._get_data(upload),
+                    'success': False,
+                    'message': 'The upload is already complete.',
+                }, 400)
+
+            try:
+                upload.append(request.stream or io.BytesIO())
+            except ValueError as e:
+                return Response({'success': False, 'message': str(e)}, 400)
+
+        return Response(self._get_data(upload))
+
+    def destroy(self, request, pk=None):
+        upload = get_object_or_404(self.get_queryset(), pk=pk)
+        upload.delete()
+        return Response({'success': True})
+
+    @staticmethod
+    def _get_data(upload):
+        return {
+            'success': True,
+            'id': upload.pk,
+            'name': upload.name,
+            'size': upload.size,
+            'offset': upload.offset,
+            'complete': upload.is_complete,
+            'sha256': upload.sha256,
+        }
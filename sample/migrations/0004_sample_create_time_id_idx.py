@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 12:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sample', '0003_auto_20200227_1634'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='sample',
+            index=models.Index(fields=['create_time', 'id'], name='sample_create_time_id_idx'),
+        ),
+    ]
@@ -50,6 +50,12 @@ class Sample(GenericLibrarySample):
     class Meta:
         verbose_name = 'Sample'
         verbose_name_plural = 'Samples'
+        indexes = [
+            models.Index(
+                fields=['create_time', 'id'],
+                name='sample_create_time_id_idx',
+            ),
+        ]
 
     # def save(self, *args, **kwargs):
     #     # prev_obj = type(self).objects.get(pk=self.pk) if self.pk else None
@@ -175,7 +175,7 @@ class TestSamples(BaseTestCase):
             'request_id': request.pk,
             'ids': json.dumps([sample1.pk, sample2.pk])
         })
-        data = response.json()
+        data = self.get_json(response)
         self.assertEqual(response.status_code, 200)
         self.assertTrue(data['success'])
         samples = [x['name'] for x in data['data']]
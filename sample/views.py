@@ -20,3 +20,6 @@ class NucleicAcidTypeViewSet(viewsets.ReadOnlyModelViewSet):
 
 class SampleViewSet(LibrarySampleBaseViewSet):
     serializer_class = SampleSerializer
+    list_select_related = LibrarySampleBaseViewSet.list_select_related + (
+        'nucleic_acid_type',
+    )
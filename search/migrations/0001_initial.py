@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 12:00
+from __future__ import unicode_literals
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+
+# The document of an entry is calculated on every insert/update
+DOCUMENT_SQL = '''
+CREATE FUNCTION search_entry_document() RETURNS trigger AS $$
+BEGIN
+    NEW.document :=
+        setweight(to_tsvector('simple', NEW.name), 'A') ||
+        setweight(to_tsvector('simple', NEW.barcode), 'A') ||
+        setweight(to_tsvector('simple', NEW.request_name), 'B') ||
+        setweight(to_tsvector('simple', NEW.user_name), 'B') ||
+        setweight(to_tsvector('simple', NEW.description), 'C');
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER search_entry_document
+    BEFORE INSERT OR UPDATE ON search_searchentry
+    FOR EACH ROW EXECUTE PROCEDURE search_entry_document();
+'''
+
+# Indices for substring search (`icontains`) of names and barcodes
+TRIGRAM_INDICES_SQL = '''
+CREATE INDEX search_entry_name_trgm_idx
+    ON search_searchentry USING gin (UPPER(name) gin_trgm_ops);
+CREATE INDEX search_entry_barcode_trgm_idx
+    ON search_searchentry USING gin (UPPER(barcode) gin_trgm_ops);
+'''
+
+# Upsert the entry of a request (and update its libraries and samples) or
+# of a library or a sample from their tables
+REFRESH_SQL = '''
+CREATE FUNCTION search_refresh_request(request_pk integer) RETURNS void AS $$
+BEGIN
+    INSERT INTO search_searchentry (
+        record_type, record_id, name, barcode, description, request_id,
+        request_name, user_id, user_name
+    )
+    SELECT 'Request', r.id, r.name, '', r.description, r.id, r.name, u.id,
+        concat_ws(' ', u.first_name, u.last_name)
+    FROM request_request AS r
+    LEFT JOIN auth_user AS u ON r.user_id = u.id
+    WHERE r.id = request_pk
+    ON CONFLICT (record_type, record_id) DO UPDATE SET
+        name = EXCLUDED.name,
+        description = EXCLUDED.description,
+        request_name = EXCLUDED.request_name,
+        user_id = EXCLUDED.user_id,
+        user_name = EXCLUDED.user_name;
+
+    -- Libraries and samples of the request
+    UPDATE search_searchentry AS e SET
+        request_name = r.request_name,
+        user_id = r.user_id,
+        user_name = r.user_name
+    FROM search_searchentry AS r
+    WHERE r.record_type = 'Request'
+        AND r.record_id = request_pk
+        AND e.request_id = r.record_id
+        AND e.record_type <> 'Request';
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION search_refresh_record(record_type text, record_id integer)
+RETURNS void AS $$
+DECLARE
+    table_name text := lower(record_type);
+    table_name_plural text := CASE record_type
+        WHEN 'Library' THEN 'libraries' ELSE 'samples' END;
+BEGIN
+    EXECUTE format('
+        INSERT INTO search_searchentry (
+            record_type, record_id, name, barcode, description,
+            request_id, request_name, user_id, user_name
+        )
+        SELECT %1$L, record.id, record.name, coalesce(record.barcode, %4$L),
+            %4$L, r.id, coalesce(r.name, %4$L), u.id,
+            coalesce(concat_ws(%5$L, u.first_name, u.last_name), %4$L)
+        FROM %2$I AS record
+        LEFT JOIN %3$I AS rs ON record.id = rs.%6$I
+        LEFT JOIN request_request AS r ON rs.request_id = r.id
+        LEFT JOIN auth_user AS u ON r.user_id = u.id
+        WHERE record.id = $1
+        LIMIT 1
+        ON CONFLICT (record_type, record_id) DO UPDATE SET
+            name = EXCLUDED.name,
+            barcode = EXCLUDED.barcode,
+            request_id = EXCLUDED.request_id,
+            request_name = EXCLUDED.request_name,
+            user_id = EXCLUDED.user_id,
+            user_name = EXCLUDED.user_name',
+        record_type,
+        table_name || '_' || table_name,
+        'request_request_' || table_name_plural,
+        '',
+        ' ',
+        table_name || '_id'
+    ) USING record_id;
+END;
+$$ LANGUAGE plpgsql;
+'''
+
+TRIGGERS_SQL = '''
+CREATE FUNCTION search_request_changed() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        DELETE FROM search_searchentry
+        WHERE record_type = 'Request' AND record_id = OLD.id;
+        RETURN OLD;
+    END IF;
+    PERFORM search_refresh_request(NEW.id);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER search_request_created_or_deleted
+    AFTER INSERT OR DELETE ON request_request
+    FOR EACH ROW EXECUTE PROCEDURE search_request_changed();
+
+CREATE TRIGGER search_request_changed
+    AFTER UPDATE OF name, description, user_id ON request_request
+    FOR EACH ROW
+    WHEN (OLD.name IS DISTINCT FROM NEW.name OR
+          OLD.description IS DISTINCT FROM NEW.description OR
+          OLD.user_id IS DISTINCT FROM NEW.user_id)
+    EXECUTE PROCEDURE search_request_changed();
+
+-- TG_ARGV[0]: record type
+CREATE FUNCTION search_record_changed() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        DELETE FROM search_searchentry
+        WHERE record_type = TG_ARGV[0] AND record_id = OLD.id;
+        RETURN OLD;
+    END IF;
+    PERFORM search_refresh_record(TG_ARGV[0], NEW.id);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER search_library_created_or_deleted
+    AFTER INSERT OR DELETE ON library_library
+    FOR EACH ROW EXECUTE PROCEDURE search_record_changed('Library');
+
+CREATE TRIGGER search_library_changed
+    AFTER UPDATE OF name, barcode ON library_library
+    FOR EACH ROW
+    WHEN (OLD.name IS DISTINCT FROM NEW.name OR
+          OLD.barcode IS DISTINCT FROM NEW.barcode)
+    EXECUTE PROCEDURE search_record_changed('Library');
+
+CREATE TRIGGER search_sample_created_or_deleted
+    AFTER INSERT OR DELETE ON sample_sample
+    FOR EACH ROW EXECUTE PROCEDURE search_record_changed('Sample');
+
+CREATE TRIGGER search_sample_changed
+    AFTER UPDATE OF name, barcode ON sample_sample
+    FOR EACH ROW
+    WHEN (OLD.name IS DISTINCT FROM NEW.name OR
+          OLD.barcode IS DISTINCT FROM NEW.barcode)
+    EXECUTE PROCEDURE search_record_changed('Sample');
+
+-- TG_ARGV[0]: record type, TG_ARGV[1]: record id column
+CREATE FUNCTION search_request_records_changed() RETURNS trigger AS $$
+DECLARE
+    link jsonb;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        link := to_jsonb(OLD);
+    ELSE
+        link := to_jsonb(NEW);
+    END IF;
+    PERFORM search_refresh_record(
+        TG_ARGV[0], (link ->> TG_ARGV[1])::integer);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER search_request_libraries_changed
+    AFTER INSERT OR DELETE ON request_request_libraries
+    FOR EACH ROW EXECUTE PROCEDURE
+        search_request_records_changed('Library', 'library_id');
+
+CREATE TRIGGER search_request_samples_changed
+    AFTER INSERT OR DELETE ON request_request_samples
+    FOR EACH ROW EXECUTE PROCEDURE
+        search_request_records_changed('Sample', 'sample_id');
+
+CREATE FUNCTION search_user_changed() RETURNS trigger AS $$
+BEGIN
+    UPDATE search_searchentry
+    SET user_name = concat_ws(' ', NEW.first_name, NEW.last_name)
+    WHERE user_id = NEW.id;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER search_user_changed
+    AFTER UPDATE OF first_name, last_name ON auth_user
+    FOR EACH ROW
+    WHEN (OLD.first_name IS DISTINCT FROM NEW.first_name OR
+          OLD.last_name IS DISTINCT FROM NEW.last_name)
+    EXECUTE PROCEDURE search_user_changed();
+'''
+
+POPULATE_SQL = '''
+SELECT search_refresh_request(id) FROM request_request;
+SELECT search_refresh_record('Library', id) FROM library_library;
+SELECT search_refresh_record('Sample', id) FROM sample_sample;
+'''
+
+DROP_SQL = '''
+DROP TRIGGER IF EXISTS search_user_changed ON auth_user;
+DROP TRIGGER IF EXISTS search_request_samples_changed
+    ON request_request_samples;
+DROP TRIGGER IF EXISTS search_request_libraries_changed
+    ON request_request_libraries;
+DROP TRIGGER IF EXISTS search_sample_changed ON sample_sample;
+DROP TRIGGER IF EXISTS search_sample_created_or_deleted ON sample_sample;
+DROP TRIGGER IF EXISTS search_library_changed ON library_library;
+DROP TRIGGER IF EXISTS search_library_created_or_deleted
+    ON library_library;
+DROP TRIGGER IF EXISTS search_request_changed ON request_request;
+DROP TRIGGER IF EXISTS search_request_created_or_deleted
+    ON request_request;
+DROP FUNCTION IF EXISTS search_user_changed();
+DROP FUNCTION IF EXISTS search_request_records_changed();
+DROP FUNCTION IF EXISTS search_record_changed();
+DROP FUNCTION IF EXISTS search_request_changed();
+DROP FUNCTION IF EXISTS search_refresh_record(text, integer);
+DROP FUNCTION IF EXISTS search_refresh_request(integer);
+'''
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('common', '0001_initial'),
+        ('request', '0003_request_create_time_id_idx'),
+        ('library', '0003_library_create_time_id_idx'),
+        ('sample', '0004_sample_create_time_id_idx'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.CreateModel(
+            name='SearchEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('record_type', models.CharField(choices=[('Request', 'Request'), ('Library', 'Library'), ('Sample', 'Sample')], max_length=10, verbose_name='Record Type')),
+                ('record_id', models.IntegerField(verbose_name='Record Id')),
+                ('name', models.TextField(blank=True, verbose_name='Name')),
+                ('barcode', models.TextField(blank=True, verbose_name='Barcode')),
+                ('description', models.TextField(blank=True, verbose_name='Description')),
+                ('request_id', models.IntegerField(blank=True, db_index=True, null=True, verbose_name='Request Id')),
+                ('request_name', models.TextField(blank=True, verbose_name='Request Name')),
+                ('user_id', models.IntegerField(blank=True, db_index=True, null=True, verbose_name='User Id')),
+                ('user_name', models.TextField(blank=True, verbose_name='User Name')),
+                ('document', django.contrib.postgres.search.SearchVectorField(null=True, verbose_name='Document')),
+            ],
+            options={
+                'verbose_name': 'Search Entry',
+                'verbose_name_plural': 'Search Entries',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='searchentry',
+            unique_together=set([('record_type', 'record_id')]),
+        ),
+        migrations.AddIndex(
+            model_name='searchentry',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['document'], name='search_entry_document_idx'),
+        ),
+        migrations.RunSQL(
+            TRIGRAM_INDICES_SQL,
+            'DROP INDEX search_entry_barcode_trgm_idx; '
+            'DROP INDEX search_entry_name_trgm_idx;',
+        ),
+        migrations.RunSQL(
+            DOCUMENT_SQL,
+            'DROP TRIGGER search_entry_document ON search_searchentry; '
+            'DROP FUNCTION search_entry_document();',
+        ),
+        migrations.RunSQL(REFRESH_SQL + TRIGGERS_SQL, DROP_SQL),
+        migrations.RunSQL(POPULATE_SQL, migrations.RunSQL.noop),
+    ]
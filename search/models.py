@@ -0,0 +1,83 @@
+from django.db import models
+from django.db.models import F, Q
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVectorField,
+    TrigramSimilarity,
+)
+
+# Text search configuration of the documents. Names and barcodes aren't
+# natural language, so the words aren't stemmed.
+SEARCH_CONFIG = 'simple'
+
+
+class SearchEntry(models.Model):
+    """
+    A searchable request, library or sample. The entries (and their
+    documents) are maintained by database triggers, see the migrations.
+    """
+    RECORD_TYPE_CHOICES = (
+        ('Request', 'Request'),
+        ('Library', 'Library'),
+        ('Sample', 'Sample'),
+    )
+
+    record_type = models.CharField(
+        'Record Type', max_length=10, choices=RECORD_TYPE_CHOICES)
+    record_id = models.IntegerField('Record Id')
+
+    name = models.TextField('Name', blank=True)
+    barcode = models.TextField('Barcode', blank=True)
+    description = models.TextField('Description', blank=True)
+
+    # The request of a library or a sample (or the request itself)
+    request_id = models.IntegerField(
+        'Request Id', null=True, blank=True, db_index=True)
+    request_name = models.TextField('Request Name', blank=True)
+
+    user_id = models.IntegerField(
+        'User Id', null=True, blank=True, db_index=True)
+    user_name = models.TextField('User Name', blank=True)
+
+    document = SearchVectorField('Document', null=True)
+
+    class Meta:
+        verbose_name = 'Search Entry'
+        verbose_name_plural = 'Search Entries'
+        unique_together = ('record_type', 'record_id')
+        indexes = [
+            GinIndex(fields=['document'], name='search_entry_document_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.record_type} {self.name}'
+
+    @classmethod
+    def search(cls, query, user=None, record_types=None):
+        """
+        Find the entries matching a query, the best matches first. Whole
+        words are matched against the documents, parts of names and
+        barcodes against the trigram indices. If a user is given, only
+        their records are returned.
+        """
+        search_query = SearchQuery(query, config=SEARCH_CONFIG)
+
+        queryset = cls.objects.filter(
+            Q(document=search_query) |
+            Q(name__icontains=query) |
+            Q(barcode__icontains=query)
+        )
+
+        if user is not None:
+            queryset = queryset.filter(user_id=user.pk)
+
+        if record_types:
+            queryset = queryset.filter(record_type__in=record_types)
+
+        return queryset.annotate(
+            rank=SearchRank(F('document'), search_query) +
+            TrigramSimilarity('name', query) +
+            TrigramSimilarity('barcode', query),
+        ).order_by('-rank', 'record_type', '-record_id')
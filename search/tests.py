@@ -0,0 +1,108 @@
+import json
+
+from django.core.urlresolvers import reverse
+
+from common.tests import BaseTestCase
+from library.models import Library
+from library.tests import create_library
+from sample.tests import create_sample
+from request.tests import create_request
+
+from .models import SearchEntry
+
+
+class TestSearchEntries(BaseTestCase):
+    def setUp(self):
+        self.user = self.create_user()
+        self.request = create_request(self.user)
+        self.library = create_library(self._get_random_name())
+        self.sample = create_sample(self._get_random_name())
+        self.request.libraries.add(self.library)
+        self.request.samples.add(self.sample)
+
+    def test_entries_created(self):
+        entry = SearchEntry.objects.get(
+            record_type='Request', record_id=self.request.pk)
+        self.assertEqual(entry.name, self.request.name)
+        self.assertEqual(entry.user_id, self.user.pk)
+
+        entry = SearchEntry.objects.get(
+            record_type='Library', record_id=self.library.pk)
+        self.assertEqual(entry.request_id, self.request.pk)
+        self.assertEqual(entry.request_name, self.request.name)
+        self.assertEqual(entry.user_id, self.user.pk)
+
+    def test_entry_follows_record(self):
+        Library.objects.filter(pk=self.library.pk).update(
+            name='renamed', barcode='26L000123')
+        entry = SearchEntry.objects.get(
+            record_type='Library', record_id=self.library.pk)
+        self.assertEqual(entry.name, 'renamed')
+        self.assertEqual(entry.barcode, '26L000123')
+
+        self.request.samples.remove(self.sample)
+        entry = SearchEntry.objects.get(
+            record_type='Sample', record_id=self.sample.pk)
+        self.assertIsNone(entry.request_id)
+        self.assertIsNone(entry.user_id)
+
+    def test_entries_deleted(self):
+        self.request.delete()
+        self.assertFalse(SearchEntry.objects.exists())
+
+
+class TestSearchViewSet(BaseTestCase):
+    def setUp(self):
+        self.user = self.create_user()
+        self.login()
+
+        self.request = create_request(self.user)
+        self.library = create_library(self._get_random_name())
+        self.sample = create_sample(self._get_random_name())
+        self.request.libraries.add(self.library)
+        self.request.samples.add(self.sample)
+
+        Library.objects.filter(pk=self.library.pk).update(
+            barcode='26L000123')
+
+    def search(self, query, **kwargs):
+        response = self.client.get(
+            reverse('search-list'), {'query': query, **kwargs})
+        return response, json.loads(response.content)
+
+    def test_search_by_request_name(self):
+        response, data = self.search(self.request.name)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(data['success'])
+        self.assertEqual(data['results'][0]['record_type'], 'Request')
+        self.assertEqual(data['results'][0]['pk'], self.request.pk)
+
+    def test_search_by_barcode_part(self):
+        response, data = self.search('L000123')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(x['record_type'], x['pk']) for x in data['results']],
+            [('Library', self.library.pk)],
+        )
+        self.assertEqual(data['results'][0]['request_id'], self.request.pk)
+
+    def test_search_by_sample_name(self):
+        response, data = self.search(self.sample.name, types='Sample')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(x['record_type'], x['pk']) for x in data['results']],
+            [('Sample', self.sample.pk)],
+        )
+
+    def test_other_users_records(self):
+        self.create_user('foo@bar.io', 'foo-foo', False)
+        self.client.login(email='foo@bar.io', password='foo-foo')
+        response, data = self.search(self.sample.name)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['results'], [])
+
+    def test_query_too_short(self):
+        response, data = self.search('ab')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(data['success'])
+        self.assertEqual(data['message'], 'The search query is too short.')
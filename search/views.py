@@ -0,0 +1,61 @@
+from rest_framework import viewsets
+from rest_framework.response import Response
+
+from .models import SearchEntry
+
+# Shorter queries match (almost) everything and can't use trigram indices
+MIN_QUERY_LENGTH = 3
+
+DEFAULT_LIMIT = 25
+MAX_LIMIT = 100
+
+
+class SearchViewSet(viewsets.ViewSet):
+    """ Search requests, libraries and samples. """
+
+    def list(self, request):
+        """
+        Get the requests, libraries and samples matching `query`, ranked
+        by their name, barcode, description and user. The record types can
+        be restricted by `types` (e.g., `types=Library,Sample`).
+        """
+        query = request.query_params.get('query', '').strip()
+        if len(query) < MIN_QUERY_LENGTH:
+            return Response({
+                'success': False,
+                'message': 'The search query is too short.',
+            }, 400)
+
+        record_types = [
+            x.strip() for x in
+            request.query_params.get('types', '').split(',')
+            if x.strip()
+        ]
+
+        try:
+            limit = int(request.query_params.get('limit', DEFAULT_LIMIT))
+            if limit <= 0:
+                raise ValueError
+        except ValueError:
+            return Response({
+                'success': False,
+                'message': 'Invalid limit.',
+            }, 400)
+        limit = min(limit, MAX_LIMIT)
+
+        user = None if request.user.is_staff else request.user
+        entries = SearchEntry.search(query, user, record_types)[:limit]
+
+        return Response({
+            'success': True,
+            'results': [{
+                'record_type': entry.record_type,
+                'pk': entry.record_id,
+                'name': entry.name,
+                'barcode': entry.barcode,
+                'request_id': entry.request_id,
+                'request_name': entry.request_name,
+                'user': entry.user_name,
+                'rank': entry.rank,
+            } for entry in entries],
+        })
@@ -2,6 +2,8 @@ from django.apps import apps
 
 from rest_framework.serializers import ModelSerializer, SerializerMethodField
 
+from common.utils import get_barcode_key
+
 Flowcell = apps.get_model('flowcell', 'Flowcell')
 
 
@@ -123,4 +125,4 @@ class SequencesSerializer(ModelSerializer):
                 'reads_pf_requested': obj.get('reads_pf_requested', ''),
             }, **item})
 
-        return sorted(result, key=lambda x: x['barcode'][3:])
+        return sorted(result, key=lambda x: get_barcode_key(x['barcode']))
@@ -15,7 +15,13 @@ from rest_framework.permissions import IsAdminUser
 from xlwt import Workbook, XFStyle
 
 from common.utils import get_date_range
+from common.streaming import (
+    StreamingJSONResponse,
+    is_streaming_requested,
+    iterate_queryset,
+)
 from common.views import CsrfExemptSessionAuthentication
+from export.jobs import exportable
 
 from .serializers import RunsSerializer, SequencesSerializer
 
@@ -98,6 +104,13 @@ class RunStatisticsViewSet(viewsets.ReadOnlyModelViewSet):
             create_time__lte=end,
         )
 
+        if is_streaming_requested(request):
+            # Flowcells are fetched in chunks, each is serialized into rows
+            return StreamingJSONResponse(itertools.chain.from_iterable(
+                self.get_serializer(x).data
+                for x in iterate_queryset(queryset, 50)
+            ))
+
         serializer = self.get_serializer(queryset, many=True)
         data = list(itertools.chain(*serializer.data))
         return Response(data)
@@ -272,6 +285,7 @@ class SequencesStatisticsViewSet(viewsets.ReadOnlyModelViewSet):
 
     @action(methods=['post'], detail=False,
             authentication_classes=[CsrfExemptSessionAuthentication])
+    @exportable
     def download_report(self, request):
         barcodes = json.loads(request.data.get('barcodes', '[]'))
         barcodes_map = {b: True for b in barcodes}
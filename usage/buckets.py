@@ -0,0 +1,169 @@
+import datetime
+from collections import namedtuple
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from common.aggregation import count_records, sum_counts
+
+from .models import UsageBucket
+
+Request = apps.get_model('request', 'Request')
+Pool = apps.get_model('index_generator', 'Pool')
+
+# Record counts of one day. `date` is the datetime lookup which assigns
+# the records to days, `size` the number of group values kept (the rest
+# are only used for counting).
+Dimension = namedtuple('Dimension', [
+    'model', 'group_by', 'date', 'filters', 'distinct', 'size'])
+
+ON_FLOWCELLS = {'pool__lane__flowcell__isnull': False}
+
+DIMENSIONS = {
+    'records': Dimension(
+        Request, [], 'record__create_time', {}, False, None),
+
+    # By the creation of the requests
+    'organizations': Dimension(
+        Request, ['request__user__organization__name'],
+        'request__create_time', {}, False, None),
+    'principal_investigators': Dimension(
+        Request, ['request__user__pi__name'],
+        'request__create_time', {}, False, None),
+    'library_types': Dimension(
+        Request, ['record__library_type__name'],
+        'request__create_time', {}, False, None),
+
+    # By the creation of the records
+    'record_organizations': Dimension(
+        Request, ['request__user__organization__name'],
+        'record__create_time', {}, False, None),
+    'record_principal_investigators': Dimension(
+        Request, ['request__user__pi__name'],
+        'record__create_time', {}, False, None),
+    'record_protocols': Dimension(
+        Request, ['record__library_protocol__name'],
+        'record__create_time', {}, False, None),
+
+    # Every record is counted once per flowcell it has been loaded on.
+    # Records in pools whose requests have been deleted aren't assigned
+    # to PIs.
+    'sequencers': Dimension(
+        Pool,
+        ['pool__lane__flowcell__sequencer__name', 'pool__lane__flowcell'],
+        'record__create_time', ON_FLOWCELLS, True, 1),
+    'pi_sequencers': Dimension(
+        Pool,
+        [
+            'record__request__user__pi__name',
+            'pool__lane__flowcell__sequencer__name',
+            'pool__lane__flowcell',
+        ],
+        'record__create_time',
+        dict(ON_FLOWCELLS, record__request__isnull=False), True, 2),
+}
+
+
+def to_date(value):
+    if isinstance(value, datetime.datetime):
+        if timezone.is_aware(value):
+            value = timezone.localtime(value)
+        return value.date()
+    return value
+
+
+def compute_buckets(name, first, last):
+    """ Count the records of a dimension per day, from `first` to `last`. """
+    dimension = DIMENSIONS[name]
+    tz = timezone.get_current_timezone()
+
+    def start_of(day):
+        return timezone.make_aware(
+            datetime.datetime.combine(day, datetime.time.min), tz)
+
+    filters = dict(dimension.filters, **{
+        f'{dimension.date}__gte': start_of(first),
+        f'{dimension.date}__lt': start_of(
+            last + datetime.timedelta(days=1)),
+    })
+    counts = count_records(
+        dimension.model, dimension.group_by, filters, dimension.distinct,
+        by_date=dimension.date,
+    )
+    if dimension.size is not None:
+        counts = sum_counts(counts, dimension.size + 1)
+
+    buckets = {}
+    for key, count in counts.items():
+        buckets.setdefault(key[0], {})[key[1:]] = count
+    return buckets
+
+
+def get_counts(name, start, end):
+    """
+    Get the record counts of a dimension from the start to the end day
+    (inclusive), in the format of `count_records()`. They are summed from
+    daily buckets: the closed days are stored in the database, today is
+    always counted.
+    """
+    start, end = to_date(start), to_date(end)
+    today = timezone.localdate()
+
+    days = [
+        start + datetime.timedelta(days=i)
+        for i in range((end - start).days + 1)
+    ]
+    stored = {
+        x.date: x.get_counts()
+        for x in UsageBucket.objects.filter(
+            name=name, date__range=(start, min(end, today)))
+    }
+
+    buckets = []
+    missing = []
+    for day in days:
+        if day in stored and day < today:
+            buckets.append(stored[day])
+        else:
+            missing.append(day)
+
+    if missing:
+        computed = compute_buckets(name, missing[0], missing[-1])
+        new_buckets = {}
+        for day in missing:
+            bucket = computed.get(day, {})
+            buckets.append(bucket)
+            if day < today:
+                new_buckets[day] = bucket
+        UsageBucket.store(name, new_buckets)
+
+    return sum_counts(buckets)
+
+
+def _delete_buckets(queryset):
+    """
+    Delete buckets now and again after the commit, in case they have been
+    stored from the old data by another process in the meantime.
+    """
+    queryset.delete()
+    transaction.on_commit(queryset.delete)
+
+
+def invalidate_days(days):
+    """ Drop the stored buckets of the given days (dates or datetimes). """
+    days = {to_date(x) for x in days}
+    if days:
+        _delete_buckets(UsageBucket.objects.filter(date__in=days))
+
+
+def invalidate_all():
+    """ Drop all stored buckets, e.g. when a name has been changed. """
+    _delete_buckets(UsageBucket.objects.all())
+
+
+def get_days(queryset, lookup='create_time'):
+    """ Get the (local) dates of a datetime field of a queryset. """
+    return set(queryset.annotate(day=TruncDate(lookup)).values_list(
+        'day', flat=True).distinct().order_by())
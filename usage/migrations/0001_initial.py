@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 12:00
+from __future__ import unicode_literals
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UsageBucket',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, verbose_name='Name')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('counts', django.contrib.postgres.fields.jsonb.JSONField(default=list, verbose_name='Counts')),
+            ],
+            options={
+                'verbose_name': 'Usage Bucket',
+                'verbose_name_plural': 'Usage Buckets',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='usagebucket',
+            unique_together=set([('name', 'date')]),
+        ),
+    ]
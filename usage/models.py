@@ -0,0 +1,52 @@
+import json
+
+from django.db import models, connection
+from django.contrib.postgres.fields import JSONField
+
+
+class UsageBucket(models.Model):
+    """
+    The record counts of a usage dimension on one closed day, as a list
+    of [group values, libraries, samples] rows.
+    """
+    name = models.CharField('Name', max_length=50)
+    date = models.DateField('Date')
+    counts = JSONField('Counts', default=list)
+
+    class Meta:
+        verbose_name = 'Usage Bucket'
+        verbose_name_plural = 'Usage Buckets'
+        unique_together = ('name', 'date')
+
+    def __str__(self):
+        return f'{self.name} {self.date}'
+
+    @classmethod
+    def store(cls, name, buckets):
+        """
+        Insert the buckets of a dimension, given as a dict of dates and
+        counts. Buckets stored by another process in the meantime are kept.
+        """
+        if not buckets:
+            return
+
+        rows = [
+            (name, date, json.dumps([
+                [list(key), count['libraries'], count['samples']]
+                for key, count in counts.items()
+            ]))
+            for date, counts in buckets.items()
+        ]
+        with connection.cursor() as cursor:
+            cursor.executemany(f'''
+                INSERT INTO {cls._meta.db_table} (name, date, counts)
+                VALUES (%s, %s, %s::jsonb)
+                ON CONFLICT (name, date) DO NOTHING
+            ''', rows)
+
+    def get_counts(self):
+        """ The counts in the format of `count_records()`. """
+        return {
+            tuple(key): {'libraries': libraries, 'samples': samples}
+            for key, libraries, samples in self.counts
+        }
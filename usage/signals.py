@@ -0,0 +1,227 @@
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+
+from .buckets import invalidate_days, invalidate_all, get_days
+
+Organization = apps.get_model('common', 'Organization')
+PrincipalInvestigator = apps.get_model('common', 'PrincipalInvestigator')
+LibraryProtocol = apps.get_model('library_sample_shared', 'LibraryProtocol')
+LibraryType = apps.get_model('library_sample_shared', 'LibraryType')
+Library = apps.get_model('library', 'Library')
+Sample = apps.get_model('sample', 'Sample')
+Request = apps.get_model('request', 'Request')
+Pool = apps.get_model('index_generator', 'Pool')
+Sequencer = apps.get_model('flowcell', 'Sequencer')
+Flowcell = apps.get_model('flowcell', 'Flowcell')
+Lane = apps.get_model('flowcell', 'Lane')
+
+# Fields of records, requests and users which the usage is grouped by
+RECORD_FIELDS = {'library_protocol', 'library_type', 'create_time'}
+REQUEST_FIELDS = {'user', 'create_time'}
+USER_FIELDS = {'organization', 'pi'}
+
+REQUEST_RELATIONS = [Request.libraries.through, Request.samples.through]
+
+
+def is_changed(update_fields, fields):
+    return update_fields is None or bool(fields & set(update_fields))
+
+
+def get_record_days(record):
+    """ The days of a record and of its requests. """
+    return {record.create_time} | get_days(record.request.all())
+
+
+def get_request_days(request):
+    """ The days of a request and of its records. """
+    return {request.create_time} | \
+        get_days(request.libraries.all()) | \
+        get_days(request.samples.all())
+
+
+def get_pools_days(pools):
+    """ The days of the records in given pools. """
+    return get_days(Library.objects.filter(pool__in=pools)) | \
+        get_days(Sample.objects.filter(pool__in=pools))
+
+
+def get_flowcell_days(flowcell):
+    return get_pools_days(Pool.objects.filter(lane__flowcell=flowcell))
+
+
+def get_lane_days(lane, pools):
+    """ The days of the records in given pools, if a lane is loaded. """
+    if not lane.flowcell.exists():
+        return set()
+    return get_pools_days(pools)
+
+
+@receiver(post_save, sender=Library)
+@receiver(post_save, sender=Sample)
+def invalidate_record(sender, instance, created, update_fields, **kwargs):
+    """
+    When a library or a sample is changed, drop the buckets of its day
+    and of its requests' days. New records don't belong to any request.
+    """
+    if not created and is_changed(update_fields, RECORD_FIELDS):
+        invalidate_days(get_record_days(instance))
+
+
+@receiver(pre_delete, sender=Library)
+@receiver(pre_delete, sender=Sample)
+@receiver(pre_delete, sender=Request)
+@receiver(pre_delete, sender=Flowcell)
+@receiver(pre_delete, sender=Lane)
+def remember_days(sender, instance, **kwargs):
+    """ Remember the days of an object before its relations are gone. """
+    if sender is Request:
+        instance._usage_days = get_request_days(instance)
+    elif sender is Flowcell:
+        instance._usage_days = get_flowcell_days(instance)
+    elif sender is Lane:
+        instance._usage_days = get_lane_days(instance, [instance.pool_id])
+    else:
+        instance._usage_days = get_record_days(instance)
+
+
+@receiver(post_delete, sender=Library)
+@receiver(post_delete, sender=Sample)
+@receiver(post_delete, sender=Request)
+@receiver(post_delete, sender=Flowcell)
+@receiver(post_delete, sender=Lane)
+def invalidate_deleted(sender, instance, **kwargs):
+    invalidate_days(getattr(instance, '_usage_days', []))
+
+
+@receiver(post_save, sender=Request)
+def invalidate_request(sender, instance, created, update_fields, **kwargs):
+    """ When a request is changed, drop the buckets of its days. """
+    if not created and is_changed(update_fields, REQUEST_FIELDS):
+        invalidate_days(get_request_days(instance))
+
+
+def get_relation_days(sender, instance, reverse, model, pk_set):
+    """
+    The days of the records (and requests) whose relations are changed.
+    `pk_set` is None if all relations of `instance` are cleared.
+    """
+    is_request = sender in REQUEST_RELATIONS
+    related_name = 'request' if is_request else 'pool'
+
+    if not reverse:
+        records = model.objects.filter(**{related_name: instance}) \
+            if pk_set is None else model.objects.filter(pk__in=pk_set)
+        days = get_days(records)
+        if is_request:
+            days.add(instance.create_time)
+        return days
+
+    days = {instance.create_time}
+    if is_request:
+        requests = getattr(instance, related_name).all() \
+            if pk_set is None else model.objects.filter(pk__in=pk_set)
+        days |= get_days(requests)
+    return days
+
+
+@receiver(m2m_changed, sender=Request.libraries.through)
+@receiver(m2m_changed, sender=Request.samples.through)
+@receiver(m2m_changed, sender=Pool.libraries.through)
+@receiver(m2m_changed, sender=Pool.samples.through)
+def invalidate_relations(sender, instance, action, reverse, model, pk_set,
+                         **kwargs):
+    """
+    When libraries or samples are added to or removed from a request or
+    a pool, drop the buckets of the records' (and the requests') days.
+    """
+    if action == 'pre_clear':
+        # The removed objects are only known before the relations are gone
+        instance._usage_days = get_relation_days(
+            sender, instance, reverse, model, None)
+    elif action == 'post_clear':
+        invalidate_days(getattr(instance, '_usage_days', []))
+    elif action in ['post_add', 'post_remove']:
+        invalidate_days(get_relation_days(
+            sender, instance, reverse, model, pk_set or []))
+
+
+def get_lanes_days(instance, reverse, pk_set):
+    """ The days of the records in the pools of changed lanes. """
+    if reverse:
+        return get_pools_days([instance.pool_id])
+    lanes = instance.lanes.all() if pk_set is None else pk_set
+    return get_pools_days(Pool.objects.filter(lane__in=lanes))
+
+
+@receiver(m2m_changed, sender=Flowcell.lanes.through)
+def invalidate_flowcell_lanes(sender, instance, action, reverse, pk_set,
+                              **kwargs):
+    """
+    When lanes are added to or removed from a flowcell, drop the buckets
+    of the days of the records in their pools.
+    """
+    if action == 'pre_clear':
+        instance._usage_days = get_lanes_days(instance, reverse, None)
+    elif action == 'post_clear':
+        invalidate_days(getattr(instance, '_usage_days', []))
+    elif action in ['post_add', 'post_remove']:
+        invalidate_days(get_lanes_days(instance, reverse, pk_set or []))
+
+
+@receiver(post_save, sender=Flowcell)
+def invalidate_flowcell(sender, instance, created, update_fields,
+                        **kwargs):
+    """ When the sequencer of a flowcell is changed, drop its buckets. """
+    if not created and is_changed(update_fields, {'sequencer'}):
+        invalidate_days(get_flowcell_days(instance))
+
+
+@receiver(pre_save, sender=Lane)
+def remember_lane_days(sender, instance, update_fields, **kwargs):
+    """
+    When the pool of a loaded lane is changed, remember the days of the
+    records in the old and the new pool.
+    """
+    instance._usage_days = set()
+    if instance.pk is None or not is_changed(update_fields, {'pool'}):
+        return
+
+    old_pool_id = Lane.objects.filter(pk=instance.pk) \
+        .values_list('pool_id', flat=True).first()
+    if old_pool_id is not None and old_pool_id != instance.pool_id:
+        instance._usage_days = get_lane_days(
+            instance, [old_pool_id, instance.pool_id])
+
+
+@receiver(post_save, sender=Lane)
+def invalidate_lane(sender, instance, **kwargs):
+    invalidate_days(getattr(instance, '_usage_days', []))
+
+
+@receiver(post_save, sender=Organization)
+@receiver(post_save, sender=PrincipalInvestigator)
+@receiver(post_save, sender=LibraryProtocol)
+@receiver(post_save, sender=LibraryType)
+@receiver(post_save, sender=Sequencer)
+def invalidate_names(sender, created=False, **kwargs):
+    """
+    When a name used for grouping is changed, drop all buckets. New
+    objects aren't used by any record yet.
+    """
+    if not created:
+        invalidate_all()
+
+
+@receiver(post_save, sender=get_user_model())
+def invalidate_user(sender, instance, created, update_fields, **kwargs):
+    """ When the organization or the PI of a user is changed. """
+    if not created and is_changed(update_fields, USER_FIELDS):
+        invalidate_all()
@@ -1,3 +1,180 @@
-from django.test import TestCase
+import datetime
 
-# Create your tests here.
+from django.utils import timezone
+
+from common.models import Organization, PrincipalInvestigator
+from common.tests import BaseTestCase
+from common.utils import get_random_name
+from library.tests import create_library
+from library.models import Library
+from sample.tests import create_sample
+from index_generator.tests import create_pool
+from flowcell.tests import create_sequencer, create_lane, create_flowcell
+from request.tests import create_request
+from request.models import Request
+
+from .buckets import get_counts
+
+
+class UsageTest(BaseTestCase):
+    def setUp(self):
+        organization = Organization(name=get_random_name())
+        organization.save()
+        self.pi = PrincipalInvestigator(
+            name=get_random_name(), organization=organization)
+        self.pi.save()
+
+        self.user = self.create_user()
+        self.user.organization = organization
+        self.user.pi = self.pi
+        self.user.save()
+        self.login()
+
+        request = create_request(self.user)
+        request.libraries.add(
+            create_library(get_random_name()),
+            create_library(get_random_name()),
+        )
+        request.samples.add(create_sample(get_random_name()))
+
+        # Records without requests are not counted
+        create_library(get_random_name())
+
+        now = timezone.localtime(timezone.now())
+        self.params = {
+            'start': (now - datetime.timedelta(days=1)).strftime(
+                '%Y-%m-%dT%H:%M:%S'),
+            'end': (now + datetime.timedelta(days=1)).strftime(
+                '%Y-%m-%dT%H:%M:%S'),
+        }
+        self.organization = organization
+
+    def test_records(self):
+        response = self.client.get('/api/usage/records/', self.params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [
+            {'name': 'Libraries', 'data': 2},
+            {'name': 'Samples', 'data': 1},
+        ])
+
+    def test_organizations(self):
+        response = self.client.get('/api/usage/organizations/', self.params)
+        self.assertEqual(response.json(), [
+            {'name': self.organization.name, 'data': 3},
+        ])
+
+    def test_principal_investigators(self):
+        response = self.client.get(
+            '/api/usage/principal_investigators/', self.params)
+        self.assertEqual(response.json(), [{
+            'name': self.pi.name,
+            'data': 3,
+            'libraries': 2,
+            'samples': 1,
+        }])
+
+    def test_library_types(self):
+        response = self.client.get('/api/usage/library_types/', self.params)
+        self.assertEqual(response.json(), [{
+            'name': 'Library Type',
+            'data': 3,
+            'libraries': 2,
+            'samples': 1,
+        }])
+
+    def test_no_requests(self):
+        """ Ensure nothing is counted outside of the date range. """
+        start = timezone.localtime(timezone.now()) + datetime.timedelta(
+            days=2)
+        response = self.client.get('/api/usage/organizations/', {
+            'start': start.strftime('%Y-%m-%dT%H:%M:%S'),
+            'end': start.strftime('%Y-%m-%dT%H:%M:%S'),
+        })
+        self.assertEqual(response.json(), [])
+
+
+class UsageBucketsTest(BaseTestCase):
+    def setUp(self):
+        self.organization = Organization(name=get_random_name())
+        self.organization.save()
+        self.user = self.create_user()
+        self.user.organization = self.organization
+        self.user.save()
+
+        self.today = timezone.localdate()
+        self.day = self.today - datetime.timedelta(days=3)
+        self.request = create_request(self.user)
+        self.move(Request, self.request)
+        self.request.libraries.add(self.create_library())
+
+    def move(self, model, obj):
+        """ Move an object to a closed day, bypassing the signals. """
+        create_time = timezone.now() - datetime.timedelta(days=3)
+        model.objects.filter(pk=obj.pk).update(create_time=create_time)
+        obj.refresh_from_db()
+
+    def create_library(self):
+        library = create_library(get_random_name())
+        self.move(Library, library)
+        return library
+
+    def get_count(self, name, end=None):
+        counts = get_counts(
+            name, self.day, end or self.today - datetime.timedelta(days=1))
+        return sum(x['libraries'] for x in counts.values())
+
+    def test_closed_days_stored(self):
+        """ Ensure closed days are summed from the stored buckets. """
+        self.assertEqual(self.get_count('records'), 1)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get_count('records'), 1)
+
+        # Today is always counted
+        create_library(get_random_name())
+        self.request.libraries.add(create_library(get_random_name()))
+        with self.assertNumQueries(3):
+            self.assertEqual(self.get_count('records', self.today), 2)
+
+    def test_invalidate_relations(self):
+        """ Ensure the buckets of the changed records' days are dropped. """
+        self.assertEqual(self.get_count('records'), 1)
+        self.assertEqual(self.get_count('organizations'), 1)
+
+        self.request.libraries.add(self.create_library())
+        self.assertEqual(self.get_count('records'), 2)
+        self.assertEqual(self.get_count('organizations'), 2)
+
+        self.request.libraries.clear()
+        self.assertEqual(self.get_count('records'), 0)
+        self.assertEqual(self.get_count('organizations'), 0)
+
+    def test_invalidate_names(self):
+        """ Ensure all buckets are dropped when a group is renamed. """
+        counts = get_counts('organizations', self.day, self.day)
+        self.assertEqual(list(counts), [(self.organization.name,)])
+
+        self.organization.name = get_random_name()
+        self.organization.save()
+        counts = get_counts('organizations', self.day, self.day)
+        self.assertEqual(list(counts), [(self.organization.name,)])
+
+    def test_invalidate_lane_pool(self):
+        """ Ensure moving a loaded lane to another pool drops its days. """
+        library = self.request.libraries.get()
+        pool1 = create_pool(self.user)
+        pool1.libraries.add(library)
+        pool2 = create_pool(self.user)
+        lane = create_lane('Lane 1', pool2)
+        flowcell = create_flowcell(
+            get_random_name(), create_sequencer(get_random_name()))
+        flowcell.lanes.add(lane)
+        self.assertEqual(self.get_count('sequencers'), 0)
+
+        # Saving the lane with the same pool keeps the buckets
+        lane.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get_count('sequencers'), 0)
+
+        lane.pool = pool1
+        lane.save()
+        self.assertEqual(self.get_count('sequencers'), 1)
@@ -1,17 +1,10 @@
 from datetime import datetime
-from collections import Counter
-
-from django.apps import apps
-from django.db.models import Prefetch
 
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAdminUser
 
-Request = apps.get_model('request', 'Request')
-LibraryType = apps.get_model('library_sample_shared', 'LibraryType')
-Library = apps.get_model('library', 'Library')
-Sample = apps.get_model('sample', 'Sample')
+from .buckets import get_counts
 
 
 def get_date_range(request, format):
@@ -47,157 +40,56 @@ class RecordsUsage(APIView):
     def get(self, request):
         start, end = get_date_range(request, '%Y-%m-%dT%H:%M:%S')
 
-        libraries = Library.objects.filter(
-            request__isnull=False,
-            create_time__gte=start,
-            create_time__lte=end,
-        ).only('id')
-
-        samples = Sample.objects.filter(
-            request__isnull=False,
-            create_time__gte=start,
-            create_time__lte=end,
-        ).only('id')
+        count = get_counts('records', start, end).get(
+            (), {'libraries': 0, 'samples': 0})
 
         return Response([
             {
                 'name': 'Libraries',
-                'data': len(libraries),
+                'data': count['libraries'],
             },
             {
                 'name': 'Samples',
-                'data': len(samples),
+                'data': count['samples'],
             },
         ])
 
 
-class OrganizationsUsage(APIView):
-    permission_classes = (IsAdminUser,)
-
-    def get(self, request):
-        start, end = get_date_range(request, '%Y-%m-%dT%H:%M:%S')
+def count_request_records(request, name):
+    """ Count the records of the requests created in the date range. """
+    start, end = get_date_range(request, '%Y-%m-%dT%H:%M:%S')
+    counts = get_counts(name, start, end)
 
-        libraries_qs = Library.objects.only('id')
-        samples_qs = Sample.objects.only('id')
+    data = [{
+        'name': name,
+        'data': count['libraries'] + count['samples'],
+        'libraries': count['libraries'],
+        'samples': count['samples'],
+    } for (name,), count in counts.items()]
 
-        requests = Request.objects.select_related(
-            'user', 'user__organization',
-        ).prefetch_related(
-            Prefetch('libraries', queryset=libraries_qs,
-                     to_attr='fetched_libraries'),
-            Prefetch('samples', queryset=samples_qs,
-                     to_attr='fetched_samples'),
-        ).filter(create_time__gte=start, create_time__lte=end) \
-            .only('id', 'user', 'libraries', 'samples')
+    return sorted(data, key=lambda x: x['name'])
 
-        counts = {}
-        for req in requests:
-            organization = req.user.organization
-            org_name = organization.name if organization else 'None'
-            if org_name not in counts.keys():
-                counts[org_name] = {'libraries': 0, 'samples': 0}
-            counts[org_name]['libraries'] += len(req.fetched_libraries)
-            counts[org_name]['samples'] += len(req.fetched_samples)
 
-        data = [{
-            'name': organization,
-            'data': sum(count.values())
-        } for organization, count in counts.items()]
+class OrganizationsUsage(APIView):
+    permission_classes = (IsAdminUser,)
 
-        return Response(data)
+    def get(self, request):
+        data = count_request_records(request, 'organizations')
+        return Response([
+            {'name': x['name'], 'data': x['data']} for x in data
+        ])
 
 
 class PrincipalInvestigatorsUsage(APIView):
     permission_classes = (IsAdminUser,)
 
     def get(self, request):
-        start, end = get_date_range(request, '%Y-%m-%dT%H:%M:%S')
-
-        libraries_qs = Library.objects.only('id')
-        samples_qs = Sample.objects.only('id')
-
-        requests = Request.objects.select_related(
-            'user', 'user__pi',
-        ).prefetch_related(
-            Prefetch('libraries', queryset=libraries_qs,
-                     to_attr='fetched_libraries'),
-            Prefetch('samples', queryset=samples_qs,
-                     to_attr='fetched_samples'),
-        ).filter(create_time__gte=start, create_time__lte=end) \
-            .only('id', 'user__pi__name', 'libraries', 'samples')
-
-        counts = {}
-        for req in requests:
-            pi = req.user.pi
-            pi_name = pi.name if pi else 'None'
-            if pi_name not in counts.keys():
-                counts[pi_name] = {'libraries': 0, 'samples': 0}
-            counts[pi_name]['libraries'] += len(req.fetched_libraries)
-            counts[pi_name]['samples'] += len(req.fetched_samples)
-
-        data = [{
-            'name': pi,
-            'data': sum(count.values()),
-            'libraries': count['libraries'],
-            'samples': count['samples'],
-        } for pi, count in counts.items()]
-
-        data = sorted(data, key=lambda x: x['name'])
-        return Response(data)
+        return Response(count_request_records(
+            request, 'principal_investigators'))
 
 
 class LibraryTypesUsage(APIView):
     permission_classes = (IsAdminUser,)
 
     def get(self, request):
-        start, end = get_date_range(request, '%Y-%m-%dT%H:%M:%S')
-
-        libraries_qs = Library.objects.select_related(
-            'library_type').only('id', 'library_type__name')
-        samples_qs = Sample.objects.select_related(
-            'library_type').only('id', 'library_type__name')
-
-        requests = Request.objects.prefetch_related(
-            Prefetch('libraries', queryset=libraries_qs,
-                     to_attr='fetched_libraries'),
-            Prefetch('samples', queryset=samples_qs,
-                     to_attr='fetched_samples'),
-        ).filter(create_time__gte=start, create_time__lte=end) \
-            .only('id', 'libraries', 'samples')
-
-        counts = {}
-        for req in requests:
-            # Extract Library Types
-            library_types = [
-                x.library_type.name for x in req.fetched_libraries]
-            sample_types = [
-                x.library_type.name for x in req.fetched_samples]
-
-            # Merge the counts
-            library_cnt = {x[0]: {'libraries': x[1]}
-                           for x in Counter(library_types).items()}
-            sample_cnt = {x[0]: {'samples': x[1]}
-                          for x in Counter(sample_types).items()}
-            count = {
-                k: {
-                    **library_cnt.get(k, {'libraries': 0}),
-                    **sample_cnt.get(k, {'samples': 0}),
-                }
-                for k in library_cnt.keys() | sample_cnt.keys()
-            }
-
-            for k, v in count.items():
-                temp_dict = counts.get(k, {'libraries': 0, 'samples': 0})
-                temp_dict['libraries'] += v['libraries']
-                temp_dict['samples'] += v['samples']
-                counts[k] = temp_dict
-
-        data = [{
-            'name': library_type,
-            'data': sum(count.values()),
-            'libraries': count['libraries'],
-            'samples': count['samples'],
-        } for library_type, count in counts.items()]
-
-        data = sorted(data, key=lambda x: x['name'])
-        return Response(data)
+        return Response(count_request_records(request, 'library_types'))
@@ -1,7 +1,7 @@
 from rest_framework import routers
 
 from common.views import CostUnitsViewSet
-from request.views import RequestViewSet
+from request.views import RequestViewSet, FileUploadViewSet
 from library_sample_shared.views import (
     OrganismViewSet,
     IndexTypeViewSet,
@@ -16,7 +16,7 @@ from library_sample_shared.views import (
 from library.views import LibrarySampleTree, LibraryViewSet
 from sample.views import NucleicAcidTypeViewSet, SampleViewSet
 from incoming_libraries.views import IncomingLibrariesViewSet
-from index_generator.views import PoolSizeViewSet, IndexGeneratorViewSet,GeneratorIndexTypeViewSet
+from index_generator.views import PoolSizeViewSet, IndexGeneratorViewSet,GeneratorIndexTypeViewSet, IndexGeneratorJobViewSet
 from library_preparation.views import LibraryPreparationViewSet
 from pooling.views import PoolingViewSet
 from flowcell.views import (
@@ -34,11 +34,14 @@ from invoicing.views import (
 
 from stats.views import RunStatisticsViewSet, SequencesStatisticsViewSet
 from metadata_exporter.views import MetadataExporterViewSet
+from search.views import SearchViewSet
+from export.views import ExportJobViewSet
 
 
 router = routers.DefaultRouter()
 
 router.register(r'requests', RequestViewSet, basename='request')
+router.register(r'file_uploads', FileUploadViewSet, basename='file-uploads')
 router.register(r'cost_units', CostUnitsViewSet, basename='cost-units')
 router.register(r'organisms', OrganismViewSet, basename='organism')
 router.register(r'read_lengths', ReadLengthViewSet, basename='read-length')
@@ -60,6 +63,7 @@ router.register(r'samples', SampleViewSet, basename='samples')
 router.register(r'incoming_libraries', IncomingLibrariesViewSet, basename='incoming-libraries')
 
 router.register(r'index_generator', IndexGeneratorViewSet, basename='index-generator')
+router.register(r'index_generator_jobs', IndexGeneratorJobViewSet, basename='index-generator-jobs')
 
 router.register(r'library_preparation', LibraryPreparationViewSet, basename='library-preparation')
 
@@ -79,3 +83,6 @@ router.register(r'sequences_statistics', SequencesStatisticsViewSet, basename='s
 router.register(r'analysis_list', FlowcellAnalysisViewSet, basename='analysis_list')
 
 router.register(r'metadata_exporter', MetadataExporterViewSet, basename='metadata_exporter')
+
+router.register(r'search', SearchViewSet, basename='search')
+router.register(r'export_jobs', ExportJobViewSet, basename='export-jobs')
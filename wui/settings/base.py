@@ -54,7 +54,9 @@ INSTALLED_APPS = [
     'invoicing',
     'usage',
     'stats',
-    'metadata_exporter'
+    'metadata_exporter',
+    'search',
+    'export',
 ]
 
 MIDDLEWARE_CLASSES = [
@@ -207,6 +209,9 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 FILES_PATH = os.path.join(BASE_DIR,MEDIA_ROOT,'files')
 
+# Partial files of chunked uploads (on the same file system as MEDIA_ROOT)
+UPLOADS_PATH = os.path.join(MEDIA_ROOT, 'uploads')
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -236,3 +241,27 @@ SETUP_ADMIN_PASSWORD = os.environ.get('SETUP_ADMIN_PASSWORD', None)
 # OBSOLETE/NON-OBSOLETE STATUS
 NON_OBSOLETE = 1
 OBSOLETE = 2
+
+
+# Number of worker processes for the batch index generation (shared by
+# all requests of a web process) and of background index generator jobs
+INDEX_GENERATOR_WORKERS = int(os.environ.get('INDEX_GENERATOR_WORKERS', 2))
+
+# Number of minutes after which background index generator jobs without
+# any update are failed (e.g., when the server has been restarted)
+INDEX_GENERATOR_JOB_TIMEOUT_MINUTES = int(os.environ.get(
+    'INDEX_GENERATOR_JOB_TIMEOUT_MINUTES', 30))
+
+# Number of worker threads rendering downloads in the background
+EXPORT_WORKERS = int(os.environ.get('EXPORT_WORKERS', 2))
+
+# Number of days the files of background downloads are kept
+EXPORT_RETENTION_DAYS = int(os.environ.get('EXPORT_RETENTION_DAYS', 7))
+
+# Number of hours after which unfinished background downloads are failed
+# (e.g., when the server has been restarted)
+EXPORT_TIMEOUT_HOURS = int(os.environ.get('EXPORT_TIMEOUT_HOURS', 6))
+
+# Files of background downloads, outside MEDIA_ROOT so that they are only
+# served to their users by the download action
+EXPORTS_PATH = os.path.join(BASE_DIR, 'exports')